@@ -0,0 +1,41 @@
+# cleanslate_backend/gunicorn_asgi.py
+#
+# Production ASGI entry point for the async read paths (core/async_views.py):
+#
+#   gunicorn cleanslate_backend.asgi:application -c cleanslate_backend/gunicorn_asgi.py
+#
+# Uvicorn workers run one event loop per process. Keep the WSGI deployment
+# (cleanslate_backend.wsgi) for the write endpoints and send /api/async/ here from the
+# load balancer. Every setting can be overridden from the environment.
+#
+# Needs gunicorn and uvicorn on the server (pip install gunicorn "uvicorn[standard]").
+# The repo has no requirements file, so neither is declared anywhere yet.
+#
+# Gunicorn's worker_connections only applies to its own eventlet/gevent workers; Uvicorn
+# ignores it. The per-worker connection cap is Uvicorn's limit_concurrency, set through
+# the worker class in cleanslate_backend/uvicorn_worker.py (UVICORN_LIMIT_CONCURRENCY).
+#
+# Comparing against WSGI: run `manage.py loadtest --journeys browse --output wsgi.json`
+# against the WSGI server, then the same with --async-reads --compare wsgi.json against
+# this one (see core/loadtest.py).
+#
+# Database connections: Django hands a connection back at the end of each request under
+# ASGI, so rely on the psycopg pool configured in settings.DATABASES (one per worker,
+# DATABASE_POOL_MAX_SIZE connections at most) rather than CONN_MAX_AGE.
+
+import multiprocessing
+import os
+
+bind = os.environ.get('GUNICORN_BIND', '0.0.0.0:8001')
+worker_class = 'cleanslate_backend.uvicorn_worker.UvicornWorker'
+# One event loop per core is enough; a loop is never blocked by a slow query
+workers = int(os.environ.get('GUNICORN_WORKERS', multiprocessing.cpu_count()))
+backlog = int(os.environ.get('GUNICORN_BACKLOG', 2048))
+timeout = int(os.environ.get('GUNICORN_TIMEOUT', 30))
+graceful_timeout = int(os.environ.get('GUNICORN_GRACEFUL_TIMEOUT', 30))
+keepalive = int(os.environ.get('GUNICORN_KEEPALIVE', 5))
+# Recycle workers now and then so a slow leak can't build up
+max_requests = int(os.environ.get('GUNICORN_MAX_REQUESTS', 10000))
+max_requests_jitter = int(os.environ.get('GUNICORN_MAX_REQUESTS_JITTER', 1000))
+accesslog = os.environ.get('GUNICORN_ACCESS_LOG', '-')
+errorlog = '-'
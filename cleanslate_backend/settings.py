@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.2/ref/settings/
 """
 
+import os
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -40,18 +41,23 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'django.contrib.postgres', # Full-text search and trigram lookups for listings
     'rest_framework',
     'core',
     'rest_framework.authtoken',
     'djoser',
 ]
 
+# All of these must be async-capable: a sync-only one pushes every ASGI request onto a
+# thread (core/async_views.py)
 MIDDLEWARE = [
+    'core.instrumentation.QueryMetricsMiddleware', # First, so it sees the whole request
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'core.routing.ReadYourWritesMiddleware', # Keeps a user's reads on the primary right after their writes
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -74,22 +80,137 @@ TEMPLATES = [
 ]
 
 WSGI_APPLICATION = 'cleanslate_backend.wsgi.application'
+ASGI_APPLICATION = 'cleanslate_backend.asgi.application' # Serves the async read paths (see gunicorn_asgi.py)
 
 
 # Database
 # https://docs.djangoproject.com/en/5.2/ref/settings/#databases
 
-DATABASES = {
-    'default': {
+# Persistent connections by default. DATABASE_POOL=1 takes them from psycopg's pool instead,
+# one pool per process; that needs psycopg_pool, which isn't installed with psycopg
+# (`pip install "psycopg[pool]"`).
+
+DATABASE_POOL = os.environ.get('DATABASE_POOL', '0') == '1'
+
+def postgres_database(host, port):
+    database = {
         'ENGINE': 'django.db.backends.postgresql',
         'NAME': 'cleanslate_db',        # The database name you created
         'USER': 'cleanslate_user',     # The database user you created
         'PASSWORD': 'SIH2025', # The password for cleanslate_user
-        'HOST': 'localhost',             # Or the IP address of your PostgreSQL server
-        'PORT': '5432',                  # Default PostgreSQL port
+        'HOST': host,             # Or the IP address of your PostgreSQL server
+        'PORT': port,                  # Default PostgreSQL port
     }
+    if DATABASE_POOL:
+        database['OPTIONS'] = {'pool': {
+            'min_size': int(os.environ.get('DATABASE_POOL_MIN_SIZE', 2)),
+            'max_size': int(os.environ.get('DATABASE_POOL_MAX_SIZE', 10)),
+            'timeout': int(os.environ.get('DATABASE_POOL_TIMEOUT', 10)), # Seconds to wait for a free connection
+        }}
+    else:
+        database['CONN_MAX_AGE'] = 60
+        database['CONN_HEALTH_CHECKS'] = True
+    return database
+
+DATABASES = {
+    'default': postgres_database('localhost', '5432'),
 }
 
+# Read replicas (core/routing.py): DATABASE_REPLICA_HOSTS=host[:port],... adds the aliases
+# replica1, replica2, ... The public catalog and analytics reads go there.
+# Read-your-writes markers are kept in the 'catalog' cache: set CATALOG_CACHE_URL along
+# with the replicas, or a user's writes only pin the reads of the worker that took them.
+DATABASE_REPLICAS = []
+for index, address in enumerate(filter(None, os.environ.get('DATABASE_REPLICA_HOSTS', '').split(',')), 1):
+    host, _, port = address.strip().partition(':')
+    DATABASES[f'replica{index}'] = {**postgres_database(host, port or '5432'), 'TEST': {'MIRROR': 'default'}}
+    DATABASE_REPLICAS.append(f'replica{index}')
+
+DATABASE_ROUTERS = ['core.routing.ReplicaRouter']
+DATABASE_REPLICA_MAX_LAG = 5 # Seconds; a replica further behind is skipped, and a user's reads stay on the primary this long after their writes
+DATABASE_REPLICA_CHECK_INTERVAL = 10 # Seconds between health checks of a replica (per process)
+
+
+# Caches
+# The 'catalog' alias backs the read-through cache in core/cache.py. Point CATALOG_CACHE_URL
+# at Redis in production; without it a per-process local-memory cache is used.
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'catalog': {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        'LOCATION': os.environ['CATALOG_CACHE_URL'],
+    } if os.environ.get('CATALOG_CACHE_URL') else {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'catalog',
+    },
+}
+
+CATALOG_CACHE_TIMEOUT = 300 # Seconds a cached catalog response may live even without invalidation
+
+
+# Request instrumentation (core/instrumentation.py)
+# With QUERY_BUDGET_STRICT a viewset action that exceeds its query_budgets entry raises
+# instead of logging a warning; enable it in test settings.
+QUERY_BUDGET_STRICT = False
+# /metrics needs a staff login or `Authorization: Bearer <METRICS_TOKEN>` (Prometheus'
+# bearer_token). Unset, only staff can read it.
+METRICS_TOKEN = os.environ.get('METRICS_TOKEN', '')
+
+
+# Job queue (core/jobs.py)
+# 'worker': jobs wait for `manage.py runworkers`. 'local': jobs run in-process right
+# after the enqueuing transaction commits (use this in tests).
+JOBS_MODE = os.environ.get('JOBS_MODE', 'worker')
+JOBS_BACKOFF_BASE = 5 # Seconds before the first retry, doubled on every further attempt
+JOBS_MAX_BACKOFF = 3600
+JOBS_VISIBILITY_TIMEOUT = 600 # A running job whose worker is silent this long is requeued
+
+CERTIFICATE_VERIFY_URL = '/api/verify/{id}/' # Encoded into Certificate.qr_code_data
+
+
+# Certificate anchoring (core/anchoring.py)
+# Certificates are anchored as Merkle roots, one chain transaction per batch.
+# Use 'core.anchoring.PolygonChainClient' (plus ANCHOR_RPC_URL / ANCHOR_PRIVATE_KEY) in production.
+ANCHOR_CHAIN_CLIENT = os.environ.get('ANCHOR_CHAIN_CLIENT', 'core.anchoring.FakeChainClient')
+ANCHOR_RPC_URL = os.environ.get('ANCHOR_RPC_URL')
+ANCHOR_PRIVATE_KEY = os.environ.get('ANCHOR_PRIVATE_KEY')
+ANCHOR_BATCH_MAX_SIZE = 1000 # Certificates per Merkle tree
+ANCHOR_BATCH_MAX_AGE = 300 # Seconds a certificate may wait before its window is anchored
+
+
+# Public certificate verification (core/verification.py, core/throttling.py)
+VERIFY_CACHE_SIZE = 50000 # Entries in the per-process LRU
+VERIFY_CACHE_TTL = 60 # Seconds; other processes see certificate changes within this
+VERIFY_NEGATIVE_CACHE_TTL = 10 # Seconds an unknown id/serial stays cached as a miss
+VERIFY_THROTTLE_BURST = 30 # Token bucket per client IP
+VERIFY_THROTTLE_RATE = 10.0 # Tokens refilled per second
+
+
+# Analytics rollups (core/analytics.py)
+# Writes queue a rebuild of their day; all writes within one interval share the rebuild.
+ANALYTICS_REFRESH_INTERVAL = 300 # Seconds
+
+
+# Subscription lifecycle (core/subscriptions.py, `manage.py run_subscription_scheduler`)
+SUBSCRIPTION_PERIOD_DAYS = 30 # Length of a renewed period
+SUBSCRIPTION_BATCH_SIZE = 500 # Subscriptions settled per transaction
+SUBSCRIPTION_FALLBACK_PACKAGE = None # Package name users drop to when a subscription lapses (None: no package)
+
+ME_SUMMARY_CACHE_TIMEOUT = 300 # Seconds a cached /api/me/summary/ may live (writes evict it sooner)
+
+
+# Idempotent create requests (core/idempotency.py)
+IDEMPOTENCY_KEY_TTL = 86400 # Seconds a stored response is replayed for a retried Idempotency-Key
+
+
+# Cached token authentication (core/authentication.py)
+AUTH_TOKEN_CACHE_SIZE = 10000 # Tokens in the per-process LRU
+AUTH_TOKEN_CACHE_TTL = 30 # Seconds; other processes see a logout or deactivation within this
+AUTH_TOKEN_MAX_AGE = None # Seconds before a token expires and the client must log in again (None: never)
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
@@ -134,8 +255,8 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': [
+        'core.authentication.CachedTokenAuthentication',       # For API clients using tokens (checked first, no DB hit when cached)
         'rest_framework.authentication.SessionAuthentication', # For browsable API and sessions
-        'rest_framework.authentication.TokenAuthentication',   # For API clients using tokens
     ],
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.IsAuthenticated', # Default to requiring authentication for all views
@@ -1,9 +1,11 @@
 from django.contrib import admin
 from django.urls import path, include # Import include
+from core.instrumentation import metrics_view
 
 urlpatterns = [
     path('admin/', admin.site.urls),
     path('auth/',include('djoser.urls')),
     path('auth/',include('djoser.urls.authtoken')),
     path('api/', include('core.urls')), # This line includes your API URLs
+    path('metrics', metrics_view), # Prometheus scrape endpoint
 ]
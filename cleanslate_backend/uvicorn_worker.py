@@ -0,0 +1,17 @@
+# cleanslate_backend/uvicorn_worker.py
+#
+# Uvicorn's gunicorn worker with the settings gunicorn has no option for. Used by
+# cleanslate_backend/gunicorn_asgi.py.
+
+import os
+
+from uvicorn.workers import UvicornWorker as BaseUvicornWorker
+
+
+class UvicornWorker(BaseUvicornWorker):
+    CONFIG_KWARGS = {
+        **BaseUvicornWorker.CONFIG_KWARGS,
+        # Connections (and so requests in flight) per worker; past this Uvicorn answers 503
+        # instead of queueing more work on a loop that is already saturated
+        'limit_concurrency': int(os.environ.get('UVICORN_LIMIT_CONCURRENCY', 1000)),
+    }
@@ -1,14 +1,18 @@
 from django.contrib import admin
+from .admin_performance import PerformanceModelAdmin, CachedAllValuesFieldListFilter, CachedRelatedFieldListFilter
+from . import search
 from .models import (
     User, Category, Certificate, Listing, ListingMedia,
-    AdminAction, SubscriptionPackage, UserSubscription, GreenCreditTransaction
+    AdminAction, SubscriptionPackage, UserSubscription, GreenCreditTransaction,
+    Job, DeadLetterJob, AnchorBatch, CertificateProof, WipeRollup, CreditRollup,
+    IdempotencyRecord
 )
 
 # 1. Custom User Model
 @admin.register(User)
-class UserAdmin(admin.ModelAdmin):
+class UserAdmin(PerformanceModelAdmin):
     list_display = ('email', 'username', 'phone_number', 'is_staff', 'is_active', 'green_credits')
-    list_filter = ('is_staff', 'is_active', 'current_subscription_package')
+    list_filter = ('is_staff', 'is_active', ('current_subscription_package', CachedRelatedFieldListFilter))
     search_fields = ('email', 'username', 'phone_number')
     ordering = ('email',)
 
@@ -16,43 +20,53 @@ class UserAdmin(admin.ModelAdmin):
 @admin.register(Category)
 class CategoryAdmin(admin.ModelAdmin):
     list_display = ('name', 'parent_category', 'description')
-    list_filter = ('parent_category',)
+    list_filter = (('parent_category', CachedRelatedFieldListFilter),)
+    list_select_related = ('parent_category',)
     search_fields = ('name', 'description')
     ordering = ('name',)
 
 # 3. Certificate Model
 @admin.register(Certificate)
-class CertificateAdmin(admin.ModelAdmin):
+class CertificateAdmin(PerformanceModelAdmin):
     list_display = ('id', 'user', 'device_serial_number', 'wiping_method', 'status', 'completed_at', 'is_invalidated')
     list_filter = ('status', 'wiping_method', 'device_type', 'operating_system', 'is_invalidated')
-    search_fields = ('device_serial_number', 'user__email', 'blockchain_tx_hash')
+    list_select_related = ('user',)
+    # Exact matches use the unique indexes; a substring search would scan every certificate
+    search_fields = ('=device_serial_number', '=user__email', '=blockchain_tx_hash')
     raw_id_fields = ('user',) # Use raw_id_fields for FK to User for better performance with many users
 
 # 4. Listing Model
 @admin.register(Listing)
-class ListingAdmin(admin.ModelAdmin):
+class ListingAdmin(PerformanceModelAdmin):
     list_display = ('title', 'user', 'price', 'category', 'condition', 'status', 'created_at', 'is_redeemable_with_green_credits')
-    list_filter = ('status', 'condition', 'category', 'is_redeemable_with_green_credits')
-    search_fields = ('title', 'description', 'user__email', 'brand', 'model_name')
-    raw_id_fields = ('user', 'certificate')
-    date_hierarchy = 'created_at'
+    list_filter = ('status', 'condition', ('category', CachedRelatedFieldListFilter), 'is_redeemable_with_green_credits')
+    list_select_related = ('user', 'category')
+    search_fields = ('title',) # Only makes the search box appear; get_search_results does the work
+    raw_id_fields = ('user', 'certificate', 'buyer')
+
+    def get_search_results(self, request, queryset, search_term):
+        # Same full-text/trigram (PostgreSQL) or FTS5 (SQLite) index as the API search
+        if not search_term.strip():
+            return queryset, False
+        return search.filter_search(queryset, search_term.strip()), False
 
 # 5. ListingMedia Model
 @admin.register(ListingMedia)
-class ListingMediaAdmin(admin.ModelAdmin):
-    list_display = ('listing', 'media_type', 'is_primary', 'file_url')
+class ListingMediaAdmin(PerformanceModelAdmin):
+    list_display = ('listing', 'media_type', 'is_primary', 'position', 'file_url')
     list_filter = ('media_type', 'is_primary')
-    search_fields = ('listing__title', 'file_url')
+    list_select_related = ('listing',) # ListingMedia.__str__ reads listing.title
+    search_fields = ('=file_url',)
     raw_id_fields = ('listing',)
 
 # 6. AdminAction Model
 @admin.register(AdminAction)
-class AdminActionAdmin(admin.ModelAdmin):
+class AdminActionAdmin(PerformanceModelAdmin):
     list_display = ('admin_user', 'action_type', 'target_table', 'target_id', 'performed_at', 'ip_address')
-    list_filter = ('action_type', 'target_table')
-    search_fields = ('admin_user__email', 'action_type', 'target_table', 'target_id', 'reason')
+    list_filter = (('action_type', CachedAllValuesFieldListFilter), ('target_table', CachedAllValuesFieldListFilter))
+    list_select_related = ('admin_user',) # AdminAction.__str__ reads admin_user.email
+    search_fields = ('=admin_user__email', '=target_id', 'reason')
     raw_id_fields = ('admin_user',)
-    date_hierarchy = 'performed_at'
 
 # 7. SubscriptionPackage Model
 @admin.register(SubscriptionPackage)
@@ -63,18 +77,80 @@ class SubscriptionPackageAdmin(admin.ModelAdmin):
 
 # 8. UserSubscription Model
 @admin.register(UserSubscription)
-class UserSubscriptionAdmin(admin.ModelAdmin):
+class UserSubscriptionAdmin(PerformanceModelAdmin):
     list_display = ('user', 'package', 'status', 'start_date', 'end_date', 'wipes_used')
-    list_filter = ('status', 'package')
+    list_filter = ('status', ('package', CachedRelatedFieldListFilter))
+    list_select_related = ('user', 'package')
     search_fields = ('user__email', 'package__name')
     raw_id_fields = ('user', 'package')
     date_hierarchy = 'start_date'
 
 # 9. GreenCreditTransaction Model
 @admin.register(GreenCreditTransaction)
-class GreenCreditTransactionAdmin(admin.ModelAdmin):
+class GreenCreditTransactionAdmin(PerformanceModelAdmin):
     list_display = ('user', 'transaction_type', 'amount', 'transaction_time', 'certificate', 'listing')
     list_filter = ('transaction_type',)
-    search_fields = ('user__email', 'description')
+    list_select_related = ('user', 'certificate', 'listing')
+    search_fields = ('=user__email',)
     raw_id_fields = ('user', 'certificate', 'listing')
-    date_hierarchy = 'transaction_time'
\ No newline at end of file
+
+# 10. Job Model
+@admin.register(Job)
+class JobAdmin(PerformanceModelAdmin):
+    list_display = ('id', 'name', 'status', 'attempts', 'run_at', 'locked_by', 'created_at')
+    list_filter = ('status', ('name', CachedAllValuesFieldListFilter))
+    search_fields = ('=name', '=idempotency_key')
+
+# 11. DeadLetterJob Model
+@admin.register(DeadLetterJob)
+class DeadLetterJobAdmin(PerformanceModelAdmin):
+    list_display = ('job_id', 'name', 'attempts', 'failed_at')
+    list_filter = (('name', CachedAllValuesFieldListFilter),)
+    search_fields = ('=name', '=idempotency_key')
+    actions = ['replay']
+
+    @admin.action(description='Put the selected jobs back on the queue')
+    def replay(self, request, queryset):
+        from .jobs import replay_dead_letter
+        for dead in queryset:
+            replay_dead_letter(dead)
+
+# 12. AnchorBatch Model
+@admin.register(AnchorBatch)
+class AnchorBatchAdmin(PerformanceModelAdmin):
+    list_display = ('id', 'merkle_root', 'size', 'status', 'chain', 'tx_hash', 'created_at', 'submitted_at')
+    list_filter = ('status', ('chain', CachedAllValuesFieldListFilter))
+    search_fields = ('=merkle_root', '=tx_hash')
+
+# 13. CertificateProof Model
+@admin.register(CertificateProof)
+class CertificateProofAdmin(PerformanceModelAdmin):
+    list_display = ('certificate', 'batch', 'leaf_index', 'leaf_hash')
+    list_select_related = ('certificate', 'batch')
+    search_fields = ('=leaf_hash', '=certificate__device_serial_number')
+    raw_id_fields = ('certificate', 'batch')
+
+# 14. WipeRollup Model
+@admin.register(WipeRollup)
+class WipeRollupAdmin(PerformanceModelAdmin):
+    list_display = ('grain', 'period', 'user', 'wiping_method', 'device_type', 'operating_system', 'status', 'count')
+    list_filter = ('grain', ('status', CachedAllValuesFieldListFilter), ('wiping_method', CachedAllValuesFieldListFilter))
+    list_select_related = ('user',)
+    raw_id_fields = ('user',)
+
+# 15. CreditRollup Model
+@admin.register(CreditRollup)
+class CreditRollupAdmin(PerformanceModelAdmin):
+    list_display = ('grain', 'period', 'user', 'transaction_type', 'count', 'credited', 'debited')
+    list_filter = ('grain', ('transaction_type', CachedAllValuesFieldListFilter))
+    list_select_related = ('user',)
+    raw_id_fields = ('user',)
+
+# 16. IdempotencyRecord Model
+@admin.register(IdempotencyRecord)
+class IdempotencyRecordAdmin(PerformanceModelAdmin):
+    list_display = ('key', 'scope', 'user', 'status_code', 'created_at', 'expires_at')
+    list_filter = (('scope', CachedAllValuesFieldListFilter),)
+    list_select_related = ('user',)
+    search_fields = ('=key', '=user__email')
+    raw_id_fields = ('user',)
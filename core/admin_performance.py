@@ -0,0 +1,64 @@
+# core/admin_performance.py
+#
+# Changelist helpers for the big tables (certificates, ledger, listings, jobs). The stock
+# changelist runs an exact COUNT(*) twice per page (filtered and full), a SELECT DISTINCT
+# for every AllValuesFieldListFilter, and one query per related __str__. Here the
+# counts come from pg_class.reltuples, or from the planner when filtered, and filter
+# choices are cached for a short while. Subclasses still set list_select_related for
+# whatever their list_display touches.
+
+from django.conf import settings
+from django.contrib import admin
+from django.core.paginator import Paginator
+from django.utils.functional import cached_property
+
+from .cache import get_cache
+from .pagination import approximate_count, table_row_estimate
+
+# Below this many rows an exact COUNT(*) is cheap and nicer to look at. Only PostgreSQL
+# has an estimate to compare against; other backends always get the exact count.
+# `manage.py benchmark changelist` times the changelists on a seeded table.
+EXACT_COUNT_THRESHOLD = 10000
+
+
+class EstimatedCountPaginator(Paginator):
+    @cached_property
+    def count(self):
+        queryset = self.object_list
+        threshold = getattr(settings, 'ADMIN_EXACT_COUNT_THRESHOLD', EXACT_COUNT_THRESHOLD)
+        estimate = table_row_estimate(queryset.model, queryset.db)
+        if estimate is None or estimate < threshold:
+            return super().count
+        if queryset.query.where:
+            estimate = approximate_count(queryset)
+        return estimate
+
+
+def _cached_choices(key, build):
+    cache = get_cache()
+    choices = cache.get(key)
+    if choices is None:
+        choices = build()
+        cache.set(key, choices, timeout=getattr(settings, 'ADMIN_FILTER_CHOICES_TIMEOUT', 300))
+    return choices
+
+
+class CachedAllValuesFieldListFilter(admin.AllValuesFieldListFilter):
+    # SELECT DISTINCT over the whole table, at most once per timeout instead of every page load
+    def __init__(self, field, request, params, model, model_admin, field_path):
+        super().__init__(field, request, params, model, model_admin, field_path)
+        # lookup_choices is still a lazy queryset at this point
+        distinct_values = self.lookup_choices
+        self.lookup_choices = _cached_choices(f'admin-filter:{model._meta.label_lower}:{field_path}', lambda: list(distinct_values))
+
+
+class CachedRelatedFieldListFilter(admin.RelatedFieldListFilter):
+    def field_choices(self, field, request, model_admin):
+        key = f'admin-filter:{field.model._meta.label_lower}:{field.name}:related'
+        return _cached_choices(key, lambda: list(super(CachedRelatedFieldListFilter, self).field_choices(field, request, model_admin)))
+
+
+class PerformanceModelAdmin(admin.ModelAdmin):
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False # Skips the second, unfiltered COUNT(*)
+    show_facets = admin.ShowFacets.NEVER # Facet counts are one aggregate per filter choice over the whole table
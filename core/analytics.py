@@ -0,0 +1,231 @@
+# core/analytics.py
+#
+# Dashboard rollups. WipeRollup and CreditRollup hold counts per day and per month, for
+# every user and platform-wide (user=None), so /api/analytics/ never scans Certificate
+# or GreenCreditTransaction. A period is always rebuilt whole: delete its rollup rows and
+# insert fresh ones from one GROUP BY per table, so a rebuild can be repeated safely.
+# Monthly rows are summed from the daily ones. Each rebuild holds a lock per period it
+# replaces, so two rebuilds of the same day (a refresh job and a backfill, say) run one
+# after the other instead of both inserting into the emptied period.
+#
+# Writes don't touch the rollups directly. They enqueue a refresh of the affected day
+# keyed on a short time window, so a burst of writes costs one rebuild per day and
+# window (see schedule_refresh).
+
+from datetime import datetime, time, timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, Q, Sum, Value
+from django.db.models.functions import Coalesce, TruncDate, TruncMonth
+from django.utils import timezone
+
+from .locks import advisory_xact_lock
+from .models import Certificate, GreenCreditTransaction, WipeRollup, CreditRollup
+
+WIPE_DIMENSIONS = ('wiping_method', 'device_type', 'operating_system', 'status')
+INSERT_BATCH_SIZE = 1000
+
+
+def day_start(day):
+    return timezone.make_aware(datetime.combine(day, time.min))
+
+
+def month_start(day):
+    return day.replace(day=1)
+
+
+def next_month(day):
+    return (day.replace(day=1) + timedelta(days=32)).replace(day=1)
+
+
+def lock_periods(grain, start, end):
+    # Lock every `grain` period in [start, end) until the transaction ends
+    periods = []
+    current = start
+    while current < end:
+        periods.append(f'core.analytics:{grain}:{current.isoformat()}')
+        current = current + timedelta(days=1) if grain == 'day' else next_month(current)
+    advisory_xact_lock(*periods)
+
+
+def rebuild_daily(start, end):
+    # Recompute the daily rollups for local dates in [start, end)
+    certificates = (
+        Certificate.objects
+        .filter(generated_at__gte=day_start(start), generated_at__lt=day_start(end))
+        .annotate(day=TruncDate('generated_at'))
+        .order_by()
+    )
+    credits = (
+        GreenCreditTransaction.objects
+        .filter(transaction_time__gte=day_start(start), transaction_time__lt=day_start(end))
+        .annotate(day=TruncDate('transaction_time'))
+        .order_by()
+    )
+    with transaction.atomic():
+        lock_periods('day', start, end)
+        WipeRollup.objects.filter(grain='day', period__gte=start, period__lt=end).delete()
+        CreditRollup.objects.filter(grain='day', period__gte=start, period__lt=end).delete()
+        WipeRollup.objects.bulk_create(
+            (
+                WipeRollup(grain='day', period=row.pop('day'), **row)
+                for row in _wipe_rows(certificates, 'day')
+            ),
+            batch_size=INSERT_BATCH_SIZE,
+        )
+        CreditRollup.objects.bulk_create(
+            (
+                CreditRollup(grain='day', period=row.pop('day'), **row)
+                for row in _credit_rows(credits, 'day')
+            ),
+            batch_size=INSERT_BATCH_SIZE,
+        )
+
+
+def _wipe_rows(queryset, period):
+    # Per-user rows, then the platform-wide rows (no user_id) for the same grouping
+    for grouping in (('user_id',), ()):
+        yield from queryset.values(period, *grouping, *WIPE_DIMENSIONS).annotate(count=Count('id'))
+
+
+def _credit_rows(queryset, period):
+    for grouping in (('user_id',), ()):
+        yield from queryset.values(period, *grouping, 'transaction_type').annotate(
+            count=Count('id'),
+            credited=Coalesce(Sum('amount', filter=Q(amount__gt=0)), Value(0)),
+            debited=Coalesce(Sum('amount', filter=Q(amount__lt=0)), Value(0)),
+        )
+
+
+def rebuild_monthly(start, end):
+    # Recompute the monthly rollups for months starting in [start, end) from the daily rows
+    start, end = month_start(start), month_start(end)
+    with transaction.atomic():
+        lock_periods('month', start, end)
+        WipeRollup.objects.filter(grain='month', period__gte=start, period__lt=end).delete()
+        CreditRollup.objects.filter(grain='month', period__gte=start, period__lt=end).delete()
+        daily_wipes = (
+            WipeRollup.objects.filter(grain='day', period__gte=start, period__lt=end)
+            .annotate(month=TruncMonth('period')).order_by()
+            .values('month', 'user_id', *WIPE_DIMENSIONS)
+            .annotate(total=Sum('count'))
+        )
+        WipeRollup.objects.bulk_create(
+            (
+                WipeRollup(grain='month', period=row.pop('month'), count=row.pop('total'), **row)
+                for row in daily_wipes
+            ),
+            batch_size=INSERT_BATCH_SIZE,
+        )
+        daily_credits = (
+            CreditRollup.objects.filter(grain='day', period__gte=start, period__lt=end)
+            .annotate(month=TruncMonth('period')).order_by()
+            .values('month', 'user_id', 'transaction_type')
+            .annotate(total=Sum('count'), total_credited=Sum('credited'), total_debited=Sum('debited'))
+        )
+        CreditRollup.objects.bulk_create(
+            (
+                CreditRollup(
+                    grain='month', period=row['month'], user_id=row['user_id'], transaction_type=row['transaction_type'],
+                    count=row['total'], credited=row['total_credited'], debited=row['total_debited'],
+                )
+                for row in daily_credits
+            ),
+            batch_size=INSERT_BATCH_SIZE,
+        )
+
+
+def refresh_day(day):
+    # Rebuild one day and the month it belongs to
+    rebuild_daily(day, day + timedelta(days=1))
+    rebuild_monthly(day, next_month(day))
+
+
+def rebuild_range(start, end):
+    # Backfill: one month per transaction so a long history never holds one huge lock.
+    # Yields each month as it finishes.
+    current = month_start(start)
+    while current < end:
+        following = next_month(current)
+        rebuild_daily(current, following)
+        rebuild_monthly(current, following)
+        yield current
+        current = following
+
+
+def history_start():
+    # Earliest local date that has any certificate or ledger row
+    firsts = [
+        Certificate.objects.order_by('generated_at').values_list('generated_at', flat=True).first(),
+        GreenCreditTransaction.objects.order_by('transaction_time').values_list('transaction_time', flat=True).first(),
+    ]
+    firsts = [timezone.localdate(value) for value in firsts if value is not None]
+    return min(firsts) if firsts else None
+
+
+def schedule_refresh(moment=None):
+    # Queue a rebuild of the day `moment` falls on, shared by every write in the same window
+    from . import jobs
+    now = timezone.now()
+    day = timezone.localdate(moment or now)
+    interval = getattr(settings, 'ANALYTICS_REFRESH_INTERVAL', 300)
+    window = int(now.timestamp() // interval)
+    window_end = (window + 1) * interval
+    jobs.enqueue(
+        'refresh_analytics', {'day': day.isoformat()}, key=f'analytics:{day.isoformat()}:{window}',
+        delay=timedelta(seconds=window_end - now.timestamp()),
+    )
+
+
+# Reading
+
+def _period_bounds(grain, since, until):
+    if grain == 'month':
+        return (month_start(since) if since else None), (next_month(until) if until else None)
+    return since, (until + timedelta(days=1) if until else None)
+
+
+def _rollups(model, grain, user=None, since=None, until=None):
+    since, until = _period_bounds(grain, since, until)
+    rows = model.objects.filter(grain=grain)
+    rows = rows.filter(user=user) if user is not None else rows.filter(user__isnull=True)
+    if since:
+        rows = rows.filter(period__gte=since)
+    if until:
+        rows = rows.filter(period__lt=until)
+    return rows.order_by('period')
+
+
+def wipe_summary(grain='day', user=None, since=None, until=None, by='wiping_method'):
+    # Per period: totals by status, success rate over finished wipes and a breakdown by `by`.
+    # since/until are inclusive dates.
+    periods = {}
+    for row in _rollups(WipeRollup, grain, user, since, until).values('period', 'status', by).annotate(total=Sum('count')):
+        period = periods.setdefault(row['period'], {
+            'period': row['period'], 'total': 0, 'success': 0, 'failed': 0, 'pending': 0, 'breakdown': {},
+        })
+        period['total'] += row['total']
+        period[row['status']] = period.get(row['status'], 0) + row['total']
+        key = row[by] or 'unknown'
+        period['breakdown'][key] = period['breakdown'].get(key, 0) + row['total']
+    for period in periods.values():
+        finished = period['success'] + period['failed']
+        period['success_rate'] = round(period['success'] / finished, 4) if finished else None
+    return list(periods.values())
+
+
+def credit_summary(grain='day', user=None, since=None, until=None):
+    # Per period: credits awarded (positive amounts) vs redeemed (negative amounts, as a
+    # positive number), plus the same split by transaction type
+    periods = {}
+    for row in _rollups(CreditRollup, grain, user, since, until).values('period', 'transaction_type').annotate(
+        total=Sum('count'), total_credited=Sum('credited'), total_debited=Sum('debited'),
+    ):
+        period = periods.setdefault(row['period'], {'period': row['period'], 'awarded': 0, 'redeemed': 0, 'by_type': {}})
+        period['awarded'] += row['total_credited']
+        period['redeemed'] -= row['total_debited']
+        period['by_type'][row['transaction_type']] = {
+            'count': row['total'], 'awarded': row['total_credited'], 'redeemed': -row['total_debited'],
+        }
+    return list(periods.values())
@@ -0,0 +1,273 @@
+# core/anchoring.py
+#
+# Batched blockchain anchoring. Successful certificates are collected into size- or
+# time-bounded windows, hashed into a Merkle tree, and only the root goes on chain
+# (one transaction per batch instead of one per certificate). Each certificate keeps
+# its inclusion proof in CertificateProof, so verification is a handful of SHA-256
+# calls with no chain access.
+
+import hashlib
+import json
+import logging
+import threading
+from abc import ABC, abstractmethod
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.db import transaction
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from .models import Certificate, AnchorBatch, CertificateProof
+from . import verification
+
+logger = logging.getLogger(__name__)
+
+# Leaves and inner nodes are hashed with different prefixes so an inner node can never
+# be passed off as a leaf (second-preimage protection)
+LEAF_PREFIX = b'\x00'
+NODE_PREFIX = b'\x01'
+
+CANONICAL_FIELDS = (
+    'id', 'user_id', 'device_serial_number', 'wiping_method', 'status',
+    'wiped_at', 'completed_at', 'device_type', 'operating_system', 'health_score_at_wipe',
+)
+
+
+def _setting(name, default):
+    return getattr(settings, name, default)
+
+
+# Hashing and Merkle trees
+
+def canonical_certificate(certificate):
+    # Stable JSON form of the fields that identify a wipe
+    data = {}
+    for field in CANONICAL_FIELDS:
+        value = certificate[field] if isinstance(certificate, dict) else getattr(certificate, field)
+        if hasattr(value, 'isoformat'):
+            value = value.isoformat()
+        elif value is not None and not isinstance(value, (int, str)):
+            value = str(value)
+        data[field] = value
+    return json.dumps(data, sort_keys=True, separators=(',', ':'))
+
+
+def leaf_hash(certificate):
+    return hashlib.sha256(LEAF_PREFIX + canonical_certificate(certificate).encode('utf-8')).hexdigest()
+
+
+def node_hash(left, right):
+    return hashlib.sha256(NODE_PREFIX + bytes.fromhex(left) + bytes.fromhex(right)).hexdigest()
+
+
+def build_tree(leaves):
+    # Returns every level, leaves first. An odd node out is carried up unchanged.
+    if not leaves:
+        raise ValueError('Cannot build a Merkle tree without leaves')
+    levels = [list(leaves)]
+    while len(levels[-1]) > 1:
+        level = levels[-1]
+        parent = [node_hash(level[i], level[i + 1]) for i in range(0, len(level) - 1, 2)]
+        if len(level) % 2:
+            parent.append(level[-1])
+        levels.append(parent)
+    return levels
+
+
+def inclusion_proof(levels, index):
+    proof = []
+    for level in levels[:-1]:
+        sibling = index ^ 1
+        if sibling < len(level):
+            proof.append([level[sibling], 'L' if sibling < index else 'R'])
+        index //= 2
+    return proof
+
+
+def verify_proof(leaf, proof, root):
+    current = leaf
+    for sibling, side in proof:
+        current = node_hash(sibling, current) if side == 'L' else node_hash(current, sibling)
+    return current == root
+
+
+# Chain clients
+
+class BaseChainClient(ABC):
+    name = 'base'
+
+    @abstractmethod
+    def submit_root(self, merkle_root):
+        # Publish the root and return the transaction hash
+        ...
+
+
+class FakeChainClient(BaseChainClient):
+    # Local stand-in for tests and development: "transactions" live in memory
+    name = 'fake'
+    _lock = threading.Lock()
+    transactions = {}
+
+    def submit_root(self, merkle_root):
+        tx_hash = '0x' + hashlib.sha256(f'fake:{merkle_root}:{timezone.now().isoformat()}'.encode('utf-8')).hexdigest()
+        with self._lock:
+            self.transactions[tx_hash] = merkle_root
+        return tx_hash
+
+
+class PolygonChainClient(BaseChainClient):
+    # Sends a zero-value transaction to ourselves with the root as calldata.
+    # Needs web3 and ANCHOR_RPC_URL / ANCHOR_PRIVATE_KEY in settings.
+    name = 'polygon'
+
+    def __init__(self):
+        try:
+            from web3 import Web3
+        except ImportError:
+            raise ImproperlyConfigured('PolygonChainClient requires the web3 package')
+        rpc_url = _setting('ANCHOR_RPC_URL', None)
+        private_key = _setting('ANCHOR_PRIVATE_KEY', None)
+        if not rpc_url or not private_key:
+            raise ImproperlyConfigured('Set ANCHOR_RPC_URL and ANCHOR_PRIVATE_KEY to anchor on Polygon')
+        self.web3 = Web3(Web3.HTTPProvider(rpc_url))
+        self.account = self.web3.eth.account.from_key(private_key)
+
+    def submit_root(self, merkle_root):
+        eth = self.web3.eth
+        transaction_data = {
+            'to': self.account.address,
+            'value': 0,
+            'data': '0x' + merkle_root,
+            'nonce': eth.get_transaction_count(self.account.address, 'pending'),
+            'chainId': eth.chain_id,
+            'gas': 30000,
+            'gasPrice': eth.gas_price,
+        }
+        signed = self.account.sign_transaction(transaction_data)
+        return eth.send_raw_transaction(signed.raw_transaction).hex()
+
+
+def get_chain_client():
+    return import_string(_setting('ANCHOR_CHAIN_CLIENT', 'core.anchoring.FakeChainClient'))()
+
+
+# Pipeline
+
+def pending_certificates():
+    return Certificate.objects.filter(status='success', is_invalidated=False, anchor_proof__isnull=True)
+
+
+def window_is_due(now=None):
+    # A batch is cut when it is full or when its oldest certificate has waited long enough
+    now = now or timezone.now()
+    max_size = _setting('ANCHOR_BATCH_MAX_SIZE', 1000)
+    max_age = timedelta(seconds=_setting('ANCHOR_BATCH_MAX_AGE', 300))
+    oldest = pending_certificates().order_by('generated_at').values_list('generated_at', flat=True).first()
+    if oldest is None:
+        return False
+    return oldest <= now - max_age or pending_certificates()[:max_size].count() >= max_size
+
+
+def create_batch():
+    # Claim up to ANCHOR_BATCH_MAX_SIZE pending certificates and store their proofs.
+    # SKIP LOCKED lets several workers cut batches at once without overlapping.
+    max_size = _setting('ANCHOR_BATCH_MAX_SIZE', 1000)
+    with transaction.atomic():
+        certificates = list(
+            pending_certificates()
+            .select_for_update(skip_locked=True, of=('self',))
+            .order_by('generated_at', 'id')
+            .values(*CANONICAL_FIELDS)[:max_size]
+        )
+        if not certificates:
+            return None
+        leaves = [leaf_hash(certificate) for certificate in certificates]
+        levels = build_tree(leaves)
+        batch = AnchorBatch.objects.create(merkle_root=levels[-1][0], size=len(leaves))
+        CertificateProof.objects.bulk_create([
+            CertificateProof(
+                certificate_id=certificate['id'], batch=batch, leaf_hash=leaves[index],
+                leaf_index=index, proof=inclusion_proof(levels, index),
+            )
+            for index, certificate in enumerate(certificates)
+        ])
+    # Cached verification results of these certificates still say "not anchored"
+    verification.evict_rows((certificate['id'], certificate['device_serial_number']) for certificate in certificates)
+    return batch
+
+
+def submit_batch(batch_id):
+    # A failed submission marks the batch 'failed' and re-raises, so the job is retried
+    # (a failed batch is submitted again on the next attempt)
+    batch = AnchorBatch.objects.get(pk=batch_id)
+    if batch.status == 'submitted':
+        return batch
+    client = get_chain_client()
+    try:
+        tx_hash = client.submit_root(batch.merkle_root)
+    except Exception as exc:
+        logger.warning("Anchoring batch %s on %s failed: %r", batch.id, client.name, exc)
+        batch.status = 'failed'
+        batch.chain = client.name
+        batch.last_error = repr(exc)
+        batch.save(update_fields=['status', 'chain', 'last_error'])
+        verification.evict_batch(batch.id)
+        raise
+    batch.tx_hash = tx_hash
+    batch.chain = client.name
+    batch.status = 'submitted'
+    batch.submitted_at = timezone.now()
+    batch.last_error = None
+    batch.save(update_fields=['tx_hash', 'chain', 'status', 'submitted_at', 'last_error'])
+    verification.evict_batch(batch.id)
+    return batch
+
+
+def anchor_pending(force=False):
+    # Cut as many batches as are due; returns the new batches (not yet submitted)
+    batches = []
+    while force or window_is_due():
+        batch = create_batch()
+        if batch is None:
+            break
+        batches.append(batch)
+        force = False # Only the first batch is forced; the rest must be due on their own
+    return batches
+
+
+def schedule_anchoring(now=None):
+    # One anchoring job per time window, due when the window closes. Certificates
+    # succeeding within the same window share the job through its idempotency key.
+    from . import jobs
+    now = now or timezone.now()
+    max_age = _setting('ANCHOR_BATCH_MAX_AGE', 300)
+    window = int(now.timestamp() // max_age)
+    window_end = (window + 1) * max_age
+    jobs.enqueue(
+        'anchor_certificates', {'window': window}, key=f'anchor-window:{window}',
+        delay=timedelta(seconds=window_end - now.timestamp()),
+    )
+
+
+def verify_certificate(certificate):
+    # Offline check: the certificate still hashes to its leaf and the leaf proves into the root
+    try:
+        proof = certificate.anchor_proof
+    except CertificateProof.DoesNotExist:
+        return {'anchored': False, 'valid': False}
+    batch = proof.batch
+    current_leaf = leaf_hash(certificate)
+    return {
+        'anchored': batch.status == 'submitted',
+        'valid': current_leaf == proof.leaf_hash and verify_proof(proof.leaf_hash, proof.proof, batch.merkle_root),
+        'leaf_hash': proof.leaf_hash,
+        'leaf_index': proof.leaf_index,
+        'proof': proof.proof,
+        'merkle_root': batch.merkle_root,
+        'batch_id': batch.id,
+        'chain': batch.chain,
+        'tx_hash': batch.tx_hash,
+        'submitted_at': batch.submitted_at,
+    }
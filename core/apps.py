@@ -1,4 +1,6 @@
 from django.apps import AppConfig
+from django.db.backends.signals import connection_created
+from django.db.models.signals import post_migrate, pre_migrate
 
 
 class CoreConfig(AppConfig):
@@ -7,3 +9,8 @@ class CoreConfig(AppConfig):
 
     def ready(self):
         import core.signals   #i added
+        import core.tasks # Registers the job handlers
+        from core import instrumentation, search
+        connection_created.connect(instrumentation.install_query_recorder) # Per-request query counts
+        pre_migrate.connect(search.enable_extensions, sender=self) # pg_trgm, before the trigram index
+        post_migrate.connect(search.install_search_index, sender=self)
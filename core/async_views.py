@@ -0,0 +1,177 @@
+# core/async_views.py
+#
+# Native async versions of the public read endpoints, for serving under ASGI
+# (cleanslate_backend/asgi.py, cleanslate_backend/gunicorn_asgi.py). DRF views are
+# synchronous, so under ASGI every request to them occupies a thread from Django's
+# sync_to_async pool. These views stay on the event loop:
+# - every middleware in settings.MIDDLEWARE is async-capable, including
+#   QueryMetricsMiddleware and ReadYourWritesMiddleware, so the handler chain isn't
+#   adapted onto a thread (a sync-only middleware added there would undo all of this);
+# - cache lookups go through the async cache API;
+# - rows are read with aiterator()/aget()/afirst(): only the query itself goes to the
+#   ORM's database thread;
+# - serialization is pure Python over values() rows or already-loaded instances
+#   (core/lean.py for listings), so it never triggers a lazy query.
+# Responses have the same JSON shapes as the DRF endpoints, with one difference: listing
+# lists always use keyset pagination (?cursor=), never page numbers with a COUNT(*).
+#
+#   GET /api/async/listings/                 like /api/listings/?pagination=keyset
+#   GET /api/async/listings/<id>/            like /api/listings/<id>/
+#   GET /api/async/categories/               like /api/categories/
+#   GET /api/async/subscription-packages/    like /api/subscription-packages/
+#   GET /api/async/verify/<key>/             like /api/verify/<key>/
+
+import math
+from functools import wraps
+
+from asgiref.sync import sync_to_async
+from django.http import HttpResponse
+from rest_framework import status
+from rest_framework.exceptions import APIException, NotFound, Throttled, ValidationError
+from rest_framework.pagination import PageNumberPagination
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+from rest_framework.settings import api_settings
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+from .cache import acached_response
+from .filters import ListingFilterBackend
+from .models import Category, Listing, ListingMedia, SubscriptionPackage
+from .pagination import ListingPagination, KeysetPagination
+from .routing import async_replica_reads
+from .serializers import CategorySerializer, SubscriptionPackageSerializer, requested_fields
+from .throttling import TokenBucketThrottle
+from . import lean, verification
+
+LISTING_CACHE_MODELS = (Listing, ListingMedia, Category)
+
+
+def json_response(data, status_code=status.HTTP_200_OK, headers=None):
+    return HttpResponse(JSONRenderer().render(data), status=status_code, content_type='application/json', headers=headers)
+
+
+def async_read_view(view):
+    # GET/HEAD only. Wraps the request so the query-param helpers shared with the DRF
+    # views (filters, pagination, ?fields=) work unchanged, and turns API exceptions into
+    # the same error bodies DRF would send.
+    @wraps(view)
+    async def wrapper(request, *args, **kwargs):
+        if request.method not in ('GET', 'HEAD'):
+            return json_response({'detail': f'Method "{request.method}" not allowed.'}, status.HTTP_405_METHOD_NOT_ALLOWED, {'Allow': 'GET, HEAD'})
+        try:
+            return await view(Request(request), *args, **kwargs)
+        except APIException as exc:
+            detail = exc.detail if isinstance(exc.detail, (dict, list)) else {'detail': exc.detail}
+            wait = getattr(exc, 'wait', None)
+            return json_response(detail, exc.status_code, {'Retry-After': str(math.ceil(wait))} if wait else None)
+    return wrapper
+
+
+# Listings
+
+def listing_fields(request):
+    fields, expand = requested_fields(request)
+    return set(lean.LISTING_FIELDS) if fields is None else fields | expand
+
+
+async def listing_queryset(request):
+    queryset = ListingFilterBackend().filter_queryset(request, Listing.objects.all(), None)
+    subtree = request.query_params.get('category_subtree')
+    if subtree is not None:
+        try:
+            subtree = int(subtree)
+        except ValueError:
+            raise ValidationError({'category_subtree': 'Must be a category id.'})
+        queryset = queryset.filter(category__in=await sync_to_async(Category.subtree_ids)(subtree))
+    return queryset
+
+
+async def serialize_listing_rows(rows, fields):
+    media = await lean.amedia_by_listing([row['id'] for row in rows]) if 'media' in fields else None
+    return lean.serialize_listings(rows, fields, media=media)
+
+
+@async_read_view
+@async_replica_reads(*LISTING_CACHE_MODELS)
+async def listing_list(request):
+    async def render():
+        fields = listing_fields(request)
+        paginator = KeysetPagination()
+        paginator.ordering = ListingPagination.ordering
+        queryset = lean.lean_listing_queryset(await listing_queryset(request), fields)
+        rows = paginator.set_page([row async for row in paginator.page_queryset(queryset, request, count=False)])
+        body = {'next': paginator.get_next_link(), 'previous': paginator.get_previous_link()}
+        body['results'] = await serialize_listing_rows(rows, fields)
+        return body
+    return await acached_response(request, 'async-listings', LISTING_CACHE_MODELS, render)
+
+
+@async_read_view
+@async_replica_reads(*LISTING_CACHE_MODELS)
+async def listing_detail(request, pk):
+    async def render():
+        fields = listing_fields(request)
+        try:
+            row = await lean.lean_listing_queryset(Listing.objects.filter(pk=pk), fields).aget()
+        except Listing.DoesNotExist:
+            raise NotFound('No Listing matches the given query.')
+        return (await serialize_listing_rows([row], fields))[0]
+    return await acached_response(request, 'async-listings', LISTING_CACHE_MODELS, render)
+
+
+# Categories and packages: small flat serializers over instances loaded with aiterator()
+
+async def page_number_list(request, queryset, serializer_class):
+    # Same body as DRF's PageNumberPagination: count, next, previous, results
+    page_size = api_settings.PAGE_SIZE
+    page = request.query_params.get(PageNumberPagination.page_query_param) or 1
+    try:
+        page = int(page)
+        if page < 1:
+            raise ValueError
+    except ValueError:
+        raise NotFound('Invalid page.')
+    count = await queryset.acount()
+    if page > 1 and (page - 1) * page_size >= count:
+        raise NotFound('Invalid page.')
+    offset = (page - 1) * page_size
+    instances = [instance async for instance in queryset[offset:offset + page_size].aiterator()]
+    url = request.build_absolute_uri()
+    previous_link = None
+    if page > 1:
+        previous_link = remove_query_param(url, 'page') if page == 2 else replace_query_param(url, 'page', page - 1)
+    return {
+        'count': count,
+        'next': replace_query_param(url, 'page', page + 1) if offset + page_size < count else None,
+        'previous': previous_link,
+        'results': serializer_class(instances, many=True, context={'request': request}).data,
+    }
+
+
+@async_read_view
+@async_replica_reads(Category)
+async def category_list(request):
+    async def render():
+        return await page_number_list(request, Category.objects.order_by('name'), CategorySerializer)
+    return await acached_response(request, 'async-categories', (Category,), render)
+
+
+@async_read_view
+@async_replica_reads(SubscriptionPackage)
+async def subscription_package_list(request):
+    async def render():
+        return await page_number_list(request, SubscriptionPackage.objects.order_by('name'), SubscriptionPackageSerializer)
+    return await acached_response(request, 'async-packages', (SubscriptionPackage,), render)
+
+
+# Certificate verification (QR code target): throttled, LRU-cached, anonymous
+
+@async_read_view
+async def certificate_verify(request, key):
+    throttle = TokenBucketThrottle()
+    if not throttle.allow_request(request, None):
+        raise Throttled(throttle.wait())
+    payload = await verification.averify(key)
+    if payload is None:
+        return json_response({'valid': False, 'detail': 'Certificate not found.'}, status.HTTP_404_NOT_FOUND)
+    return json_response(payload)
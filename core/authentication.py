@@ -0,0 +1,89 @@
+# core/authentication.py
+#
+# Token authentication without the per-request Token + User query. Resolved tokens are
+# kept in a per-process LRU with a TTL. The cache is keyed by a SHA-256 digest of the key,
+# so process memory never holds a usable bearer token. Entries are evicted by the
+# receivers in signals.py:
+# - a token is deleted (djoser token/logout) or re-saved
+# - its user is saved (password change, is_active flip) or deleted
+# - User.objects...update() touches is_active or password (UserQuerySet in models.py)
+# Other processes see those changes once their entry expires (AUTH_TOKEN_CACHE_TTL).
+#
+# The cached user is loaded with its counters deferred (credits, wipe quota, current
+# package). Those are written with set-based UPDATEs from jobs and other processes, so
+# they are read fresh when a view touches them, and a later user.save() only writes the
+# fields that were loaded instead of putting stale counters back.
+
+import copy
+import hashlib
+from datetime import timedelta
+
+from django.conf import settings
+from django.utils import timezone
+from django.utils.translation import gettext_lazy as _
+from rest_framework import exceptions
+from rest_framework.authentication import TokenAuthentication
+
+from .verification import LRUCache, _MISSING
+
+DEFERRED_USER_FIELDS = ('green_credits', 'wipes_remaining', 'free_wipes_used', 'current_subscription_package')
+
+
+class TokenCache(LRUCache):
+    def evict_user(self, *user_ids):
+        # Tokens per user are few but not indexed; a scan keeps the LRU bookkeeping simple
+        user_ids = set(user_ids)
+        with self.lock:
+            stale = [key for key, (value, _expires) in self.entries.items() if value[0].pk in user_ids]
+            for key in stale:
+                del self.entries[key]
+
+
+cache = TokenCache(
+    max_size=getattr(settings, 'AUTH_TOKEN_CACHE_SIZE', 10000),
+    ttl=getattr(settings, 'AUTH_TOKEN_CACHE_TTL', 30),
+)
+
+
+def digest(key):
+    return hashlib.sha256(key.encode('utf-8')).hexdigest()
+
+
+def expired(token):
+    max_age = getattr(settings, 'AUTH_TOKEN_MAX_AGE', None)
+    return max_age is not None and token.created < timezone.now() - timedelta(seconds=max_age)
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    def authenticate_credentials(self, key):
+        cache_key = digest(key)
+        cached = cache.get(cache_key)
+        if cached is _MISSING:
+            model = self.get_model()
+            try:
+                token = model.objects.select_related('user').defer(
+                    *(f'user__{field}' for field in DEFERRED_USER_FIELDS)
+                ).get(key=key)
+            except model.DoesNotExist:
+                raise exceptions.AuthenticationFailed(_('Invalid token.'))
+            if not token.user.is_active:
+                raise exceptions.AuthenticationFailed(_('User inactive or deleted.'))
+            cached = (token.user, token)
+            cache.set(cache_key, cached)
+        user, token = cached
+        # Checked on every request, so a token expires on time even while it is cached.
+        # Deleting it makes djoser's login (get_or_create) issue a fresh one.
+        if expired(token):
+            cache.delete(cache_key)
+            self.get_model().objects.filter(key=key).delete()
+            raise exceptions.AuthenticationFailed(_('Token has expired.'))
+        # Each request gets its own copy; the cached instance is shared between threads
+        return (copy.copy(user), token)
+
+
+def evict_token(key):
+    cache.delete(digest(key))
+
+
+def evict_user(*user_ids):
+    cache.evict_user(*user_ids)
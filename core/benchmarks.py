@@ -0,0 +1,245 @@
+# core/benchmarks.py
+#
+# In-process benchmarks (`manage.py benchmark <name>`), the counterpart of the HTTP load
+# test in core/loadtest.py for code paths that are easier to measure without a server.
+# Each benchmark returns a dict of numbers, printed as JSON by the command. They write to
+# the configured database and clean up after themselves. Run them against a scratch
+# database (e.g. one filled by seed_perf), never against production.
+
+import threading
+import time
+import uuid
+from urllib.parse import urlencode
+
+from django.contrib import admin
+from django.db import connection, connections, transaction
+from django.test import RequestFactory
+from django.utils import timezone
+
+from .models import User, Category, Certificate, Listing, ListingMedia, GreenCreditTransaction
+from .serializers import ListingSerializer
+from .admin_performance import EstimatedCountPaginator
+from .pagination import table_row_estimate
+from .seed import Seeder
+from . import ledger, lean, verification
+
+BENCHMARKS = {}
+
+
+def benchmark(name):
+    def register(function):
+        BENCHMARKS[name] = function
+        return function
+    return register
+
+
+def run_threads(count, target):
+    # Run target(index) on `count` threads; each closes its own DB connection when done
+    errors = []
+
+    def work(index):
+        try:
+            target(index)
+        except Exception as exc: # Reported, not swallowed: the benchmark result lists them
+            errors.append(repr(exc))
+        finally:
+            connections.close_all()
+
+    threads = [threading.Thread(target=work, args=(index,)) for index in range(count)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return time.perf_counter() - started, errors
+
+
+def bench_users(prefix, count):
+    tag = uuid.uuid4().hex[:8]
+    return [
+        User.objects.create_user(username=f'{prefix}-{tag}-{index}@example.com', email=f'{prefix}-{tag}-{index}@example.com')
+        for index in range(count)
+    ]
+
+
+@benchmark('ledger')
+def ledger_writers(writers=8, writes=200, users=4):
+    # Parallel ledger appends against a few hot users: every write must land in the balance
+    accounts = bench_users('bench-ledger', users)
+    try:
+        def write(index):
+            for step in range(writes):
+                ledger.record_transaction(accounts[(index + step) % users], 1, 'admin_adjustment')
+
+        elapsed, errors = run_threads(writers, write)
+        balances = sum(User.objects.filter(pk__in=[account.pk for account in accounts]).values_list('green_credits', flat=True))
+        return {
+            'writers': writers, 'writes': writers * writes, 'errors': errors, 'seconds': round(elapsed, 3),
+            'writes_per_second': round(writers * writes / elapsed, 1),
+            'lost_updates': writers * writes - len(errors) - balances,
+            'vendor': connection.vendor,
+        }
+    finally:
+        User.objects.filter(pk__in=[account.pk for account in accounts]).delete()
+
+
+@benchmark('verify')
+def verify_lookups(certificates=200, threads=8, lookups=2000):
+    # Public verification lookups: cold (every one queries the DB) vs warm (served by the LRU)
+    owner, = bench_users('bench-verify', 1)
+    tag = uuid.uuid4().hex[:8]
+    serials = [f'bench-{tag}-{index}' for index in range(certificates)]
+    Certificate.objects.bulk_create([
+        Certificate(user=owner, device_serial_number=serial, wiping_method='nist_clear', status='success', wiped_at=timezone.now())
+        for serial in serials
+    ])
+    per_thread = lookups // threads
+
+    def lookup(index):
+        for step in range(per_thread):
+            verification.verify(serials[(index * per_thread + step) % certificates])
+
+    def measure():
+        hits, misses = verification.cache.hits, verification.cache.misses
+        elapsed, errors = run_threads(threads, lookup)
+        return {
+            'errors': errors, 'seconds': round(elapsed, 3), 'lookups_per_second': round(per_thread * threads / elapsed, 1),
+            'hits': verification.cache.hits - hits, 'misses': verification.cache.misses - misses,
+        }
+
+    try:
+        verification.cache.clear()
+        max_size, verification.cache.max_size = verification.cache.max_size, 0 # Nothing is kept: every lookup misses
+        try:
+            cold = measure()
+        finally:
+            verification.cache.max_size = max_size
+        for serial in serials:
+            verification.verify(serial)
+        warm = measure()
+        return {'lookups': per_thread * threads, 'cold': cold, 'warm': warm, 'vendor': connection.vendor}
+    finally:
+        verification.cache.clear()
+        User.objects.filter(pk=owner.pk).delete()
+
+
+@benchmark('lean')
+def lean_listings(sizes='10,100,1000', repeat=5, fields=''):
+    # Listing grid output: the lean .values() path (core/lean.py) vs ListingSerializer over the
+    # same rows, each with one media item. Best of `repeat` runs, queries included.
+    sizes = [int(size) for size in str(sizes).split(',')]
+    fields = set(str(fields).split(',')) if fields else set(lean.LISTING_FIELDS)
+    owner, = bench_users('bench-lean', 1)
+    category = Category.objects.create(name=f'bench-lean-{uuid.uuid4().hex[:8]}')
+    listings = Listing.objects.bulk_create([
+        Listing(
+            user=owner, title=f'Listing {index}', price=100 + index, category=category, brand='Lenovo', health_score=90,
+            primary_media_url=f'https://cdn.example.com/{index}.jpg',
+        )
+        for index in range(max(sizes))
+    ])
+    ListingMedia.objects.bulk_create([
+        ListingMedia(listing=listing, file_url=listing.primary_media_url, is_primary=True, position=0)
+        for listing in listings
+    ])
+    queryset = Listing.objects.filter(user=owner).select_related('user', 'category', 'certificate').order_by('id')
+
+    def serialized(rows):
+        serializer = ListingSerializer(queryset.prefetch_related('media')[:rows], many=True)
+        for name in set(serializer.child.fields) - fields:
+            serializer.child.fields.pop(name)
+        return serializer.data
+
+    def lean_output(rows):
+        return lean.serialize_listings(list(lean.lean_listing_queryset(queryset, fields)[:rows]), fields)
+
+    def best(function, rows):
+        timings = []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            function(rows)
+            timings.append(time.perf_counter() - started)
+        return min(timings)
+
+    try:
+        results = {}
+        for rows in sizes:
+            serializer_seconds, lean_seconds = best(serialized, rows), best(lean_output, rows)
+            results[rows] = {
+                'serializer_ms': round(serializer_seconds * 1000, 2), 'lean_ms': round(lean_seconds * 1000, 2),
+                'speedup': round(serializer_seconds / lean_seconds, 1),
+            }
+        return {'fields': sorted(fields), 'repeat': repeat, 'rows': results, 'vendor': connection.vendor}
+    finally:
+        User.objects.filter(pk=owner.pk).delete()
+        category.delete()
+
+
+# (model, changelist query string) pairs timed by the 'changelist' benchmark
+CHANGELIST_PAGES = [
+    (User, {}),
+    (Certificate, {}),
+    (Certificate, {'status__exact': 'success'}),
+    (Listing, {}),
+    (Listing, {'status__exact': 'active'}),
+    (GreenCreditTransaction, {}),
+]
+
+
+@benchmark('changelist')
+def admin_changelists(users=20000, listings=200000, certificates=200000, transactions=500000, repeat=3, seed=0):
+    # Admin changelist page loads on big tables. An empty database is filled by core.seed at
+    # the given sizes first; otherwise the existing rows (e.g. from seed_perf) are used.
+    # Everything runs in one transaction that is rolled back, seeded rows included.
+    # The count estimates only kick in on PostgreSQL: other backends always do an exact COUNT(*).
+    factory = RequestFactory()
+    counted = []
+
+    def count_queries(execute, sql, params, many, context):
+        counted.append(sql)
+        return execute(sql, params, many, context)
+
+    def load(model, params):
+        request = factory.get(f'/admin/{model._meta.app_label}/{model._meta.model_name}/', params)
+        request.user = staff
+        response = admin.site._registry[model].changelist_view(request)
+        response.render()
+        assert response.status_code == 200, response.status_code
+
+    with transaction.atomic():
+        seeded = not any(model.objects.exists() for model in (User, Certificate, Listing, GreenCreditTransaction))
+        if seeded:
+            Seeder(
+                seed=seed, users=users, listings=listings, certificates=certificates, transactions=transactions,
+                end=timezone.now().replace(hour=0, minute=0, second=0, microsecond=0),
+            ).run()
+            if connection.vendor == 'postgresql':
+                # Fresh reltuples for table_row_estimate (ANALYZE also sees this transaction's rows)
+                with connection.cursor() as cursor:
+                    for model in {model for model, _ in CHANGELIST_PAGES}:
+                        cursor.execute(f'ANALYZE {connection.ops.quote_name(model._meta.db_table)}')
+        email = f'bench-admin-{uuid.uuid4().hex[:8]}@example.com'
+        staff = User.objects.create_superuser(username=email, email=email)
+        pages = {}
+        try:
+            for model, params in CHANGELIST_PAGES:
+                load(model, params) # Fills the cached filter choices
+                timings = []
+                for _ in range(repeat):
+                    counted.clear()
+                    started = time.perf_counter()
+                    with connection.execute_wrapper(count_queries):
+                        load(model, params)
+                    timings.append(time.perf_counter() - started)
+                started = time.perf_counter()
+                rows = model.objects.filter(**params).count()
+                exact_seconds = time.perf_counter() - started
+                estimate = table_row_estimate(model)
+                pages[model._meta.label + (f'?{urlencode(params)}' if params else '')] = {
+                    'ms': round(min(timings) * 1000, 2), 'queries': len(counted), 'rows': rows,
+                    'paginator_count': EstimatedCountPaginator(model.objects.filter(**params).order_by('pk'), 100).count,
+                    'exact_count_ms': round(exact_seconds * 1000, 2), 'reltuples': estimate,
+                }
+        finally:
+            transaction.set_rollback(True)
+    return {'seeded': seeded, 'repeat': repeat, 'pages': pages, 'vendor': connection.vendor}
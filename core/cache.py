@@ -0,0 +1,219 @@
+# core/cache.py
+#
+# Read-through cache for the public catalog endpoints (categories, packages, listings).
+# Entries live in the 'catalog' cache alias (local memory by default, Redis in production;
+# see CACHES in settings.py). Keys embed a version number per model; the post_save /
+# post_delete receivers in core/signals.py bump the version, which orphans every entry
+# built from the old data without having to find and delete them.
+
+import hashlib
+import threading
+from collections import Counter
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from django.http import HttpResponse, HttpResponseNotModified
+from rest_framework import status
+from rest_framework.renderers import JSONRenderer
+from rest_framework.response import Response
+
+CATALOG_CACHE_ALIAS = getattr(settings, 'CATALOG_CACHE_ALIAS', 'catalog')
+CATALOG_CACHE_TIMEOUT = getattr(settings, 'CATALOG_CACHE_TIMEOUT', 300)
+# Only tracked when there are read replicas (see core/routing.py)
+REPLICA_MAX_LAG = getattr(settings, 'DATABASE_REPLICA_MAX_LAG', 5) if getattr(settings, 'DATABASE_REPLICAS', None) else 0
+
+_stats = Counter()
+_stats_lock = threading.Lock()
+
+
+def get_cache():
+    return caches[CATALOG_CACHE_ALIAS]
+
+
+def _count(name):
+    with _stats_lock:
+        _stats[name] += 1
+
+
+def cache_stats():
+    # Process-local hit/miss counters, e.g. {'listings.hit': 10, 'listings.miss': 2}
+    with _stats_lock:
+        return dict(_stats)
+
+
+def model_label(model):
+    return model._meta.label_lower
+
+
+def _version_key(label):
+    return f'catalog:ver:{label}'
+
+
+def get_versions(labels):
+    cache = get_cache()
+    keys = [_version_key(label) for label in labels]
+    found = cache.get_many(keys)
+    missing = {key: 1 for key in keys if key not in found}
+    if missing:
+        cache.set_many(missing, timeout=None)
+        found.update(missing)
+    return [found[key] for key in keys]
+
+
+async def aget_versions(labels):
+    # get_versions() for async views
+    cache = get_cache()
+    keys = [_version_key(label) for label in labels]
+    found = await cache.aget_many(keys)
+    missing = {key: 1 for key in keys if key not in found}
+    if missing:
+        await cache.aset_many(missing, timeout=None)
+        found.update(missing)
+    return [found[key] for key in keys]
+
+
+def bump_version(label):
+    cache = get_cache()
+    key = _version_key(label)
+    try:
+        cache.incr(key)
+    except ValueError:
+        # Version was never read (or evicted): any value newer than the default works
+        cache.set(key, 2, timeout=None)
+    if REPLICA_MAX_LAG:
+        # Replicas may not have the change yet; core/routing.py keeps cache fills on the
+        # primary until they have (marked once the write commits)
+        transaction.on_commit(lambda: cache.set(_bumped_key(label), 1, timeout=REPLICA_MAX_LAG))
+
+
+def invalidate(*models):
+    # Bump the models' versions once the current transaction commits. Bumping earlier would
+    # let a concurrent reader cache the pre-commit rows under the new version. Writes that
+    # send no post_save (queryset .update(), bulk paths) call this themselves.
+    labels = [model_label(model) for model in models]
+    transaction.on_commit(lambda: [bump_version(label) for label in labels])
+
+
+def _bumped_key(label):
+    return f'catalog:bumped:{label}'
+
+
+def recently_bumped(labels):
+    # True if one of the models changed within the replica lag window
+    return bool(labels) and bool(REPLICA_MAX_LAG) and bool(get_cache().get_many([_bumped_key(label) for label in labels]))
+
+
+def make_key(namespace, labels, *parts):
+    return _build_key(namespace, get_versions(labels), parts)
+
+
+async def amake_key(namespace, labels, *parts):
+    return _build_key(namespace, await aget_versions(labels), parts)
+
+
+def _build_key(namespace, versions, parts):
+    versions = '.'.join(str(version) for version in versions)
+    digest = hashlib.sha1('|'.join(str(part) for part in parts).encode('utf-8')).hexdigest()
+    return f'catalog:{namespace}:{versions}:{digest}'
+
+
+def cached_value(namespace, models, builder, *parts, timeout=None):
+    # Queryset-level read-through: builder() is only called on a miss.
+    # The result has to be picklable (evaluate querysets with list()/values() first).
+    cache = get_cache()
+    key = make_key(namespace, [model_label(model) for model in models], *parts)
+    value = cache.get(key)
+    if value is not None:
+        _count(f'{namespace}.hit')
+        return value
+    _count(f'{namespace}.miss')
+    value = builder()
+    cache.set(key, value, timeout=CATALOG_CACHE_TIMEOUT if timeout is None else timeout)
+    return value
+
+
+def compute_etag(data):
+    return '"%s"' % hashlib.md5(JSONRenderer().render(data)).hexdigest()
+
+
+def etag_matches(request, etag):
+    header = request.META.get('HTTP_IF_NONE_MATCH')
+    if not header:
+        return False
+    candidates = [candidate.strip() for candidate in header.split(',')]
+    return '*' in candidates or etag in candidates or f'W/{etag}' in candidates
+
+
+# ViewSet mixin: caches list/retrieve response data plus an ETag.
+# A matching If-None-Match gets a 304 straight from the cache, without touching the DB or serializers.
+class CachedResponseMixin:
+    cache_actions = ('list', 'retrieve')
+    cache_models = ()  # Models whose changes invalidate the cached responses
+    cache_timeout = None
+
+    def get_cache_namespace(self):
+        return self.basename
+
+    def get_cache_key(self, request):
+        return make_key(
+            self.get_cache_namespace(),
+            [model_label(model) for model in self.cache_models],
+            self.action,
+            request.get_full_path(),
+        )
+
+    def cached_response(self, request, render):
+        namespace = self.get_cache_namespace()
+        cache = get_cache()
+        key = self.get_cache_key(request)
+        entry = cache.get(key)
+        if entry is not None:
+            _count(f'{namespace}.hit')
+        else:
+            _count(f'{namespace}.miss')
+            response = render()
+            if response.status_code != status.HTTP_200_OK:
+                return response
+            entry = {'etag': compute_etag(response.data), 'data': response.data}
+            cache.set(key, entry, timeout=CATALOG_CACHE_TIMEOUT if self.cache_timeout is None else self.cache_timeout)
+
+        headers = {'ETag': entry['etag']}
+        if etag_matches(request, entry['etag']):
+            _count(f'{namespace}.not_modified')
+            return Response(status=status.HTTP_304_NOT_MODIFIED, headers=headers)
+        return Response(entry['data'], headers=headers)
+
+    def list(self, request, *args, **kwargs):
+        if 'list' not in self.cache_actions:
+            return super().list(request, *args, **kwargs)
+        return self.cached_response(request, lambda: super(CachedResponseMixin, self).list(request, *args, **kwargs))
+
+    def retrieve(self, request, *args, **kwargs):
+        if 'retrieve' not in self.cache_actions:
+            return super().retrieve(request, *args, **kwargs)
+        return self.cached_response(request, lambda: super(CachedResponseMixin, self).retrieve(request, *args, **kwargs))
+
+
+async def acached_response(request, namespace, models, render):
+    # cached_response() for the async views (core/async_views.py). `render` is a coroutine
+    # function returning the response data. Entries hold the rendered JSON, so a hit is
+    # one cache read and no serialization at all.
+    cache = get_cache()
+    key = await amake_key(namespace, [model_label(model) for model in models], request.get_full_path())
+    entry = await cache.aget(key)
+    if entry is not None:
+        _count(f'{namespace}.hit')
+    else:
+        _count(f'{namespace}.miss')
+        body = JSONRenderer().render(await render())
+        entry = {'etag': '"%s"' % hashlib.md5(body).hexdigest(), 'body': body}
+        await cache.aset(key, entry, timeout=CATALOG_CACHE_TIMEOUT)
+
+    if etag_matches(request, entry['etag']):
+        _count(f'{namespace}.not_modified')
+        response = HttpResponseNotModified()
+    else:
+        response = HttpResponse(entry['body'], content_type='application/json')
+    response['ETag'] = entry['etag']
+    return response
@@ -0,0 +1,159 @@
+# core/export.py
+#
+# Streaming compliance exports of certificates and the green credit ledger. Rows are read
+# with a server-side cursor (.iterator(chunk_size=...)) as plain value tuples and encoded
+# one chunk at a time, so memory stays flat however many rows an account has. Output is
+# CSV or NDJSON, optionally gzipped on the fly. Rows come out in (time, id) order, which
+# makes an interrupted export resumable: pass the id of the last row received as
+# resume_after and the export continues right after it (a keyset seek, not an OFFSET).
+# A resumed CSV export has no header row, so it can be appended to the partial file.
+
+import csv
+import io
+import json
+import zlib
+from datetime import date, datetime
+from decimal import Decimal
+from uuid import UUID
+
+from django.core.exceptions import ValidationError
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+
+from .models import Certificate, GreenCreditTransaction
+from .pagination import keyset_filter
+
+CHUNK_SIZE = 2000
+OUTPUT_FORMATS = {
+    'csv': 'text/csv; charset=utf-8',
+    'ndjson': 'application/x-ndjson',
+}
+
+# name -> model, timestamp column used for range filters and ordering, exported columns
+EXPORTS = {
+    'certificates': {
+        'model': Certificate,
+        'time_field': 'generated_at',
+        'fields': (
+            'id', 'user_id', 'user__email', 'device_serial_number', 'device_type', 'operating_system',
+            'wiping_method', 'status', 'wiped_at', 'completed_at', 'generated_at',
+            'health_score_at_wipe', 'blockchain_tx_hash', 'is_invalidated',
+        ),
+    },
+    'credits': {
+        'model': GreenCreditTransaction,
+        'time_field': 'transaction_time',
+        'fields': (
+            'id', 'user_id', 'user__email', 'transaction_type', 'amount', 'transaction_time',
+            'certificate_id', 'listing_id', 'description',
+        ),
+    },
+}
+
+
+class ExportError(ValueError):
+    pass
+
+
+def _column(field):
+    return field.replace('__', '_')
+
+
+def parse_bound(value, name):
+    # Accepts an ISO datetime or a plain date (midnight, current timezone)
+    if value in (None, ''):
+        return None
+    parsed = parse_datetime(value)
+    if parsed is None:
+        day = parse_date(value)
+        if day is None:
+            raise ExportError(f"'{name}' must be an ISO 8601 date or datetime.")
+        parsed = datetime(day.year, day.month, day.day)
+    if timezone.is_naive(parsed):
+        parsed = timezone.make_aware(parsed)
+    return parsed
+
+
+def parse_user(value):
+    # Validated up front: a bad id only fails once the response is already streaming
+    if value in (None, ''):
+        return None
+    try:
+        return UUID(str(value))
+    except ValueError:
+        raise ExportError("'user' must be a user id.")
+
+
+def export_queryset(name, queryset=None, since=None, until=None, resume_after=None):
+    # Rows to export as value tuples, oldest first. `queryset` narrows the rows (e.g. to
+    # one user); since is inclusive, until exclusive.
+    spec = EXPORTS[name]
+    model, time_field = spec['model'], spec['time_field']
+    queryset = model.objects.all() if queryset is None else queryset
+    if since is not None:
+        queryset = queryset.filter(**{f'{time_field}__gte': since})
+    if until is not None:
+        queryset = queryset.filter(**{f'{time_field}__lt': until})
+    ordering = (time_field, 'id')
+    if resume_after is not None:
+        try:
+            position = queryset.filter(pk=resume_after).values_list(*ordering).first()
+        except (ValueError, TypeError, ValidationError):
+            position = None
+        if position is None:
+            raise ExportError(f"'resume_after' does not match an exported {name} row.")
+        queryset = queryset.filter(keyset_filter(ordering, position))
+    return queryset.select_related(None).prefetch_related(None).order_by(*ordering).values_list(*spec['fields'])
+
+
+def _plain(value):
+    if isinstance(value, datetime):
+        return value.isoformat().replace('+00:00', 'Z')
+    if isinstance(value, date):
+        return value.isoformat()
+    if isinstance(value, (UUID, Decimal)):
+        return str(value)
+    return value
+
+
+def encode_rows(name, rows, output='csv', header=True):
+    # Yields encoded chunks: the CSV header first (unless header=False), then one chunk per CHUNK_SIZE rows
+    columns = [_column(field) for field in EXPORTS[name]['fields']]
+    buffer = io.StringIO()
+    writer = csv.writer(buffer) if output == 'csv' else None
+    if writer is not None and header:
+        writer.writerow(columns)
+    pending = 0
+    for row in rows:
+        values = [_plain(value) for value in row]
+        if writer is not None:
+            writer.writerow(['' if value is None else value for value in values])
+        else:
+            buffer.write(json.dumps(dict(zip(columns, values)), separators=(',', ':')))
+            buffer.write('\n')
+        pending += 1
+        if pending >= CHUNK_SIZE:
+            yield buffer.getvalue().encode('utf-8')
+            buffer.seek(0)
+            buffer.truncate()
+            pending = 0
+    if buffer.tell():
+        yield buffer.getvalue().encode('utf-8')
+
+
+def gzip_chunks(chunks):
+    # Streaming gzip (wbits=31 writes the gzip header and trailer)
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31)
+    for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+def stream_export(name, queryset=None, output='csv', since=None, until=None, resume_after=None, compress=False):
+    if output not in OUTPUT_FORMATS:
+        raise ExportError(f"'output' must be one of: {', '.join(OUTPUT_FORMATS)}.")
+    rows = export_queryset(name, queryset, since, until, resume_after).iterator(chunk_size=CHUNK_SIZE)
+    chunks = encode_rows(name, rows, output, header=resume_after is None)
+    return gzip_chunks(chunks) if compress else chunks
@@ -0,0 +1,82 @@
+# core/filters.py
+#
+# Query parameter filters for the listing browse endpoints. Every parameter is validated
+# up front and a bad value is a 400, never a silently ignored filter. Each filter lines
+# up with an index in Listing.Meta so browsing doesn't fall back to scanning the table.
+
+from decimal import Decimal, InvalidOperation
+
+from rest_framework.exceptions import ValidationError
+from rest_framework.filters import BaseFilterBackend
+
+from .models import Listing
+
+TRUE_VALUES = ('1', 'true', 'yes')
+FALSE_VALUES = ('0', 'false', 'no')
+
+
+def parse_choices(value, choices, name):
+    # Comma-separated list of choice values, e.g. ?status=active,pending
+    allowed = {choice for choice, _ in choices}
+    values = [item.strip() for item in value.split(',') if item.strip()]
+    invalid = [item for item in values if item not in allowed]
+    if invalid or not values:
+        raise ValidationError({name: f"Must be one or more of: {', '.join(sorted(allowed))}."})
+    return values
+
+
+def parse_decimal(value, name):
+    try:
+        number = Decimal(value)
+    except InvalidOperation:
+        raise ValidationError({name: 'Must be a number.'})
+    if not number.is_finite() or number < 0:
+        raise ValidationError({name: 'Must be a non-negative number.'})
+    return number
+
+
+def parse_int(value, name, minimum=None, maximum=None):
+    try:
+        number = int(value)
+    except ValueError:
+        raise ValidationError({name: 'Must be a whole number.'})
+    if (minimum is not None and number < minimum) or (maximum is not None and number > maximum):
+        raise ValidationError({name: f'Must be between {minimum} and {maximum}.'})
+    return number
+
+
+def parse_bool(value, name):
+    value = value.lower()
+    if value in TRUE_VALUES:
+        return True
+    if value in FALSE_VALUES:
+        return False
+    raise ValidationError({name: 'Must be true or false.'})
+
+
+class ListingFilterBackend(BaseFilterBackend):
+    # ?status=active,pending  ?category=<id>  ?condition=new,like_new
+    # ?price_min=&price_max=  ?health_min=  ?redeemable=true
+    def filter_queryset(self, request, queryset, view):
+        params = request.query_params
+        filters = {}
+        if params.get('status'):
+            filters['status__in'] = parse_choices(params['status'], Listing.STATUS_CHOICES, 'status')
+        if params.get('condition'):
+            filters['condition__in'] = parse_choices(params['condition'], Listing.CONDITION_CHOICES, 'condition')
+        if params.get('category'):
+            filters['category_id'] = parse_int(params['category'], 'category')
+        if params.get('price_min'):
+            filters['price__gte'] = parse_decimal(params['price_min'], 'price_min')
+        if params.get('price_max'):
+            filters['price__lte'] = parse_decimal(params['price_max'], 'price_max')
+        if 'price__gte' in filters and 'price__lte' in filters and filters['price__gte'] > filters['price__lte']:
+            raise ValidationError({'price_min': 'Must not be greater than price_max.'})
+        if params.get('health_min'):
+            filters['health_score__gte'] = parse_int(params['health_min'], 'health_min', 0, 100)
+        if params.get('redeemable'):
+            filters['is_redeemable_with_green_credits'] = parse_bool(params['redeemable'], 'redeemable')
+        # A single status becomes an equality so the partial indexes on status='active' apply
+        if len(filters.get('status__in', ())) == 1:
+            filters['status'] = filters.pop('status__in')[0]
+        return queryset.filter(**filters) if filters else queryset
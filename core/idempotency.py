@@ -0,0 +1,113 @@
+# core/idempotency.py
+#
+# Idempotency-Key support for the create endpoints. Wiping stations on flaky networks
+# retry their POSTs. A retry that carries the same Idempotency-Key header gets the
+# original response replayed from IdempotencyRecord. The serializer never runs again,
+# and neither do the writes.
+#
+# The record is inserted in the same transaction as the writes it guards, before they
+# run. A concurrent duplicate therefore blocks on the unique index until the first
+# request finishes. It then replays the stored response if the first request committed,
+# or runs normally if it rolled back. Only 2xx responses are stored. An error rolls the
+# record back with everything else, so the request can simply be retried. Records
+# expire after IDEMPOTENCY_KEY_TTL seconds and are purged by
+# `manage.py runworkers --purge-idempotency-keys`.
+
+import hashlib
+import json
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.exceptions import APIException, ValidationError
+from rest_framework.response import Response
+
+from .models import IdempotencyRecord
+
+HEADER = 'HTTP_IDEMPOTENCY_KEY'
+MAX_KEY_LENGTH = 255
+
+
+class IdempotencyKeyReused(APIException):
+    status_code = status.HTTP_422_UNPROCESSABLE_ENTITY
+    default_detail = 'This Idempotency-Key was already used with a different request body.'
+    default_code = 'idempotency_key_reused'
+
+
+def fingerprint(data):
+    # Hash of the parsed request body; a key may only be replayed for the same payload
+    encoded = json.dumps(data, sort_keys=True, cls=DjangoJSONEncoder, separators=(',', ':'))
+    return hashlib.sha256(encoded.encode('utf-8')).hexdigest()
+
+
+def replay(record):
+    response = Response(record.response_body, status=record.status_code)
+    response['Idempotent-Replayed'] = 'true'
+    return response
+
+
+def _claim(user_id, scope, key, request_hash):
+    # Insert the record inside the caller's transaction. Returns None once this request
+    # owns the key, or the stored record of an earlier request to replay.
+    now = timezone.now()
+    while True:
+        try:
+            with transaction.atomic():
+                IdempotencyRecord.objects.create(
+                    user_id=user_id, scope=scope, key=key, request_hash=request_hash,
+                    expires_at=now + timedelta(seconds=getattr(settings, 'IDEMPOTENCY_KEY_TTL', 86400)),
+                )
+            return None
+        except IntegrityError:
+            # The INSERT waited for the other request to commit, so its record is visible now
+            record = IdempotencyRecord.objects.filter(user_id=user_id, scope=scope, key=key).first()
+        if record is None:
+            continue # Purged in between
+        if record.expires_at <= now:
+            IdempotencyRecord.objects.filter(pk=record.pk, expires_at__lte=now).delete()
+            continue
+        if record.request_hash != request_hash:
+            raise IdempotencyKeyReused()
+        return record
+
+
+def run_once(request, scope, handler):
+    # Run `handler()` (which returns a Response) at most once per Idempotency-Key
+    key = request.META.get(HEADER)
+    if not key or not request.user.is_authenticated:
+        return handler()
+    if len(key) > MAX_KEY_LENGTH:
+        raise ValidationError({'detail': f'Idempotency-Key must be at most {MAX_KEY_LENGTH} characters.'})
+    request_hash = fingerprint(request.data)
+    with transaction.atomic():
+        record = _claim(request.user.pk, scope, key, request_hash)
+        if record is not None:
+            return replay(record)
+        response = handler()
+        if not status.is_success(response.status_code):
+            transaction.set_rollback(True) # Nothing is stored, a retry runs again
+            return response
+        IdempotencyRecord.objects.filter(user_id=request.user.pk, scope=scope, key=key).update(
+            status_code=response.status_code,
+            response_body=json.loads(json.dumps(response.data, cls=DjangoJSONEncoder)),
+        )
+    return response
+
+
+def purge_expired(now=None):
+    return IdempotencyRecord.objects.filter(expires_at__lte=now or timezone.now()).delete()[0]
+
+
+class IdempotentCreateMixin:
+    # Honors Idempotency-Key on create(); extra actions wrap their body in run_once()
+    idempotency_scope = None
+
+    def get_idempotency_scope(self, action=None):
+        return f'{self.idempotency_scope or self.basename}.{action or self.action}'
+
+    def create(self, request, *args, **kwargs):
+        create = super().create
+        return run_once(request, self.get_idempotency_scope('create'), lambda: create(request, *args, **kwargs))
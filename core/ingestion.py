@@ -0,0 +1,114 @@
+# core/ingestion.py
+#
+# Bulk certificate ingestion for wiping stations. A whole batch is validated in one pass,
+# deduplicated against the DB with one IN query per chunk, and inserted with bulk_create
+# after the chunk's wipes are reserved in one conditional UPDATE (core/quota.py). When the
+# quota runs out part way, the certificates that fit are created in batch order and only
+# the rest are rejected (status 'rejected', code 'quota_exceeded'); failed wipes never
+# need quota. Credits, QR codes and notifications are enqueued as one job per chunk
+# (bulk_create skips the post_save receivers).
+
+from django.db import transaction
+
+from .models import Certificate
+from .serializers import CertificateBulkItemSerializer
+from . import analytics, anchoring, jobs, quota
+
+MAX_BULK_CERTIFICATES = 5000
+BULK_CHUNK_SIZE = 500
+
+
+def validate_batch(items):
+    # Returns (valid, results): valid is a list of (index, validated_data)
+    valid, results = [], [None] * len(items)
+    seen_serials = set()
+    for index, item in enumerate(items):
+        if not isinstance(item, dict):
+            results[index] = {'index': index, 'status': 'invalid', 'errors': {'non_field_errors': ['Expected an object.']}}
+            continue
+        serializer = CertificateBulkItemSerializer(data=item)
+        if not serializer.is_valid():
+            results[index] = {'index': index, 'status': 'invalid', 'errors': serializer.errors}
+            continue
+        serial = serializer.validated_data['device_serial_number']
+        if serial in seen_serials:
+            results[index] = {'index': index, 'status': 'duplicate', 'device_serial_number': serial}
+            continue
+        seen_serials.add(serial)
+        valid.append((index, serializer.validated_data))
+    return valid, results
+
+
+def ingest_certificates(user, items, chunk_size=BULK_CHUNK_SIZE):
+    valid, results = validate_batch(items)
+
+    for start in range(0, len(valid), chunk_size):
+        chunk = valid[start:start + chunk_size]
+        serials = [data['device_serial_number'] for _, data in chunk]
+        existing = set(
+            Certificate.objects.filter(device_serial_number__in=serials).values_list('device_serial_number', flat=True)
+        )
+
+        pending = []
+        for index, data in chunk:
+            if data['device_serial_number'] in existing:
+                results[index] = {'index': index, 'status': 'duplicate', 'device_serial_number': data['device_serial_number']}
+            else:
+                pending.append((index, Certificate(user=user, **data)))
+        if not pending:
+            continue
+
+        with transaction.atomic():
+            needing_quota = [index for index, cert in pending if quota.consumes_quota(cert.status)]
+            granted = quota.reserve_up_to(user.pk, len(needing_quota))
+            over_quota = set(needing_quota[granted:])
+            for index, cert in pending:
+                if index in over_quota:
+                    results[index] = {
+                        'index': index, 'status': 'rejected', 'device_serial_number': cert.device_serial_number,
+                        'code': quota.QuotaExceeded.default_code,
+                        'errors': {'non_field_errors': [str(quota.QuotaExceeded.default_detail)]},
+                    }
+            pending = [(index, cert) for index, cert in pending if index not in over_quota]
+            if not pending:
+                continue
+            # ignore_conflicts covers a serial inserted by another station since the IN check;
+            # ids are generated client-side, so re-reading them tells us what actually landed
+            Certificate.objects.bulk_create([cert for _, cert in pending], ignore_conflicts=True)
+            inserted = set(
+                Certificate.objects.filter(pk__in=[cert.pk for _, cert in pending]).values_list('pk', flat=True)
+            )
+            created, lost = [], 0
+            for index, cert in pending:
+                if cert.pk in inserted:
+                    created.append(cert)
+                    results[index] = {'index': index, 'status': 'created', 'id': str(cert.pk), 'device_serial_number': cert.device_serial_number}
+                else:
+                    lost += quota.consumes_quota(cert.status)
+                    results[index] = {'index': index, 'status': 'duplicate', 'device_serial_number': cert.device_serial_number}
+            quota.release(user.pk, lost) # Wipes reserved for rows another station beat us to
+            apply_wipe_side_effects(user, created)
+
+    return results
+
+
+def apply_wipe_side_effects(user, certificates):
+    if not certificates:
+        return
+    # Keyed on the first certificate id, which is unique to this chunk
+    key = certificates[0].pk
+    payload = {'certificate_ids': [str(cert.pk) for cert in certificates]}
+    jobs.enqueue('generate_qr_code', payload, key=f'qr-batch:{key}')
+    jobs.enqueue('send_wipe_notification', payload, key=f'notify-batch:{key}')
+    analytics.schedule_refresh()
+    awarded = [str(cert.pk) for cert in certificates if cert.status == 'success']
+    if awarded:
+        jobs.enqueue('award_wipe_credits', {'certificate_ids': awarded}, key=f'credits-batch:{key}')
+        anchoring.schedule_anchoring()
+
+
+def summarize(results):
+    summary = {'created': 0, 'duplicate': 0, 'invalid': 0, 'rejected': 0}
+    for result in results:
+        summary[result['status']] += 1
+    return summary
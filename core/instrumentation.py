@@ -0,0 +1,257 @@
+# core/instrumentation.py
+#
+# Per-request cost accounting: SQL query count, DB time, serialization time and total
+# latency, labelled by viewset and action. QueryMetricsMiddleware collects the numbers,
+# adds a Server-Timing header and feeds a process-local registry that metrics_view
+# exposes in Prometheus text format. Viewsets opt in with InstrumentedViewMixin, which
+# labels the request, times serializer output and declares per-action query budgets.
+
+import hmac
+import logging
+import threading
+import time
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.http import HttpResponse, HttpResponseForbidden
+
+from . import cache
+
+logger = logging.getLogger(__name__)
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+_current = ContextVar('request_metrics', default=None)
+
+
+class QueryBudgetExceeded(Exception):
+    pass
+
+
+class RequestMetrics:
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.queries = 0
+        self.db_time = 0.0
+        self.serialization_time = 0.0
+        self.serializing = False
+        self.label = None
+        self.budget = None
+
+    def query_wrapper(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.queries += 1
+            self.db_time += time.perf_counter() - start
+
+
+def current_metrics():
+    return _current.get()
+
+
+def record_query(execute, sql, params, many, context):
+    # On every connection (install_query_recorder), counting towards the current request if
+    # there is one. Connection objects are per thread, so a wrapper added around the request
+    # would miss the async ORM's queries; the ContextVar follows them onto its DB thread.
+    metrics = _current.get()
+    if metrics is None:
+        return execute(sql, params, many, context)
+    return metrics.query_wrapper(execute, sql, params, many, context)
+
+
+def install_query_recorder(sender, connection, **kwargs):
+    # connection_created receiver (core/apps.py). The wrapper list outlives reconnects.
+    if record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(record_query)
+
+
+# Process-local registry, keyed by (view, action, method)
+
+class MetricsRegistry:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.series = {}
+
+    def record(self, labels, metrics, latency, status_code):
+        with self.lock:
+            series = self.series.setdefault(labels, {
+                'requests': 0, 'errors': 0, 'queries': 0, 'db_seconds': 0.0,
+                'serialization_seconds': 0.0, 'latency_seconds': 0.0,
+                'buckets': [0] * len(LATENCY_BUCKETS),
+            })
+            series['requests'] += 1
+            series['errors'] += status_code >= 500
+            series['queries'] += metrics.queries
+            series['db_seconds'] += metrics.db_time
+            series['serialization_seconds'] += metrics.serialization_time
+            series['latency_seconds'] += latency
+            for i, bound in enumerate(LATENCY_BUCKETS):
+                if latency <= bound:
+                    series['buckets'][i] += 1
+
+    def snapshot(self):
+        with self.lock:
+            return {labels: {**series, 'buckets': list(series['buckets'])} for labels, series in self.series.items()}
+
+    def reset(self):
+        with self.lock:
+            self.series.clear()
+
+
+registry = MetricsRegistry()
+
+
+class QueryMetricsMiddleware:
+    # Sync- and async-capable, so under ASGI the request stays on the event loop. Queries
+    # are counted by record_query through the metrics ContextVar.
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        metrics = RequestMetrics()
+        token = _current.set(metrics)
+        try:
+            response = self.get_response(request)
+        finally:
+            _current.reset(token)
+        return self.finish(request, response, metrics)
+
+    async def __acall__(self, request):
+        metrics = RequestMetrics()
+        token = _current.set(metrics)
+        try:
+            response = await self.get_response(request)
+        finally:
+            _current.reset(token)
+        return self.finish(request, response, metrics)
+
+    def finish(self, request, response, metrics):
+        latency = time.perf_counter() - metrics.started
+        response['Server-Timing'] = ', '.join([
+            f'db;dur={metrics.db_time * 1000:.2f};desc="{metrics.queries} queries"',
+            f'ser;dur={metrics.serialization_time * 1000:.2f}',
+            f'total;dur={latency * 1000:.2f}',
+        ])
+        labels = metrics.label or ('-', '-', request.method)
+        registry.record(labels, metrics, latency, response.status_code)
+        self.check_budget(metrics)
+        return response
+
+    def check_budget(self, metrics):
+        if metrics.budget is None or metrics.queries <= metrics.budget:
+            return
+        view, action, method = metrics.label
+        message = f'{view}.{action} ({method}) ran {metrics.queries} queries, budget is {metrics.budget}'
+        if getattr(settings, 'QUERY_BUDGET_STRICT', False):
+            raise QueryBudgetExceeded(message)
+        logger.warning(message)
+
+
+# Serializer timing
+
+_timed_serializer_classes = {}
+_timed_serializer_lock = threading.Lock()
+
+
+def timed_serializer_class(serializer_class):
+    # Subclass that adds its to_representation() time to the current request.
+    # Nested serializers run inside the outer call, so only the outermost one is timed.
+    with _timed_serializer_lock:
+        if serializer_class not in _timed_serializer_classes:
+            def to_representation(self, instance):
+                metrics = current_metrics()
+                if metrics is None or metrics.serializing:
+                    return super(timed, self).to_representation(instance)
+                metrics.serializing = True
+                start = time.perf_counter()
+                try:
+                    return super(timed, self).to_representation(instance)
+                finally:
+                    metrics.serialization_time += time.perf_counter() - start
+                    metrics.serializing = False
+
+            timed = type(serializer_class.__name__, (serializer_class,), {
+                '__module__': serializer_class.__module__,
+                'to_representation': to_representation,
+            })
+            _timed_serializer_classes[serializer_class] = timed
+        return _timed_serializer_classes[serializer_class]
+
+
+class InstrumentedViewMixin:
+    # Max SQL queries per action for the whole request (auth included), e.g. {'list': 4}
+    query_budgets = {}
+
+    def initial(self, request, *args, **kwargs):
+        metrics = current_metrics()
+        if metrics is not None:
+            metrics.label = (type(self).__name__, self.action or '-', request.method)
+            metrics.budget = self.query_budgets.get(self.action)
+        super().initial(request, *args, **kwargs)
+
+    def get_serializer_class(self):
+        return timed_serializer_class(super().get_serializer_class())
+
+
+# GET /metrics - Prometheus text exposition of the registry and catalog cache counters
+
+def _format_labels(view, action, method):
+    return f'view="{view}",action="{action}",method="{method}"'
+
+
+def render_metrics():
+    lines = []
+
+    def emit(name, kind, help_text, samples):
+        lines.append(f'# HELP {name} {help_text}')
+        lines.append(f'# TYPE {name} {kind}')
+        lines.extend(samples)
+
+    snapshot = registry.snapshot()
+    counters = [
+        ('cleanslate_requests_total', 'requests', 'Requests handled.'),
+        ('cleanslate_request_errors_total', 'errors', 'Requests that returned a 5xx status.'),
+        ('cleanslate_db_queries_total', 'queries', 'SQL queries executed.'),
+        ('cleanslate_db_seconds_total', 'db_seconds', 'Time spent in SQL queries.'),
+        ('cleanslate_serialization_seconds_total', 'serialization_seconds', 'Time spent in serializer to_representation.'),
+    ]
+    for name, key, help_text in counters:
+        emit(name, 'counter', help_text, [
+            f'{name}{{{_format_labels(*labels)}}} {series[key]}' for labels, series in sorted(snapshot.items())
+        ])
+
+    samples = []
+    for labels, series in sorted(snapshot.items()):
+        label_text = _format_labels(*labels)
+        for bound, count in zip(LATENCY_BUCKETS, series['buckets']):
+            samples.append(f'cleanslate_request_latency_seconds_bucket{{{label_text},le="{bound}"}} {count}')
+        samples.append(f'cleanslate_request_latency_seconds_bucket{{{label_text},le="+Inf"}} {series["requests"]}')
+        samples.append(f'cleanslate_request_latency_seconds_sum{{{label_text}}} {series["latency_seconds"]}')
+        samples.append(f'cleanslate_request_latency_seconds_count{{{label_text}}} {series["requests"]}')
+    emit('cleanslate_request_latency_seconds', 'histogram', 'Total request latency.', samples)
+
+    emit('cleanslate_catalog_cache_events_total', 'counter', 'Catalog cache hits, misses and 304s.', [
+        f'cleanslate_catalog_cache_events_total{{namespace="{key.rsplit(".", 1)[0]}",event="{key.rsplit(".", 1)[1]}"}} {value}'
+        for key, value in sorted(cache.cache_stats().items())
+    ])
+    return '\n'.join(lines) + '\n'
+
+
+def metrics_view(request):
+    # No address allowlist: behind a proxy every request comes from the proxy's address
+    token = getattr(settings, 'METRICS_TOKEN', '')
+    authorization = request.META.get('HTTP_AUTHORIZATION', '')
+    scraper = bool(token) and hmac.compare_digest(authorization.encode('utf-8'), f'Bearer {token}'.encode('utf-8'))
+    if not scraper and not (request.user.is_authenticated and request.user.is_staff):
+        return HttpResponseForbidden()
+    return HttpResponse(render_metrics(), content_type='text/plain; version=0.0.4; charset=utf-8')
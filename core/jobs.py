@@ -0,0 +1,162 @@
+# core/jobs.py
+#
+# DB-backed job queue. Side effects of a write (credits, QR codes, notifications, ...)
+# are enqueued as Job rows in the same transaction as the write and executed later by
+# `manage.py runworkers`. Workers claim jobs with SELECT ... FOR UPDATE SKIP LOCKED,
+# retry failures with exponential backoff and move jobs that run out of attempts to
+# DeadLetterJob.
+#
+# JOBS_MODE = 'local' runs queued jobs in-process as soon as the enqueuing transaction
+# commits, which is what the tests use.
+
+import logging
+import os
+import random
+import socket
+import threading
+import time
+import traceback
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .models import Job, DeadLetterJob
+
+logger = logging.getLogger(__name__)
+
+_handlers = {}
+_local = threading.local()
+
+
+def job_handler(name, max_attempts=5):
+    # Register a function as the handler for jobs called `name`.
+    # Handlers receive the payload as keyword arguments and must be safe to re-run.
+    def register(func):
+        _handlers[name] = (func, max_attempts)
+        return func
+    return register
+
+
+def _setting(name, default):
+    return getattr(settings, name, default)
+
+
+def enqueue(name, payload=None, key=None, delay=None):
+    # Insert a job; a duplicate idempotency key is silently ignored
+    if name not in _handlers:
+        raise ValueError(f"No job handler registered for '{name}'")
+    _, max_attempts = _handlers[name]
+    run_at = timezone.now() + delay if delay else timezone.now()
+    # ignore_conflicts turns a duplicate key into a no-op instead of an IntegrityError
+    # that would poison the caller's transaction
+    Job.objects.bulk_create(
+        [Job(name=name, payload=payload or {}, idempotency_key=key, max_attempts=max_attempts, run_at=run_at)],
+        ignore_conflicts=True,
+    )
+    if _setting('JOBS_MODE', 'worker') == 'local':
+        transaction.on_commit(run_local)
+
+
+def run_local():
+    # Drain ready jobs in this process. Jobs enqueued by a handler are picked up by the
+    # same loop instead of recursing.
+    if getattr(_local, 'draining', False):
+        return
+    _local.draining = True
+    try:
+        while work_once(worker_id='local'):
+            pass
+    finally:
+        _local.draining = False
+
+
+def backoff_delay(attempts):
+    base = _setting('JOBS_BACKOFF_BASE', 5)
+    cap = _setting('JOBS_MAX_BACKOFF', 3600)
+    delay = min(cap, base * (2 ** max(attempts - 1, 0)))
+    return timedelta(seconds=delay * random.uniform(0.8, 1.2)) # Jitter so retries don't stampede
+
+
+def requeue_stale(now=None):
+    # Jobs whose worker died mid-run go back to the queue after the visibility timeout
+    now = now or timezone.now()
+    cutoff = now - timedelta(seconds=_setting('JOBS_VISIBILITY_TIMEOUT', 600))
+    return Job.objects.filter(status='running', locked_at__lt=cutoff).update(status='queued', locked_by=None, run_at=now)
+
+
+def claim(worker_id, limit=10):
+    now = timezone.now()
+    with transaction.atomic():
+        ids = list(
+            Job.objects.select_for_update(skip_locked=True)
+            .filter(status='queued', run_at__lte=now)
+            .order_by('run_at', 'id')
+            .values_list('id', flat=True)[:limit]
+        )
+        if ids:
+            Job.objects.filter(pk__in=ids).update(
+                status='running', locked_by=worker_id, locked_at=now, attempts=F('attempts') + 1
+            )
+    return list(Job.objects.filter(pk__in=ids).order_by('run_at', 'id')) if ids else []
+
+
+def run_job(job):
+    handler = _handlers.get(job.name)
+    try:
+        if handler is None:
+            raise LookupError(f"No job handler registered for '{job.name}'")
+        with transaction.atomic():
+            handler[0](**job.payload)
+    except Exception:
+        error = traceback.format_exc()
+        if job.attempts >= job.max_attempts:
+            logger.error("Job %s #%s failed permanently after %s attempts", job.name, job.id, job.attempts)
+            with transaction.atomic():
+                DeadLetterJob.objects.create(
+                    job_id=job.id, name=job.name, payload=job.payload, idempotency_key=job.idempotency_key,
+                    attempts=job.attempts, last_error=error,
+                )
+                Job.objects.filter(pk=job.pk).update(status='dead', last_error=error, finished_at=timezone.now(), locked_by=None)
+        else:
+            logger.warning("Job %s #%s failed (attempt %s/%s), retrying", job.name, job.id, job.attempts, job.max_attempts)
+            Job.objects.filter(pk=job.pk).update(
+                status='queued', last_error=error, locked_by=None, run_at=timezone.now() + backoff_delay(job.attempts)
+            )
+        return False
+    Job.objects.filter(pk=job.pk).update(status='done', finished_at=timezone.now(), locked_by=None)
+    return True
+
+
+def work_once(worker_id, limit=10):
+    # Claim and run one batch; returns how many jobs were processed
+    jobs = claim(worker_id, limit)
+    for job in jobs:
+        run_job(job)
+    return len(jobs)
+
+
+def worker_loop(worker_id=None, batch_size=10, poll_interval=1.0, stop_event=None):
+    worker_id = worker_id or f'{socket.gethostname()}:{os.getpid()}'
+    logger.info("Worker %s started", worker_id)
+    last_sweep = 0.0
+    while stop_event is None or not stop_event.is_set():
+        if time.monotonic() - last_sweep > 60:
+            requeue_stale()
+            last_sweep = time.monotonic()
+        if not work_once(worker_id, batch_size):
+            time.sleep(poll_interval)
+    logger.info("Worker %s stopped", worker_id)
+
+
+def purge_finished(older_than=timedelta(days=7)):
+    # Done jobs are kept for a while so their idempotency keys keep deduplicating
+    return Job.objects.filter(status='done', finished_at__lt=timezone.now() - older_than).delete()[0]
+
+
+def replay_dead_letter(dead):
+    with transaction.atomic():
+        Job.objects.filter(pk=dead.job_id).update(status='queued', attempts=0, run_at=timezone.now(), last_error=None)
+        dead.delete()
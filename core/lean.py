@@ -0,0 +1,128 @@
+# core/lean.py
+#
+# Read-only fast path for listing grids. Rows come straight from .values() and are
+# turned into the same JSON shapes ListingSerializer produces, without building
+# ModelSerializer fields per row. Media is fetched with one extra query, and only
+# when it was asked for. The serialization itself never touches the DB, so the async
+# views (core/async_views.py) share it.
+
+from collections import defaultdict
+from decimal import Decimal
+
+from rest_framework.settings import api_settings
+
+from .models import ListingMedia
+
+# Output field -> .values() lookup
+LISTING_SOURCES = {
+    'id': 'id',
+    'user': 'user_id',
+    'user_email': 'user__email',
+    'title': 'title',
+    'description': 'description',
+    'price': 'price',
+    'category': 'category_id',
+    'category_name': 'category__name',
+    'brand': 'brand',
+    'model_name': 'model_name',
+    'condition': 'condition',
+    'health_score': 'health_score',
+    'status': 'status',
+    'created_at': 'created_at',
+    'updated_at': 'updated_at',
+    'is_redeemable_with_green_credits': 'is_redeemable_with_green_credits',
+    'green_credit_price': 'green_credit_price',
+    'sold_at': 'sold_at',
+    'certificate': 'certificate_id',
+    'certificate_id': 'certificate_id',
+    'primary_media_url': 'primary_media_url',
+}
+LISTING_FIELDS = tuple(LISTING_SOURCES) + ('media',)
+MEDIA_FIELDS = ('id', 'file_url', 'media_type', 'is_primary', 'position', 'created_at')
+ORDERING_SOURCES = ('id', 'created_at') # Always selected so keyset cursors can be built
+# Fields read through a nullable relation (source='category.name' etc.). DRF leaves them
+# out of the output when the relation is empty, so the lean path does the same.
+SKIP_WHEN_NULL = {'category_name': 'category_id', 'certificate_id': 'certificate_id'}
+
+
+def format_datetime(value):
+    # Same output as DRF's DateTimeField with the default ISO-8601 format
+    if value is None:
+        return None
+    value = value.isoformat()
+    if value.endswith('+00:00'):
+        value = value[:-6] + 'Z'
+    return value
+
+
+def format_decimal(value):
+    # Same output as DRF's DecimalField for Listing.price (2 places, a string unless
+    # COERCE_DECIMAL_TO_STRING is off)
+    if value is None:
+        return None
+    value = Decimal(value).quantize(Decimal('0.01'))
+    return str(value) if api_settings.COERCE_DECIMAL_TO_STRING else value
+
+
+FORMATTERS = {
+    'price': format_decimal,
+    'created_at': format_datetime,
+    'updated_at': format_datetime,
+    'sold_at': format_datetime,
+}
+
+
+def lean_listing_queryset(queryset, fields):
+    # Restrict a listing queryset to the lookups needed for `fields`
+    lookups = {LISTING_SOURCES[field] for field in fields if field in LISTING_SOURCES}
+    lookups.update(SKIP_WHEN_NULL[field] for field in fields if field in SKIP_WHEN_NULL)
+    lookups.update(ORDERING_SOURCES)
+    return queryset.prefetch_related(None).values(*sorted(lookups))
+
+
+def media_queryset(listing_ids):
+    return ListingMedia.objects.filter(listing_id__in=listing_ids).order_by('listing_id', 'position', 'id').values('listing_id', *MEDIA_FIELDS)
+
+
+def group_media(rows):
+    grouped = defaultdict(list)
+    for row in rows:
+        grouped[row.pop('listing_id')].append({
+            'id': row['id'],
+            'file_url': row['file_url'],
+            'media_type': row['media_type'],
+            'is_primary': row['is_primary'],
+            'position': row['position'],
+            'created_at': format_datetime(row['created_at']),
+        })
+    return grouped
+
+
+def media_by_listing(listing_ids):
+    return group_media(media_queryset(listing_ids))
+
+
+async def amedia_by_listing(listing_ids):
+    return group_media([row async for row in media_queryset(listing_ids)])
+
+
+def serialize_listings(rows, fields, media=None):
+    # rows: dicts from lean_listing_queryset; fields: output field names, in order.
+    # Async callers fetch `media` themselves (amedia_by_listing) so nothing here hits the DB.
+    fields = [field for field in LISTING_FIELDS if field in fields]
+    if media is None and 'media' in fields:
+        media = media_by_listing([row['id'] for row in rows])
+    data = []
+    for row in rows:
+        item = {}
+        for field in fields:
+            if field == 'media':
+                item['media'] = media.get(row['id'], [])
+                continue
+            if field in SKIP_WHEN_NULL and row[SKIP_WHEN_NULL[field]] is None:
+                continue
+            value = row[LISTING_SOURCES[field]]
+            formatter = FORMATTERS.get(field)
+            item[field] = formatter(value) if formatter else value
+        data.append(item)
+    return data
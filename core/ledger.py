@@ -0,0 +1,131 @@
+# core/ledger.py
+#
+# Green credit ledger. GreenCreditTransaction rows are the source of truth and
+# User.green_credits is a materialized balance kept in step with them.
+# Balances are only ever changed with F() expressions inside the same transaction
+# as the ledger insert, so concurrent writers never lose updates and we never
+# have to SELECT ... FOR UPDATE the user row.
+
+from collections import defaultdict
+
+from django.db import transaction
+from django.db.models import Case, F, IntegerField, OuterRef, Subquery, Sum, Value, When
+from django.db.models.functions import Coalesce
+from rest_framework import status
+from rest_framework.exceptions import APIException
+
+from .models import User, GreenCreditTransaction
+from . import analytics, summary
+
+
+class InsufficientCredits(APIException):
+    status_code = status.HTTP_402_PAYMENT_REQUIRED
+    default_detail = 'Not enough green credits.'
+    default_code = 'insufficient_credits'
+
+
+def apply_balance_deltas(deltas):
+    # deltas: {user_id: amount}. One UPDATE for all users.
+    deltas = {user_id: amount for user_id, amount in deltas.items() if amount}
+    if not deltas:
+        return 0
+    summary.evict(*deltas)
+    if len(deltas) == 1:
+        (user_id, amount), = deltas.items()
+        return User.objects.filter(pk=user_id).update(green_credits=F('green_credits') + amount)
+    return User.objects.filter(pk__in=list(deltas)).update(
+        green_credits=F('green_credits') + Case(
+            *[When(pk=user_id, then=Value(amount)) for user_id, amount in deltas.items()],
+            default=Value(0),
+            output_field=IntegerField(),
+        )
+    )
+
+
+def record_transaction(user, amount, transaction_type, certificate=None, listing=None, description=None):
+    # Append one ledger row and move the balance with it. Spends go through record_debit,
+    # so no caller can take a balance below zero.
+    if amount < 0:
+        return record_debit(
+            user.pk, -amount, transaction_type, certificate_id=certificate.pk if certificate else None,
+            listing_id=listing.pk if listing else None, description=description,
+        )
+    with transaction.atomic():
+        entry = GreenCreditTransaction.objects.create(
+            user=user,
+            amount=amount,
+            transaction_type=transaction_type,
+            certificate=certificate,
+            listing=listing,
+            description=description,
+        )
+        apply_balance_deltas({entry.user_id: amount})
+    return entry
+
+
+def record_debit(user_id, amount, transaction_type, certificate_id=None, listing_id=None, description=None):
+    # Spend `amount` credits (> 0) or raise InsufficientCredits without changing anything.
+    # The balance check is the WHERE of the UPDATE, so parallel spends can't overdraw.
+    with transaction.atomic():
+        if not User.objects.filter(pk=user_id, green_credits__gte=amount).update(green_credits=F('green_credits') - amount):
+            raise InsufficientCredits()
+        summary.evict(user_id)
+        return GreenCreditTransaction.objects.create(
+            user_id=user_id,
+            amount=-amount,
+            transaction_type=transaction_type,
+            certificate_id=certificate_id,
+            listing_id=listing_id,
+            description=description,
+        )
+
+
+def record_transactions(entries, batch_size=500):
+    # Bulk version: entries are unsaved GreenCreditTransaction instances
+    entries = list(entries)
+    if not entries:
+        return entries
+    deltas = defaultdict(int)
+    for entry in entries:
+        deltas[entry.user_id] += entry.amount
+    with transaction.atomic():
+        created = GreenCreditTransaction.objects.bulk_create(entries, batch_size=batch_size)
+        apply_balance_deltas(deltas)
+        analytics.schedule_refresh() # bulk_create sends no post_save
+    return created
+
+
+def reconcile_balances(user_ids=None):
+    # Recompute materialized balances from the ledger in a single aggregate UPDATE
+    ledger_total = (
+        GreenCreditTransaction.objects
+        .filter(user=OuterRef('pk'))
+        .order_by()
+        .values('user')
+        .annotate(total=Sum('amount'))
+        .values('total')
+    )
+    users = User.objects.all()
+    if user_ids is not None:
+        users = users.filter(pk__in=user_ids)
+    return users.update(
+        green_credits=Coalesce(Subquery(ledger_total, output_field=IntegerField()), Value(0))
+    )
+
+
+def find_drift(limit=100):
+    # Users whose materialized balance disagrees with the ledger (used for reporting)
+    ledger_total = (
+        GreenCreditTransaction.objects
+        .filter(user=OuterRef('pk'))
+        .order_by()
+        .values('user')
+        .annotate(total=Sum('amount'))
+        .values('total')
+    )
+    return (
+        User.objects
+        .annotate(ledger_balance=Coalesce(Subquery(ledger_total, output_field=IntegerField()), Value(0)))
+        .exclude(green_credits=F('ledger_balance'))
+        .values('id', 'email', 'green_credits', 'ledger_balance')[:limit]
+    )
@@ -0,0 +1,342 @@
+# core/loadtest.py
+#
+# Load-test harness (`manage.py loadtest`), meant to run against a server filled by
+# `manage.py seed_perf`. Worker threads replay scripted user journeys over plain HTTP,
+# each thread on its own keep-alive connection:
+# - browse: listing feed, next page, listing detail, categories
+# - search: full-text search
+# - register: sign up, log in, home screen
+# - bulk_wipe: bulk certificate upload from a wiping station
+# - redeem: buy a redeemable listing with green credits
+# Latency is recorded per endpoint (method plus route, with ids masked). The report
+# gives p50/p95/p99, throughput and error counts as JSON. Keep one report as the baseline
+# and compare later runs against it to catch regressions.
+#
+# WSGI vs ASGI: with async_reads the browse journey reads from the /api/async/ twins
+# (core/async_views.py) but records them under the same endpoint names, so a run against
+# the Uvicorn workers can be compared with --compare to a run against the WSGI server.
+#
+# race() is the contention benchmark for purchases: hundreds of logged-in buyers fire
+# at a few hot listings at the same moment, and every listing must have at most one winner.
+
+import http.client
+import json
+import math
+import random
+import threading
+import time
+import uuid
+from collections import Counter, defaultdict
+from urllib.parse import urlencode, urlsplit
+
+from .seed import BRANDS, DEFAULT_PASSWORD, STAFF_USERS
+
+REPORT_VERSION = 1
+PERCENTILES = (50, 95, 99)
+DEFAULT_JOURNEYS = {'browse': 50, 'search': 20, 'register': 5, 'bulk_wipe': 15, 'redeem': 10}
+SEARCH_TERMS = sorted({brand for brands in BRANDS.values() for brand in brands}) + ['laptop', 'phone', 'storage', 'pro']
+PURCHASE = 'POST /api/listings/{id}/purchase/'
+# Outcomes that are part of the flow rather than failures: sold to someone else, not enough credits
+EXPECTED_STATUSES = {PURCHASE: {402, 409}}
+
+
+class Recorder:
+    # Latencies (ms) and status codes per endpoint, shared by all workers
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.latencies = defaultdict(list)
+        self.statuses = defaultdict(Counter)
+
+    def add(self, endpoint, latency, status):
+        with self.lock:
+            self.latencies[endpoint].append(latency)
+            self.statuses[endpoint][status] += 1
+
+
+class Client:
+    # One keep-alive HTTP connection. Every request is timed under its endpoint name.
+    def __init__(self, base_url, recorder, timeout=30):
+        parts = urlsplit(base_url)
+        self.connection_class = http.client.HTTPSConnection if parts.scheme == 'https' else http.client.HTTPConnection
+        self.netloc = parts.netloc
+        self.prefix = parts.path.rstrip('/')
+        self.recorder = recorder
+        self.timeout = timeout
+        self.connection = None
+        self.token = None
+
+    def request(self, method, path, endpoint, body=None, headers=None):
+        headers = {'Accept': 'application/json', **(headers or {})}
+        if self.token:
+            headers['Authorization'] = f'Token {self.token}'
+        payload = None
+        if body is not None:
+            payload = json.dumps(body).encode('utf-8')
+            headers['Content-Type'] = 'application/json'
+        if self.connection is None:
+            self.connection = self.connection_class(self.netloc, timeout=self.timeout)
+        started = time.perf_counter()
+        try:
+            self.connection.request(method, self.prefix + path, body=payload, headers=headers)
+            response = self.connection.getresponse()
+            content = response.read()
+            status = response.status
+        except (OSError, http.client.HTTPException):
+            self.connection.close()
+            self.connection = None
+            content, status = b'', 0 # Connection-level failure
+        self.recorder.add(f'{method} {endpoint}', (time.perf_counter() - started) * 1000, status)
+        try:
+            data = json.loads(content) if content else None
+        except ValueError:
+            data = None
+        return status, data
+
+    def get(self, path, endpoint, params=None):
+        return self.request('GET', f'{path}?{urlencode(params)}' if params else path, endpoint)
+
+    def post(self, path, endpoint, body, headers=None):
+        return self.request('POST', path, endpoint, body=body, headers=headers)
+
+    def close(self):
+        if self.connection is not None:
+            self.connection.close()
+
+
+def relative(url):
+    # Pagination links are absolute; keep path and query
+    parts = urlsplit(url)
+    return f'{parts.path}?{parts.query}' if parts.query else parts.path
+
+
+class Worker:
+    def __init__(self, number, options, recorder, rng):
+        self.number = number
+        self.options = options
+        self.rng = rng
+        self.client = Client(options['base_url'], recorder)
+        self.sequence = 0
+
+    def unique(self, prefix):
+        self.sequence += 1
+        return f"{prefix}-{self.options['run_id']}-{self.number}-{self.sequence}"
+
+    def login(self, email=None, password=None):
+        if email is None:
+            email = f"perf-user-{self.rng.randrange(STAFF_USERS, self.options['users'])}@example.com"
+        self.client.token = None
+        status, data = self.client.post('/auth/token/login/', '/auth/token/login/', {'email': email, 'password': password or self.options['password']})
+        self.client.token = data.get('auth_token') if status == 200 and data else None
+        return self.client.token is not None
+
+    def ensure_login(self):
+        return self.client.token is not None or self.login()
+
+    def read_path(self, path):
+        # '/api/listings/' -> '/api/async/listings/' when the async read paths are under test
+        return '/api/async/' + path[len('/api/'):] if self.options['async_reads'] else path
+
+    # Journeys
+
+    def browse(self):
+        status, page = self.client.get(self.read_path('/api/listings/'), '/api/listings/', {'pagination': 'keyset', 'status': 'active'})
+        if status == 200 and page.get('next'):
+            status, page = self.client.get(relative(page['next']), '/api/listings/?cursor')
+        if status == 200 and page.get('results'):
+            listing = self.rng.choice(page['results'])
+            self.client.get(self.read_path(f"/api/listings/{listing['id']}/"), '/api/listings/{id}/')
+        self.client.get(self.read_path('/api/categories/'), '/api/categories/')
+
+    def search(self):
+        self.client.get('/api/listings/search/', '/api/listings/search/', {'q': self.rng.choice(SEARCH_TERMS)})
+
+    def register(self):
+        email = f"{self.unique('loadtest')}@example.com"
+        password = f'Lt-{uuid.uuid4().hex}'
+        status, _ = self.client.post('/auth/users/', '/auth/users/', {
+            'email': email, 'username': email, 'password': password, 're_password': password,
+        })
+        if status == 201 and self.login(email, password):
+            self.client.get('/api/me/summary/', '/api/me/summary/')
+            self.client.token = None # Back to a seeded account for the next journey
+
+    def bulk_wipe(self):
+        if not self.ensure_login():
+            return
+        batch = self.unique('LT')
+        items = [
+            {
+                'device_serial_number': f'{batch}-{index}', 'wiping_method': self.rng.choice(('nist_clear', 'nist_purge', 'dod_5220_22m')),
+                'status': 'success', 'wiped_at': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime()),
+                'device_type': self.rng.choice(('hdd', 'ssd', 'nvme')), 'operating_system': self.rng.choice(('windows', 'linux', 'macos')),
+            }
+            for index in range(self.options['bulk_size'])
+        ]
+        self.client.post('/api/certificates/bulk/', '/api/certificates/bulk/', items, headers={'Idempotency-Key': batch})
+        self.client.get('/api/certificates/', '/api/certificates/', {'pagination': 'keyset'})
+
+    def redeem(self):
+        if not self.ensure_login():
+            return
+        status, home = self.client.get('/api/me/summary/', '/api/me/summary/')
+        if status != 200:
+            return
+        status, page = self.client.get('/api/listings/', '/api/listings/?redeemable', {
+            'pagination': 'keyset', 'status': 'active', 'redeemable': 'true', 'fields': 'id,green_credit_price',
+        })
+        affordable = [
+            listing for listing in (page or {}).get('results', [])
+            if listing.get('green_credit_price') and listing['green_credit_price'] <= home['green_credits']
+        ]
+        if not affordable:
+            return
+        listing = self.rng.choice(affordable)
+        self.purchase(listing['id'])
+
+    def purchase(self, listing_id):
+        return self.client.post(
+            f'/api/listings/{listing_id}/purchase/', '/api/listings/{id}/purchase/', {},
+            headers={'Idempotency-Key': self.unique('purchase')},
+        )
+
+    def run(self, deadline, journeys):
+        names, weights = zip(*journeys.items())
+        try:
+            while time.monotonic() < deadline:
+                getattr(self, self.rng.choices(names, weights)[0])()
+        finally:
+            self.client.close()
+
+
+def percentile(ordered, pct):
+    # Nearest-rank percentile over an already sorted list
+    if not ordered:
+        return None
+    rank = max(1, math.ceil(pct / 100 * len(ordered)))
+    return ordered[rank - 1]
+
+
+def build_report(recorder, elapsed, options):
+    endpoints = {}
+    for endpoint in sorted(recorder.latencies):
+        ordered = sorted(recorder.latencies[endpoint])
+        statuses = recorder.statuses[endpoint]
+        stats = {
+            'requests': len(ordered),
+            'errors': sum(
+                count for status, count in statuses.items()
+                if (status == 0 or status >= 400) and status not in EXPECTED_STATUSES.get(endpoint, ())
+            ),
+            'throughput_rps': round(len(ordered) / elapsed, 2) if elapsed else None,
+            'mean_ms': round(sum(ordered) / len(ordered), 2),
+            'max_ms': round(ordered[-1], 2),
+            'status_codes': {str(status): count for status, count in sorted(statuses.items())},
+        }
+        for pct in PERCENTILES:
+            stats[f'p{pct}_ms'] = round(percentile(ordered, pct), 2)
+        endpoints[endpoint] = stats
+    total = sum(stats['requests'] for stats in endpoints.values())
+    return {
+        'version': REPORT_VERSION,
+        'started_at': options['started_at'],
+        'config': {key: options.get(key) for key in ('base_url', 'duration', 'concurrency', 'seed', 'bulk_size', 'journeys', 'async_reads')},
+        'elapsed_seconds': round(elapsed, 2),
+        'total': {
+            'requests': total,
+            'errors': sum(stats['errors'] for stats in endpoints.values()),
+            'throughput_rps': round(total / elapsed, 2) if elapsed else None,
+        },
+        'endpoints': endpoints,
+    }
+
+
+def run(base_url, duration=60, concurrency=10, journeys=None, seed=0, users=1000, password=DEFAULT_PASSWORD, bulk_size=20, async_reads=False):
+    options = {
+        'base_url': base_url.rstrip('/'), 'duration': duration, 'concurrency': concurrency,
+        'journeys': journeys or DEFAULT_JOURNEYS, 'seed': seed, 'users': users, 'password': password,
+        'bulk_size': bulk_size, 'async_reads': async_reads, 'run_id': uuid.uuid4().hex[:8],
+        'started_at': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime()),
+    }
+    recorder = Recorder()
+    # Journey choices are reproducible per worker; only the generated emails/serials differ per run
+    workers = [Worker(number, options, recorder, random.Random(f'{seed}:{number}')) for number in range(concurrency)]
+    deadline = time.monotonic() + duration
+    started = time.monotonic()
+    threads = [threading.Thread(target=worker.run, args=(deadline, options['journeys']), daemon=True) for worker in workers]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return build_report(recorder, time.monotonic() - started, options)
+
+
+def race(base_url, buyers=200, hot_listings=5, seed=0, users=1000, password=DEFAULT_PASSWORD):
+    # Log `buyers` seeded users in, then release them together, each buying one of
+    # `hot_listings` active redeemable listings. Only the purchase requests are timed.
+    options = {
+        'base_url': base_url.rstrip('/'), 'users': users, 'password': password, 'run_id': uuid.uuid4().hex[:8],
+        'started_at': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime()),
+    }
+    setup = Worker(0, options, Recorder(), random.Random(seed))
+    status, page = setup.client.get('/api/listings/', '/api/listings/', {
+        'pagination': 'keyset', 'status': 'active', 'redeemable': 'true', 'fields': 'id', 'page_size': hot_listings,
+    })
+    setup.client.close()
+    targets = [listing['id'] for listing in (page or {}).get('results', [])][:hot_listings]
+    if status != 200 or not targets:
+        raise RuntimeError('No active redeemable listings to race for (seed the database with seed_perf first).')
+
+    recorder = Recorder()
+    workers = [Worker(number, options, Recorder(), random.Random(f'{seed}:{number}')) for number in range(buyers)]
+    released = {}
+    barrier = threading.Barrier(buyers, action=lambda: released.setdefault('at', time.monotonic()))
+    outcomes = defaultdict(Counter)
+
+    def buy(worker, listing_id):
+        try:
+            worker.login()
+            worker.client.recorder = recorder # Logins are setup, not part of the race
+            barrier.wait(timeout=300)
+            status, _ = worker.purchase(listing_id)
+            with recorder.lock:
+                outcomes[listing_id][status] += 1
+        except threading.BrokenBarrierError:
+            pass
+        finally:
+            worker.client.close()
+
+    threads = [
+        threading.Thread(target=buy, args=(worker, targets[worker.number % len(targets)]), daemon=True)
+        for worker in workers
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    finished = time.monotonic()
+    report = build_report(recorder, finished - released.get('at', finished), {
+        **options, 'duration': None, 'concurrency': buyers, 'seed': seed, 'bulk_size': None, 'journeys': {'race': hot_listings},
+    })
+    report['listings'] = {
+        str(listing_id): {'winners': counts[200], 'statuses': {str(status): count for status, count in sorted(counts.items())}}
+        for listing_id, counts in sorted(outcomes.items())
+    }
+    report['double_sells'] = [listing_id for listing_id, stats in report['listings'].items() if stats['winners'] > 1]
+    return report
+
+
+def compare(baseline, report, tolerance=0.2, metric='p95_ms'):
+    # Endpoints whose `metric` grew by more than `tolerance` (0.2 = 20%) over the baseline,
+    # or whose error count went up. Endpoints missing from either report are skipped.
+    regressions = []
+    for endpoint, current in report['endpoints'].items():
+        previous = baseline.get('endpoints', {}).get(endpoint)
+        if previous is None:
+            continue
+        if previous.get(metric) and current[metric] > previous[metric] * (1 + tolerance):
+            regressions.append({'endpoint': endpoint, 'metric': metric, 'baseline': previous[metric], 'current': current[metric]})
+        previous_rate = previous['errors'] / previous['requests'] if previous.get('requests') else 0
+        current_rate = current['errors'] / current['requests'] if current['requests'] else 0
+        if current_rate > previous_rate + 0.01:
+            regressions.append({'endpoint': endpoint, 'metric': 'error_rate', 'baseline': round(previous_rate, 4), 'current': round(current_rate, 4)})
+    return regressions
@@ -0,0 +1,46 @@
+# core/locks.py
+#
+# Cluster-wide named locks for periodic commands that may be started on several nodes
+# at once. On PostgreSQL these are advisory locks. Other backends (SQLite in development)
+# only ever have one node and one writer, so the lock is always granted there.
+
+import zlib
+from contextlib import contextmanager
+
+from django.db import connections
+
+
+def lock_id(name):
+    # Stable integer key for pg_try_advisory_lock (CRC32 folded into the signed range)
+    key = zlib.crc32(name.encode('utf-8'))
+    return key - (1 << 32) if key >= (1 << 31) else key
+
+
+@contextmanager
+def advisory_lock(name, using='default'):
+    # Yields True if this process holds the lock, False if another node has it
+    connection = connections[using]
+    if connection.vendor != 'postgresql':
+        yield True
+        return
+    with connection.cursor() as cursor:
+        cursor.execute('SELECT pg_try_advisory_lock(%s)', [lock_id(name)])
+        acquired = cursor.fetchone()[0]
+    try:
+        yield acquired
+    finally:
+        if acquired:
+            with connection.cursor() as cursor:
+                cursor.execute('SELECT pg_advisory_unlock(%s)', [lock_id(name)])
+
+
+def advisory_xact_lock(*names, using='default'):
+    # Wait for the named locks and hold them until the current transaction ends (call it
+    # inside transaction.atomic()). Taken in a fixed order, so two callers locking
+    # overlapping names can't deadlock.
+    connection = connections[using]
+    if connection.vendor != 'postgresql':
+        return
+    with connection.cursor() as cursor:
+        for key in sorted({lock_id(name) for name in names}):
+            cursor.execute('SELECT pg_advisory_xact_lock(%s)', [key])
@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+
+from core import anchoring
+
+
+class Command(BaseCommand):
+    help = "Cut Merkle batches of pending certificates and submit their roots to the chain."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--force', action='store_true', help="Anchor whatever is pending even if the window is not due.")
+
+    def handle(self, *args, **options):
+        batches = anchoring.anchor_pending(force=options['force'])
+        for batch in batches:
+            batch = anchoring.submit_batch(batch.id)
+            self.stdout.write(f"Batch {batch.id}: {batch.size} certificate(s), root {batch.merkle_root}, tx {batch.tx_hash}")
+        self.stdout.write(self.style.SUCCESS(f"Anchored {len(batches)} batch(es)."))
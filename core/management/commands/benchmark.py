@@ -0,0 +1,25 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from core.benchmarks import BENCHMARKS
+
+
+class Command(BaseCommand):
+    help = "Run an in-process benchmark from core/benchmarks.py and print its result as JSON. Writes to the database: use a scratch one."
+
+    def add_arguments(self, parser):
+        parser.add_argument('name', help="Benchmark to run (see core/benchmarks.py).")
+        parser.add_argument('--option', action='append', default=[], metavar='KEY=VALUE', help="Keyword argument for the benchmark, e.g. --option writers=16.")
+
+    def handle(self, *args, **options):
+        if options['name'] not in BENCHMARKS:
+            raise CommandError(f"Unknown benchmark '{options['name']}'. Choose from: {', '.join(sorted(BENCHMARKS))}.")
+        kwargs = {}
+        for item in options['option']:
+            key, _, value = item.partition('=')
+            try:
+                kwargs[key] = int(value)
+            except ValueError:
+                kwargs[key] = value
+        self.stdout.write(json.dumps(BENCHMARKS[options['name']](**kwargs), indent=2, sort_keys=True))
@@ -0,0 +1,44 @@
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+from core import export
+
+
+class Command(BaseCommand):
+    help = "Stream certificates or the green credit ledger to CSV/NDJSON (gzipped when the file name ends in .gz)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('name', choices=sorted(export.EXPORTS), help="What to export.")
+        parser.add_argument('--output', choices=sorted(export.OUTPUT_FORMATS), default='csv')
+        parser.add_argument('--user', help="Only rows belonging to this user id.")
+        parser.add_argument('--since', help="Inclusive lower bound (ISO date or datetime).")
+        parser.add_argument('--until', help="Exclusive upper bound (ISO date or datetime).")
+        parser.add_argument('--resume-after', help="Id of the last row already exported; continue right after it (appended to --file, without a CSV header).")
+        parser.add_argument('--file', help="Write here instead of stdout.")
+
+    def handle(self, *args, **options):
+        name = options['name']
+        queryset = export.EXPORTS[name]['model'].objects.all()
+        path = options['file']
+        try:
+            if options['user']:
+                queryset = queryset.filter(user_id=export.parse_user(options['user']))
+            chunks = export.stream_export(
+                name, queryset, output=options['output'],
+                since=export.parse_bound(options['since'], 'since'),
+                until=export.parse_bound(options['until'], 'until'),
+                resume_after=options['resume_after'],
+                compress=bool(path and path.endswith('.gz')),
+            )
+            out = open(path, 'ab' if options['resume_after'] else 'wb') if path else sys.stdout.buffer
+            try:
+                for chunk in chunks:
+                    out.write(chunk)
+            finally:
+                if path:
+                    out.close()
+        except export.ExportError as exc:
+            raise CommandError(str(exc))
+        if path:
+            self.stderr.write(self.style.SUCCESS(f"Exported {name} to {path}."))
@@ -0,0 +1,93 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from core import loadtest
+from core.seed import DEFAULT_PASSWORD
+
+
+def parse_journeys(value):
+    # "browse=50,search=20" -> {'browse': 50, 'search': 20}
+    journeys = {}
+    for item in value.split(','):
+        name, _, weight = item.partition('=')
+        name = name.strip()
+        if name not in loadtest.DEFAULT_JOURNEYS:
+            raise CommandError(f"Unknown journey '{name}'. Choose from: {', '.join(loadtest.DEFAULT_JOURNEYS)}.")
+        try:
+            journeys[name] = float(weight) if weight else 1.0
+        except ValueError:
+            raise CommandError(f"Weight of '{name}' must be a number.")
+    return journeys
+
+
+class Command(BaseCommand):
+    help = (
+        "Replay scripted user journeys against a running server (seeded with `manage.py seed_perf`) and "
+        "report p50/p95/p99 latency and throughput per endpoint as JSON (core/loadtest.py)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--base-url', default='http://localhost:8000')
+        parser.add_argument('--duration', type=float, default=60, help="Seconds to run.")
+        parser.add_argument('--concurrency', type=int, default=10, help="Simulated clients (threads).")
+        parser.add_argument('--journeys', help="Weighted mix, e.g. browse=50,search=20,register=5,bulk_wipe=15,redeem=10.")
+        parser.add_argument('--seed', type=int, default=0, help="Seed for the journey choices.")
+        parser.add_argument('--users', type=int, default=1000, help="Seeded users to log in as (--users given to seed_perf).")
+        parser.add_argument('--password', default=DEFAULT_PASSWORD, help="Password of the seeded users.")
+        parser.add_argument('--bulk-size', type=int, default=20, help="Certificates per bulk upload.")
+        parser.add_argument('--async-reads', action='store_true', help="Browse through /api/async/ (the ASGI read paths), reported under the usual endpoint names.")
+        parser.add_argument('--output', help="Write the report to this file (default: stdout).")
+        parser.add_argument('--compare', help="Baseline report to compare against; exits with an error on regressions.")
+        parser.add_argument('--tolerance', type=float, default=0.2, help="Allowed p95 growth over the baseline (0.2 = 20%%).")
+        parser.add_argument('--race', type=int, metavar='BUYERS', help="Instead of the journeys, race BUYERS simultaneous purchases for a few hot listings.")
+        parser.add_argument('--hot-listings', type=int, default=5, help="Listings the --race buyers compete for.")
+
+    def handle(self, *args, **options):
+        baseline = None
+        if options['compare']:
+            try:
+                with open(options['compare']) as handle:
+                    baseline = json.load(handle)
+            except (OSError, ValueError) as exc:
+                raise CommandError(f"Cannot read baseline {options['compare']}: {exc}")
+
+        if options['race']:
+            try:
+                report = loadtest.race(
+                    options['base_url'], buyers=options['race'], hot_listings=options['hot_listings'],
+                    seed=options['seed'], users=options['users'], password=options['password'],
+                )
+            except RuntimeError as exc:
+                raise CommandError(str(exc))
+        else:
+            report = loadtest.run(
+                options['base_url'], duration=options['duration'], concurrency=options['concurrency'],
+                journeys=parse_journeys(options['journeys']) if options['journeys'] else None,
+                seed=options['seed'], users=options['users'], password=options['password'], bulk_size=options['bulk_size'],
+                async_reads=options['async_reads'],
+            )
+        encoded = json.dumps(report, indent=2, sort_keys=True)
+        if options['output']:
+            with open(options['output'], 'w') as handle:
+                handle.write(encoded + '\n')
+        else:
+            self.stdout.write(encoded)
+
+        for endpoint, stats in report['endpoints'].items():
+            self.stderr.write(
+                f"{endpoint:55} {stats['requests']:7} req  p50 {stats['p50_ms']:8.1f}  p95 {stats['p95_ms']:8.1f}  "
+                f"p99 {stats['p99_ms']:8.1f} ms  {stats['errors']} err"
+            )
+        if options['race']:
+            for listing_id, stats in report['listings'].items():
+                self.stderr.write(f"listing {listing_id}: {stats['winners']} winner(s) {stats['statuses']}")
+            if report['double_sells']:
+                raise CommandError(f"Listings sold more than once: {', '.join(report['double_sells'])}.")
+        if baseline is not None:
+            regressions = loadtest.compare(baseline, report, options['tolerance'])
+            for regression in regressions:
+                self.stderr.write(f"REGRESSION {regression['endpoint']} {regression['metric']}: {regression['baseline']} -> {regression['current']}")
+            if regressions:
+                raise CommandError(f"{len(regressions)} regression(s) against {options['compare']}.")
+            self.stderr.write(self.style.SUCCESS("No regressions against the baseline."))
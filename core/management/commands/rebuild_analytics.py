@@ -0,0 +1,31 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+
+from core import analytics
+
+
+class Command(BaseCommand):
+    help = "Rebuild the daily and monthly analytics rollups from certificates and the credit ledger, one month at a time."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--since', help="First date to rebuild (YYYY-MM-DD, default: start of history).")
+        parser.add_argument('--until', help="Last date to rebuild (YYYY-MM-DD, default: today).")
+
+    def handle(self, *args, **options):
+        dates = {}
+        for name in ('since', 'until'):
+            value = options[name]
+            dates[name] = parse_date(value) if value else None
+            if value and dates[name] is None:
+                raise CommandError(f"--{name} must be a date (YYYY-MM-DD).")
+        since = dates['since'] or analytics.history_start()
+        until = dates['until'] or timezone.localdate()
+        if since is None:
+            self.stdout.write("Nothing to rebuild.")
+            return
+        months = 0
+        for month in analytics.rebuild_range(since, until):
+            months += 1
+            self.stdout.write(f"Rebuilt {month:%Y-%m}")
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt analytics rollups for {months} month(s)."))
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from core.models import Category
+
+
+class Command(BaseCommand):
+    help = "Recompute the materialized Category.path/depth columns from parent_category."
+
+    def handle(self, *args, **options):
+        count = Category.rebuild_paths()
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt paths for {count} categories."))
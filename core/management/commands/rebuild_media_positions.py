@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from core.models import ListingMedia
+
+
+class Command(BaseCommand):
+    help = "Number existing listing media by display order and fill Listing.primary_media_url (backfill for rows created before those columns)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500, help="Listings per transaction.")
+
+    def handle(self, *args, **options):
+        count = ListingMedia.rebuild_positions(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f"Renumbered {count} media item(s)."))
@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+
+from core.ledger import find_drift, reconcile_balances
+
+
+class Command(BaseCommand):
+    help = "Recompute User.green_credits from the GreenCreditTransaction ledger in one aggregate UPDATE."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true', help="Only report users whose balance drifted from the ledger.")
+
+    def handle(self, *args, **options):
+        drifted = list(find_drift())
+        for row in drifted:
+            self.stdout.write(f"{row['email']}: balance {row['green_credits']}, ledger {row['ledger_balance']}")
+        if options['dry_run']:
+            self.stdout.write(f"{len(drifted)} drifted user(s) shown (dry run, nothing changed).")
+            return
+        updated = reconcile_balances()
+        self.stdout.write(self.style.SUCCESS(f"Reconciled green credit balances for {updated} user(s)."))
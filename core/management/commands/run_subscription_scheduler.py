@@ -0,0 +1,26 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from core import subscriptions
+
+
+class Command(BaseCommand):
+    help = "Renew, expire and downgrade subscriptions whose end date has passed (safe to run on several nodes)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, help="Subscriptions settled per transaction.")
+        parser.add_argument('--loop', type=float, metavar='SECONDS', help="Keep running, one pass every SECONDS.")
+
+    def handle(self, *args, **options):
+        while True:
+            totals = subscriptions.run(batch_size=options['batch_size'])
+            if totals is None:
+                self.stdout.write("Another node is running the scheduler; skipped.")
+            else:
+                self.stdout.write(self.style.SUCCESS(
+                    "Renewed {renewed}, expired {expired}, downgraded {downgraded}, synced {synced}.".format(**totals)
+                ))
+            if not options['loop']:
+                return
+            time.sleep(options['loop'])
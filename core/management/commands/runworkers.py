@@ -0,0 +1,70 @@
+import multiprocessing
+import signal
+
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from core import idempotency, jobs
+
+
+def _run_worker(batch_size, poll_interval, stop_event):
+    # Each process opens its own DB connections
+    connections.close_all()
+    signal.signal(signal.SIGINT, signal.SIG_IGN) # The parent handles Ctrl+C and sets stop_event
+    try:
+        jobs.worker_loop(batch_size=batch_size, poll_interval=poll_interval, stop_event=stop_event)
+    finally:
+        connections.close_all()
+
+
+class Command(BaseCommand):
+    help = "Run job queue workers (see core/jobs.py)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--processes', type=int, default=2, help="Number of worker processes.")
+        parser.add_argument('--batch-size', type=int, default=10, help="Jobs claimed per poll.")
+        parser.add_argument('--poll-interval', type=float, default=1.0, help="Seconds to sleep when the queue is empty.")
+        parser.add_argument('--once', action='store_true', help="Drain the ready jobs in this process and exit.")
+        parser.add_argument('--purge-done-days', type=int, help="Delete finished jobs older than this many days and exit.")
+        parser.add_argument('--purge-idempotency-keys', action='store_true', help="Delete expired idempotency records and exit.")
+
+    def handle(self, *args, **options):
+        if options['purge_idempotency_keys']:
+            deleted = idempotency.purge_expired()
+            self.stdout.write(self.style.SUCCESS(f"Purged {deleted} expired idempotency record(s)."))
+            return
+
+        if options['purge_done_days'] is not None:
+            from datetime import timedelta
+            deleted = jobs.purge_finished(timedelta(days=options['purge_done_days']))
+            self.stdout.write(self.style.SUCCESS(f"Purged {deleted} finished job(s)."))
+            return
+
+        if options['once']:
+            jobs.requeue_stale()
+            total = 0
+            while True:
+                processed = jobs.work_once('runworkers-once', options['batch_size'])
+                if not processed:
+                    break
+                total += processed
+            self.stdout.write(self.style.SUCCESS(f"Processed {total} job(s)."))
+            return
+
+        connections.close_all() # Don't share the parent's connections with the children
+        stop_event = multiprocessing.Event()
+        workers = [
+            multiprocessing.Process(target=_run_worker, args=(options['batch_size'], options['poll_interval'], stop_event), daemon=True)
+            for _ in range(options['processes'])
+        ]
+        for worker in workers:
+            worker.start()
+        self.stdout.write(f"Started {len(workers)} worker process(es). Press Ctrl+C to stop.")
+        try:
+            for worker in workers:
+                worker.join()
+        except KeyboardInterrupt:
+            self.stdout.write("Stopping workers...")
+            stop_event.set()
+            for worker in workers:
+                worker.join()
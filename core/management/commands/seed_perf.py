@@ -0,0 +1,54 @@
+from datetime import datetime, time
+
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+
+from core.models import User, Certificate, Listing, GreenCreditTransaction
+from core.seed import DEFAULT_PASSWORD, STAFF_USERS, Seeder
+
+
+class Command(BaseCommand):
+    help = (
+        "Fill an empty database with synthetic, referentially consistent data for performance work "
+        "(core/seed.py). The same --seed and --end always produce the same rows."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--seed', type=int, default=0, help="Random seed.")
+        parser.add_argument('--users', type=int, default=1000)
+        parser.add_argument('--listings', type=int, default=10000)
+        parser.add_argument('--certificates', type=int, default=20000)
+        parser.add_argument('--transactions', type=int, default=50000, help="Green credit ledger rows.")
+        parser.add_argument('--categories', type=int, default=60)
+        parser.add_argument('--days', type=int, default=365, help="Length of the generated history.")
+        parser.add_argument('--end', help="Last day of the history (YYYY-MM-DD, default: today).")
+        parser.add_argument('--password', default=DEFAULT_PASSWORD, help="Password of every generated user.")
+        parser.add_argument('--batch-size', type=int, default=5000, help="Rows per bulk_create (backends without COPY).")
+        parser.add_argument('--no-copy', action='store_true', help="Use bulk_create even on PostgreSQL.")
+        parser.add_argument('--skip-derived', action='store_true', help="Don't rebuild the search index and analytics rollups afterwards.")
+
+    def handle(self, *args, **options):
+        if any(model.objects.exists() for model in (User, Certificate, Listing, GreenCreditTransaction)):
+            raise CommandError("seed_perf needs an empty database (run `manage.py flush` first).")
+        end = timezone.localdate()
+        if options['end']:
+            end = parse_date(options['end'])
+            if end is None:
+                raise CommandError("--end must be a date (YYYY-MM-DD).")
+        seeder = Seeder(
+            seed=options['seed'], users=options['users'], listings=options['listings'],
+            certificates=options['certificates'], transactions=options['transactions'],
+            categories=options['categories'], days=options['days'],
+            end=timezone.make_aware(datetime.combine(end, time.min)),
+            batch_size=options['batch_size'], use_copy=not options['no_copy'], log=self.stdout.write,
+        )
+        seeder.run(password=options['password'])
+        if not options['skip_derived']:
+            call_command('rebuild_search_index', stdout=self.stdout)
+            call_command('rebuild_analytics', stdout=self.stdout)
+        self.stdout.write(self.style.SUCCESS(
+            f"Seeded {seeder.counts['users']} users ({options['password']!r} as password, "
+            f"perf-user-<n>@example.com, the first {STAFF_USERS} are staff)."
+        ))
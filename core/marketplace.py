@@ -0,0 +1,63 @@
+# core/marketplace.py
+#
+# Buying a listing with green credits (POST /api/listings/{id}/purchase/). One short
+# transaction:
+# - claim the listing with a conditional UPDATE (status='active' at the price the buyer saw)
+# - debit the buyer's balance (ledger.record_debit, also a conditional UPDATE)
+# - write the redeemed_purchase ledger row
+# Under concurrent buyers only one UPDATE matches the active row. On PostgreSQL the others
+# wait on its row lock, then find it sold and get a 409. A debit that fails rolls the claim
+# back, so the listing is never left sold without payment. Locks are always taken
+# listing first, then buyer, so purchases can't deadlock each other.
+
+from django.db import transaction
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.exceptions import APIException, NotFound
+
+from .models import Listing
+from . import cache, ledger
+
+
+class ListingUnavailable(APIException):
+    status_code = status.HTTP_409_CONFLICT
+    default_detail = 'This listing is no longer available.'
+    default_code = 'listing_unavailable'
+
+
+def purchase(listing_id, buyer_id):
+    # Returns (listing values, ledger entry) or raises NotFound / ListingUnavailable / InsufficientCredits
+    try:
+        listing_id = int(listing_id)
+    except (TypeError, ValueError):
+        raise NotFound()
+    listing = (
+        Listing.objects.filter(pk=listing_id)
+        .values('id', 'user_id', 'status', 'is_redeemable_with_green_credits', 'green_credit_price')
+        .first()
+    )
+    if listing is None:
+        raise NotFound()
+    price = listing['green_credit_price']
+    if not listing['is_redeemable_with_green_credits'] or price is None:
+        raise ListingUnavailable('This listing cannot be bought with green credits.')
+    if listing['user_id'] == buyer_id:
+        raise ListingUnavailable('You cannot buy your own listing.')
+    if listing['status'] != 'active':
+        raise ListingUnavailable()
+
+    sold_at = timezone.now()
+    with transaction.atomic():
+        # The price is part of the condition: an edit after the read above makes this miss
+        claimed = Listing.objects.filter(
+            pk=listing_id, status='active', is_redeemable_with_green_credits=True, green_credit_price=price,
+        ).update(status='sold', buyer_id=buyer_id, sold_at=sold_at, updated_at=sold_at)
+        if not claimed:
+            raise ListingUnavailable()
+        entry = ledger.record_debit(
+            buyer_id, price, 'redeemed_purchase', listing_id=listing_id,
+            description=f'Purchase of listing {listing_id}',
+        )
+        # update() sends no post_save, so invalidate the cached catalog responses here
+        cache.invalidate(Listing)
+    return {**listing, 'status': 'sold', 'buyer_id': buyer_id, 'sold_at': sold_at}, entry
@@ -1,8 +1,39 @@
 import uuid
-from django.db import models
-from django.contrib.auth.models import AbstractUser # For custom user model
+from django.core.exceptions import ValidationError
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import models, transaction
+from django.db.models import F, Q, Value
+from django.db.models.functions import Concat, Substr
+from django.contrib.auth.models import AbstractUser, UserManager # For custom user model
+from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.search import SearchVectorField
+from django.utils import timezone
 from django.utils.translation import gettext_lazy as _ # For internationalization if needed
 
+from . import cache
+
+# Fields the cached token authentication depends on (core/authentication.py)
+AUTH_USER_FIELDS = ('is_active', 'password')
+
+
+class UserQuerySet(models.QuerySet):
+    def update(self, **kwargs):
+        # update() sends no post_save, so a bulk deactivation would leave tokens cached
+        # until their TTL. Evict the affected users once the change is committed.
+        if not AUTH_USER_FIELDS & kwargs.keys():
+            return super().update(**kwargs)
+        from . import authentication # authentication -> verification -> models
+        user_ids = list(self.values_list('pk', flat=True))
+        updated = super().update(**kwargs)
+        transaction.on_commit(lambda: authentication.evict_user(*user_ids), using=self.db)
+        return updated
+
+
+# Named, not the bare from_queryset() class: migrations have to be able to import it
+class CoreUserManager(UserManager.from_queryset(UserQuerySet)):
+    pass
+
+
 # 1. Custom User Model
 class User(AbstractUser):
     # Override the default auto-incrementing ID with a UUID
@@ -41,6 +72,7 @@ class User(AbstractUser):
     # For now, let's keep it simple and ensure email is unique.
     update_at = models.DateTimeField(auto_now=True)
 
+    objects = CoreUserManager()
 
     def __str__(self):
         return self.email or str(self.id)
@@ -65,12 +97,93 @@ class Category(models.Model):
         related_name='subcategories'
     )
 
+    # Materialized path of ancestor ids, e.g. '/1/5/12/' for 12 under 5 under 1.
+    # Maintained in save(); a whole subtree is then a single indexed prefix match.
+    path = models.CharField(max_length=255, default='', editable=False)
+    depth = models.PositiveSmallIntegerField(default=0, editable=False)
+
     class Meta:
         verbose_name_plural = 'Categories' # Correct pluralization in admin
+        indexes = [
+            # varchar_pattern_ops lets PostgreSQL use the index for LIKE 'prefix%'
+            models.Index(fields=['path'], name='category_path_idx', opclasses=['varchar_pattern_ops']),
+        ]
 
     def __str__(self):
         return self.name
 
+    def would_create_cycle(self, parent_id):
+        # True if parent_id is this category or one of its descendants
+        if parent_id is None or self.pk is None:
+            return False
+        if parent_id == self.pk:
+            return True
+        own_path = Category.objects.filter(pk=self.pk).values_list('path', flat=True).first()
+        parent_path = Category.objects.filter(pk=parent_id).values_list('path', flat=True).first()
+        return bool(own_path and parent_path and parent_path.startswith(own_path))
+
+    def clean(self):
+        super().clean()
+        if self.would_create_cycle(self.parent_category_id):
+            raise ValidationError({'parent_category': 'A category cannot be moved under itself or one of its subcategories.'})
+
+    def save(self, *args, **kwargs):
+        with transaction.atomic():
+            if self.would_create_cycle(self.parent_category_id):
+                raise ValidationError({'parent_category': 'A category cannot be moved under itself or one of its subcategories.'})
+            old = Category.objects.filter(pk=self.pk).values('path', 'depth').first() if self.pk else None
+            super().save(*args, **kwargs)
+
+            parent = None
+            if self.parent_category_id:
+                parent = Category.objects.filter(pk=self.parent_category_id).values('path', 'depth').first()
+            new_path = f"{parent['path'] if parent else '/'}{self.pk}/"
+            new_depth = parent['depth'] + 1 if parent else 0
+            if old and old['path'] == new_path:
+                return
+
+            Category.objects.filter(pk=self.pk).update(path=new_path, depth=new_depth)
+            if old and old['path']:
+                # Re-home the whole subtree in one UPDATE
+                Category.objects.filter(path__startswith=old['path']).exclude(pk=self.pk).update(
+                    path=Concat(Value(new_path), Substr('path', len(old['path']) + 1)),
+                    depth=F('depth') + (new_depth - old['depth']),
+                )
+            self.path, self.depth = new_path, new_depth
+
+    @classmethod
+    def rebuild_paths(cls):
+        # Recompute every path top-down (for rows created before paths existed)
+        rows = {row['id']: row for row in cls.objects.values('id', 'parent_category_id')}
+        paths = {}
+
+        def resolve(category_id, seen=()):
+            if category_id in paths:
+                return paths[category_id]
+            parent_id = rows[category_id]['parent_category_id']
+            if parent_id is None or parent_id in seen or parent_id not in rows:
+                paths[category_id] = (f'/{category_id}/', 0)
+            else:
+                parent_path, parent_depth = resolve(parent_id, seen + (category_id,))
+                paths[category_id] = (f'{parent_path}{category_id}/', parent_depth + 1)
+            return paths[category_id]
+
+        for category_id in rows:
+            resolve(category_id)
+        with transaction.atomic():
+            for category_id, (path, depth) in paths.items():
+                cls.objects.filter(pk=category_id).update(path=path, depth=depth)
+            cache.invalidate(Category)
+        return len(paths)
+
+    @classmethod
+    def subtree_ids(cls, category_id):
+        # Subquery of ids for the category and all of its descendants
+        path = cls.objects.filter(pk=category_id).values_list('path', flat=True).first()
+        if not path:
+            return cls.objects.filter(pk=category_id).values('id')
+        return cls.objects.filter(path__startswith=path).values('id')
+
 # 3. Certificate Model (Digital Certificate for Wipes)
 class Certificate(models.Model):
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False) # UUID for unique cert IDs
@@ -111,6 +224,13 @@ class Certificate(models.Model):
     generated_at = models.DateTimeField(auto_now_add=True) # When the certificate record was created in the DB
     is_invalidated = models.BooleanField(default=False)
 
+    class Meta:
+        indexes = [
+            # Keyset pagination over the certificate feed (ordering: -generated_at, id)
+            models.Index(fields=['-generated_at', 'id'], name='cert_feed_idx'),
+            models.Index(fields=['user', '-generated_at', 'id'], name='cert_user_feed_idx'),
+        ]
+
     def __str__(self):
         return f"Cert {self.id} for {self.device_serial_number}"
 
@@ -145,6 +265,10 @@ class Listing(models.Model):
     is_redeemable_with_green_credits = models.BooleanField(default=False)
     green_credit_price = models.IntegerField(blank=True, null=True, help_text="Number of green credits required for purchase")
 
+    # Set when the listing is bought through the purchase endpoint (core/marketplace.py)
+    buyer = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, related_name='purchases')
+    sold_at = models.DateTimeField(blank=True, null=True)
+
     # Link to a Certificate if this listing is for a device wiped by Clean Slate
     certificate = models.OneToOneField(
         Certificate,
@@ -154,6 +278,35 @@ class Listing(models.Model):
         help_text="Link to the Clean Slate certificate if this device was wiped by the platform"
     )
 
+    # Weighted tsvector over title/brand/model_name/description, kept up to date by core/search.py
+    # (PostgreSQL only; SQLite uses an FTS5 side table instead)
+    search_vector = SearchVectorField(null=True, blank=True, editable=False)
+
+    # Copy of the primary ListingMedia.file_url so listing cards never join the media table.
+    # Maintained by ListingMedia.save() and the post_delete receiver in signals.py.
+    primary_media_url = models.URLField(max_length=500, blank=True, null=True, editable=False)
+
+    class Meta:
+        indexes = [
+            # Keyset pagination over the listing feed (ordering: -created_at, id)
+            models.Index(fields=['-created_at', 'id'], name='listing_feed_idx'),
+            # Browse filters (core/filters.py). Most browsing is of active listings, so the
+            # feed ordering gets a partial index over just those rows.
+            models.Index(fields=['-created_at', 'id'], name='listing_active_feed_idx', condition=Q(status='active')),
+            models.Index(
+                fields=['-created_at', 'id'], name='listing_redeemable_feed_idx',
+                condition=Q(status='active', is_redeemable_with_green_credits=True),
+            ),
+            models.Index(fields=['category', '-created_at', 'id'], name='listing_category_feed_idx'),
+            models.Index(fields=['status', 'condition', '-created_at'], name='listing_condition_feed_idx'),
+            # Range filters: equality column first, then the range column
+            models.Index(fields=['status', 'price'], name='listing_status_price_idx'),
+            models.Index(fields=['status', 'health_score'], name='listing_status_health_idx'),
+            # Full-text search and trigram typo tolerance (pg_trgm is enabled by core.search.enable_extensions before migrating)
+            GinIndex(fields=['search_vector'], name='listing_search_idx'),
+            GinIndex(fields=['title'], name='listing_title_trgm_idx', opclasses=['gin_trgm_ops']),
+        ]
+
     def __str__(self):
         return self.title
 
@@ -167,18 +320,91 @@ class ListingMedia(models.Model):
     media_type = models.CharField(max_length=20, choices=MEDIA_TYPE_CHOICES, default='image')
     
     is_primary = models.BooleanField(default=False) # Indicates the main cover photo
+    position = models.PositiveIntegerField(blank=True, help_text="Display order within the listing (appended at the end if left empty)")
     created_at = models.DateTimeField(auto_now_add=True)
 
     class Meta:
-        # Ensures only one primary image per listing
-        unique_together = ('listing', 'is_primary')
+        ordering = ('position', 'id')
+        constraints = [
+            # At most one primary image per listing; any number of secondary ones
+            models.UniqueConstraint(fields=['listing'], condition=Q(is_primary=True), name='listingmedia_one_primary'),
+        ]
         indexes = [
-            models.Index(fields=['listing']), # For faster lookups of media for a listing
+            # Media for a listing in display order (also covers plain lookups by listing)
+            models.Index(fields=['listing', 'position', 'id'], name='listingmedia_position_idx'),
         ]
 
     def __str__(self):
         return f"{self.listing.title} - {self.media_type} ({'Primary' if self.is_primary else 'Secondary'})"
 
+    def save(self, *args, **kwargs):
+        with transaction.atomic():
+            if self.position is None:
+                last = ListingMedia.objects.filter(listing_id=self.listing_id).aggregate(last=models.Max('position'))['last']
+                self.position = 0 if last is None else last + 1
+            if self.is_primary:
+                # Demote the current primary first so the partial unique constraint holds
+                ListingMedia.objects.filter(listing_id=self.listing_id, is_primary=True).exclude(pk=self.pk).update(is_primary=False)
+            super().save(*args, **kwargs)
+            self.is_primary = ListingMedia.sync_primary(self.listing_id) == self.pk
+
+    @classmethod
+    def sync_primary(cls, listing_id):
+        # Make sure the listing has a primary image if it has any media (promoting the first
+        # by position) and copy its URL onto Listing.primary_media_url
+        with transaction.atomic():
+            media = cls.objects.select_for_update().filter(listing_id=listing_id)
+            primary = media.filter(is_primary=True).values('id', 'file_url').first()
+            if primary is None:
+                primary = media.order_by('position', 'id').values('id', 'file_url').first()
+                if primary is not None:
+                    cls.objects.filter(pk=primary['id']).update(is_primary=True)
+            Listing.objects.filter(pk=listing_id).update(primary_media_url=primary['file_url'] if primary else None)
+            # The updates above send no post_save
+            cache.invalidate(Listing, ListingMedia)
+        return primary['id'] if primary else None
+
+    @classmethod
+    def rebuild_positions(cls, batch_size=500):
+        # Backfill for media created before positions and Listing.primary_media_url existed:
+        # number each listing's media 0..n-1 in (position, id) order, promote the first one
+        # where no primary is marked and copy the primary's URL onto the listing. One
+        # transaction per batch of listings; returns the number of media rows renumbered.
+        listing_ids = list(cls.objects.order_by('listing_id').values_list('listing_id', flat=True).distinct())
+        renumbered = 0
+        for start in range(0, len(listing_ids), batch_size):
+            batch = listing_ids[start:start + batch_size]
+            with transaction.atomic():
+                media = list(
+                    cls.objects.select_for_update().filter(listing_id__in=batch)
+                    .order_by('listing_id', 'position', 'id').only('id', 'listing_id', 'position', 'is_primary', 'file_url')
+                )
+                moved, promoted, primaries, next_position = [], [], {}, {}
+                for item in media:
+                    position = next_position.get(item.listing_id, 0)
+                    next_position[item.listing_id] = position + 1
+                    if item.position != position:
+                        item.position = position
+                        moved.append(item)
+                    if item.is_primary:
+                        primaries[item.listing_id] = item
+                for item in media:
+                    if item.listing_id not in primaries: # First in order: the listing has no primary yet
+                        primaries[item.listing_id] = item
+                        promoted.append(item.pk)
+                cls.objects.bulk_update(moved, ['position'], batch_size=batch_size)
+                cls.objects.filter(pk__in=promoted).update(is_primary=True)
+                Listing.objects.bulk_update(
+                    [Listing(pk=listing_id, primary_media_url=item.file_url) for listing_id, item in primaries.items()],
+                    ['primary_media_url'], batch_size=batch_size,
+                )
+                renumbered += len(moved)
+        with transaction.atomic():
+            # Listings whose media are all gone
+            Listing.objects.exclude(primary_media_url=None).exclude(media__isnull=False).update(primary_media_url=None)
+            cache.invalidate(Listing, ListingMedia)
+        return renumbered
+
 # 6. AdminAction Model (Auditing Admin Activities)
 class AdminAction(models.Model):
     id = models.BigAutoField(primary_key=True)
@@ -204,7 +430,7 @@ class SubscriptionPackage(models.Model):
     is_active = models.BooleanField(default=True)
 
     #i added
-    green_credits_awarded = models.IntegerFiel(
+    green_credits_awarded = models.IntegerField(
         default=0,
         help_text="Total green credits awarded upon purchasing this package."
     )
@@ -230,6 +456,12 @@ class UserSubscription(models.Model):
     # Using JSONField for flexible metadata from payment gateways (PostgreSQL's JSONB)
     payment_details = models.JSONField(blank=True, null=True) # e.g., Stripe subscription ID, transaction details
 
+    class Meta:
+        indexes = [
+            # The scheduler's "due" scan: status IN (active, trial) AND end_date <= now
+            models.Index(fields=['status', 'end_date'], name='subscription_due_idx'),
+        ]
+
     def __str__(self):
         return f"{self.user.email}'s {self.package.name} subscription"
 
@@ -254,7 +486,9 @@ class GreenCreditTransaction(models.Model):
     
     TRANSACTION_TYPE_CHOICES = [
         ('awarded_wipe', 'Awarded for Wipe'),
+        ('registration_bonus', 'Registration Bonus'),
         ('redeemed_purchase', 'Redeemed for Purchase'),
+        ('subscription_renewal', 'Subscription Renewal'),
         ('admin_adjustment', 'Admin Adjustment'),
         ('refund', 'Refund'),
         ('other', 'Other'),
@@ -264,6 +498,155 @@ class GreenCreditTransaction(models.Model):
     transaction_time = models.DateTimeField(auto_now_add=True)
     description = models.TextField(blank=True, null=True)
 
+    class Meta:
+        indexes = [
+            # Keyset pagination over the ledger (ordering: -transaction_time, id)
+            models.Index(fields=['-transaction_time', 'id'], name='credit_tx_feed_idx'),
+            models.Index(fields=['user', '-transaction_time', 'id'], name='credit_tx_user_feed_idx'),
+        ]
+
     def __str__(self):
         user_email = self.user.email if self.user else "N/A"
-        return f"User {user_email} {self.transaction_type} {self.amount} credits"
\ No newline at end of file
+        return f"User {user_email} {self.transaction_type} {self.amount} credits"
+
+# 10. Job Model (DB-backed queue for side effects that must not run in the request path)
+class Job(models.Model):
+    id = models.BigAutoField(primary_key=True)
+    name = models.CharField(max_length=100) # Handler name registered in core/jobs.py
+    payload = models.JSONField(default=dict, blank=True)
+    idempotency_key = models.CharField(max_length=255, unique=True, blank=True, null=True) # Same key is only ever enqueued once
+
+    STATUS_CHOICES = [
+        ('queued', 'Queued'), ('running', 'Running'), ('done', 'Done'), ('dead', 'Dead'),
+    ]
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='queued')
+    attempts = models.IntegerField(default=0)
+    max_attempts = models.IntegerField(default=5)
+    run_at = models.DateTimeField(default=timezone.now) # Not picked up before this time (used for backoff)
+    locked_by = models.CharField(max_length=100, blank=True, null=True) # Worker currently running the job
+    locked_at = models.DateTimeField(blank=True, null=True)
+    last_error = models.TextField(blank=True, null=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    finished_at = models.DateTimeField(blank=True, null=True)
+
+    class Meta:
+        indexes = [
+            # Workers only ever scan ready jobs
+            models.Index(fields=['run_at', 'id'], name='job_ready_idx', condition=Q(status='queued')),
+            models.Index(fields=['locked_at'], name='job_running_idx', condition=Q(status='running')),
+        ]
+
+    def __str__(self):
+        return f"{self.name} #{self.id} ({self.status})"
+
+# 11. DeadLetterJob Model (Jobs that ran out of retries, kept for inspection and replay)
+class DeadLetterJob(models.Model):
+    id = models.BigAutoField(primary_key=True)
+    job_id = models.BigIntegerField() # Id of the original Job row
+    name = models.CharField(max_length=100)
+    payload = models.JSONField(default=dict, blank=True)
+    idempotency_key = models.CharField(max_length=255, blank=True, null=True)
+    attempts = models.IntegerField(default=0)
+    last_error = models.TextField(blank=True, null=True)
+    failed_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"{self.name} #{self.job_id} (dead)"
+
+# 12. AnchorBatch Model (One Merkle root anchored on chain for many certificates)
+class AnchorBatch(models.Model):
+    id = models.BigAutoField(primary_key=True)
+    merkle_root = models.CharField(max_length=64) # Hex SHA-256
+    size = models.IntegerField() # Number of certificates (leaves) in the tree
+
+    STATUS_CHOICES = [
+        ('pending', 'Pending'), ('submitted', 'Submitted'), ('failed', 'Failed'),
+    ]
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending')
+    chain = models.CharField(max_length=50, blank=True, null=True) # e.g. 'polygon', 'fake'
+    tx_hash = models.CharField(max_length=255, unique=True, blank=True, null=True) # Transaction carrying the root
+    created_at = models.DateTimeField(auto_now_add=True)
+    submitted_at = models.DateTimeField(blank=True, null=True)
+    last_error = models.TextField(blank=True, null=True) # Why the last submission failed
+
+    def __str__(self):
+        return f"Batch {self.id} ({self.size} certs, {self.status})"
+
+# 13. CertificateProof Model (Merkle inclusion proof of a certificate in an AnchorBatch)
+class CertificateProof(models.Model):
+    certificate = models.OneToOneField(Certificate, on_delete=models.CASCADE, primary_key=True, related_name='anchor_proof')
+    batch = models.ForeignKey(AnchorBatch, on_delete=models.CASCADE, related_name='proofs')
+    leaf_hash = models.CharField(max_length=64) # Hash of the certificate's canonical form at anchoring time
+    leaf_index = models.IntegerField()
+    proof = models.JSONField(default=list) # [[sibling_hash, 'L' or 'R'], ...] from leaf to root
+
+    def __str__(self):
+        return f"Proof for {self.certificate_id} in batch {self.batch_id}"
+
+# 14. WipeRollup Model (Precomputed wipe counts for analytics dashboards)
+# Rebuilt per period by core/analytics.py; user=None rows are the platform-wide totals
+ROLLUP_GRAIN_CHOICES = [('day', 'Day'), ('month', 'Month')]
+
+class WipeRollup(models.Model):
+    id = models.BigAutoField(primary_key=True)
+    grain = models.CharField(max_length=10, choices=ROLLUP_GRAIN_CHOICES)
+    period = models.DateField() # First day of the day/month
+    user = models.ForeignKey(User, on_delete=models.CASCADE, null=True, blank=True, related_name='wipe_rollups')
+    wiping_method = models.CharField(max_length=100)
+    device_type = models.CharField(max_length=50, blank=True, null=True)
+    operating_system = models.CharField(max_length=50, blank=True, null=True)
+    status = models.CharField(max_length=50)
+    count = models.IntegerField()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['grain', 'period'], name='wipe_rollup_global_idx', condition=Q(user__isnull=True)),
+            models.Index(fields=['user', 'grain', 'period'], name='wipe_rollup_user_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.grain} {self.period} {self.user_id or 'all'}: {self.count} {self.status} wipes"
+
+# 15. CreditRollup Model (Precomputed green credit movements per transaction type)
+class CreditRollup(models.Model):
+    id = models.BigAutoField(primary_key=True)
+    grain = models.CharField(max_length=10, choices=ROLLUP_GRAIN_CHOICES)
+    period = models.DateField()
+    user = models.ForeignKey(User, on_delete=models.CASCADE, null=True, blank=True, related_name='credit_rollups')
+    transaction_type = models.CharField(max_length=50)
+    count = models.IntegerField()
+    credited = models.IntegerField(default=0) # Sum of positive amounts
+    debited = models.IntegerField(default=0) # Sum of negative amounts (<= 0)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['grain', 'period'], name='credit_rollup_global_idx', condition=Q(user__isnull=True)),
+            models.Index(fields=['user', 'grain', 'period'], name='credit_rollup_user_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.grain} {self.period} {self.user_id or 'all'}: {self.transaction_type} +{self.credited}/{self.debited}"
+
+# 16. IdempotencyRecord Model (Stored responses of create requests sent with an Idempotency-Key)
+# Written and replayed by core/idempotency.py; purged once expires_at has passed
+class IdempotencyRecord(models.Model):
+    id = models.BigAutoField(primary_key=True)
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='idempotency_records')
+    scope = models.CharField(max_length=100) # Endpoint the key was used on, e.g. 'certificate.create'
+    key = models.CharField(max_length=255) # Client-supplied Idempotency-Key header
+    request_hash = models.CharField(max_length=64) # sha256 of the request body
+    status_code = models.PositiveSmallIntegerField(null=True, blank=True) # Null while the first request is in flight
+    response_body = models.JSONField(null=True, blank=True, encoder=DjangoJSONEncoder)
+    created_at = models.DateTimeField(auto_now_add=True)
+    expires_at = models.DateTimeField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'scope', 'key'], name='idempotency_unique_key'),
+        ]
+        indexes = [
+            models.Index(fields=['expires_at'], name='idempotency_expiry_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.scope} {self.key} ({self.status_code or 'in flight'})"
@@ -0,0 +1,225 @@
+import base64
+import binascii
+import json
+from collections import OrderedDict
+
+from django.db import connections
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination, PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+
+def keyset_filter(ordering, values, reverse=False):
+    # Builds the "row comes after this position" condition for an ordering like
+    # ('-created_at', 'id'): (created_at < v0) OR (created_at = v0 AND id > v1)
+    condition = Q()
+    for i, field in enumerate(ordering):
+        name = field.lstrip('-')
+        descending = field.startswith('-') != reverse
+        step = Q(**{f"{name}__{'lt' if descending else 'gt'}": values[i]})
+        for prev_field, prev_value in zip(ordering[:i], values[:i]):
+            step &= Q(**{prev_field.lstrip('-'): prev_value})
+        condition |= step
+    return condition
+
+
+def reversed_ordering(ordering):
+    return tuple(field[1:] if field.startswith('-') else '-' + field for field in ordering)
+
+
+def row_position(row, ordering):
+    # Rows can be model instances or plain dicts (e.g. from .values() querysets)
+    names = [field.lstrip('-') for field in ordering]
+    if isinstance(row, dict):
+        values = [row[name] for name in names]
+    else:
+        values = [getattr(row, name) for name in names]
+    return [value.isoformat() if hasattr(value, 'isoformat') else str(value) for value in values]
+
+
+def table_row_estimate(model, using='default'):
+    # pg_class.reltuples: the row count ANALYZE/autovacuum last saw, read in O(1).
+    # -1 (never analyzed) and non-PostgreSQL backends give None.
+    connection = connections[using]
+    if connection.vendor != 'postgresql':
+        return None
+    with connection.cursor() as cursor:
+        cursor.execute('SELECT reltuples FROM pg_class WHERE oid = %s::regclass', [model._meta.db_table])
+        row = cursor.fetchone()
+    if row is None or row[0] < 0:
+        return None
+    return int(row[0])
+
+
+def approximate_count(queryset):
+    # Planner estimate instead of COUNT(*). Only PostgreSQL gives us a cheap one.
+    connection = connections[queryset.db]
+    if connection.vendor != 'postgresql':
+        return None
+    sql, params = queryset.order_by().query.sql_with_params()
+    with connection.cursor() as cursor:
+        cursor.execute(f'EXPLAIN (FORMAT JSON) {sql}', params)
+        plan = cursor.fetchone()[0]
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    return int(plan[0]['Plan']['Plan Rows'])
+
+
+# Keyset (cursor) pagination keyed on a composite, unique ordering.
+# The cursor is an opaque base64 token holding the ordering values of the last row seen.
+class KeysetPagination(BasePagination):
+    ordering = ('-id',)
+    page_size = 10
+    max_page_size = 100
+    cursor_query_param = 'cursor'
+    page_size_query_param = 'page_size'
+    count_query_param = 'include_total'
+    invalid_cursor_message = 'Invalid cursor'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        return self.set_page(list(self.page_queryset(queryset, request)))
+
+    def page_queryset(self, queryset, request, count=True):
+        # The query for one page, not yet evaluated. The async views (core/async_views.py)
+        # run it with async iteration and hand the rows to set_page(); they pass count=False
+        # because approximate_count() runs a synchronous EXPLAIN.
+        self.request = request
+        self.base_url = request.build_absolute_uri()
+        self.page_size = self.get_page_size(request)
+        self.position, self.reverse = self.decode_cursor(request)
+
+        ordering = reversed_ordering(self.ordering) if self.reverse else self.ordering
+        queryset = queryset.order_by(*ordering)
+
+        self.approximate_total = None
+        if count and request.query_params.get(self.count_query_param) in ('1', 'true', 'approx'):
+            self.approximate_total = approximate_count(queryset)
+
+        if self.position is not None:
+            queryset = queryset.filter(keyset_filter(self.ordering, self.position, reverse=self.reverse))
+
+        # Fetch one extra row to know whether there is another page
+        return queryset[:self.page_size + 1]
+
+    def set_page(self, rows):
+        has_more = len(rows) > self.page_size
+        rows = rows[:self.page_size]
+        if self.reverse:
+            rows.reverse()
+
+        self.page = rows
+        self.has_next = has_more if not self.reverse else self.position is not None
+        self.has_previous = self.position is not None if not self.reverse else has_more
+        return rows
+
+    def get_page_size(self, request):
+        try:
+            size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        return max(1, min(size, self.max_page_size))
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None, False
+        try:
+            data = json.loads(base64.urlsafe_b64decode(encoded.encode('ascii')).decode('utf-8'))
+            position = data['p']
+            reverse = bool(data.get('r', False))
+        except (binascii.Error, UnicodeError, ValueError, KeyError, TypeError):
+            raise NotFound(self.invalid_cursor_message)
+        if not isinstance(position, list) or len(position) != len(self.ordering):
+            raise NotFound(self.invalid_cursor_message)
+        return position, reverse
+
+    def encode_cursor(self, position, reverse=False):
+        data = {'p': position}
+        if reverse:
+            data['r'] = True
+        token = base64.urlsafe_b64encode(json.dumps(data, separators=(',', ':')).encode('utf-8'))
+        return replace_query_param(self.base_url, self.cursor_query_param, token.decode('ascii'))
+
+    def get_next_link(self):
+        if not self.has_next or not self.page:
+            return None
+        return self.encode_cursor(row_position(self.page[-1], self.ordering))
+
+    def get_previous_link(self):
+        if not self.has_previous:
+            return None
+        if not self.page:
+            return remove_query_param(self.base_url, self.cursor_query_param)
+        return self.encode_cursor(row_position(self.page[0], self.ordering), reverse=True)
+
+    def get_paginated_response(self, data):
+        body = OrderedDict([
+            ('next', self.get_next_link()),
+            ('previous', self.get_previous_link()),
+        ])
+        if self.approximate_total is not None:
+            body['approximate_count'] = self.approximate_total
+        body['results'] = data
+        return Response(body)
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'required': ['results'],
+            'properties': {
+                'next': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'previous': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'approximate_count': {'type': 'integer'},
+                'results': schema,
+            },
+        }
+
+
+# Page numbers stay the default so existing clients keep working.
+# Clients opt in to keyset mode by sending ?cursor= (or ?pagination=keyset for the first page).
+class KeysetOrPageNumberPagination(BasePagination):
+    ordering = ('-id',)
+    mode_query_param = 'pagination'
+
+    def __init__(self):
+        self.page_number = PageNumberPagination()
+        self.keyset = KeysetPagination()
+        self.keyset.ordering = self.ordering
+        self.active = self.page_number
+
+    def uses_keyset(self, request):
+        return (
+            request.query_params.get(self.mode_query_param) == 'keyset'
+            or self.keyset.cursor_query_param in request.query_params
+        )
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.active = self.keyset if self.uses_keyset(request) else self.page_number
+        return self.active.paginate_queryset(queryset, request, view)
+
+    def get_paginated_response(self, data):
+        return self.active.get_paginated_response(data)
+
+    def get_paginated_response_schema(self, schema):
+        return self.page_number.get_paginated_response_schema(schema)
+
+    @property
+    def display_page_controls(self):
+        return self.active is self.page_number and getattr(self.page_number, 'display_page_controls', False)
+
+    def to_html(self):
+        return self.page_number.to_html()
+
+
+class ListingPagination(KeysetOrPageNumberPagination):
+    ordering = ('-created_at', 'id')
+
+
+class CertificatePagination(KeysetOrPageNumberPagination):
+    ordering = ('-generated_at', 'id')
+
+
+class GreenCreditTransactionPagination(KeysetOrPageNumberPagination):
+    ordering = ('-transaction_time', 'id')
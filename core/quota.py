@@ -0,0 +1,114 @@
+# core/quota.py
+#
+# Wipe quota. Every certificate that isn't a failed wipe consumes one wipe. Wipes are
+# reserved with a single conditional UPDATE (wipes_remaining >= n), so stations
+# submitting in parallel can never push a balance below zero. There is no read followed
+# by a write for two requests to race on. A package with wipes_allowed == 0 is
+# unlimited: nothing is taken from wipes_remaining and only the subscription's usage
+# counter moves.
+#
+# Usage is charged to the active subscription when the user has one, otherwise to the
+# free wipes (User.free_wipes_used). A certificate that later turns out failed gives
+# its wipe back.
+
+from django.db import transaction
+from django.db.models import F
+from django.db.models.functions import Greatest
+from rest_framework import status
+from rest_framework.exceptions import APIException
+
+from .models import User, UserSubscription
+from . import summary
+
+ACTIVE_SUBSCRIPTION_STATUSES = ('active', 'trial')
+
+
+class QuotaExceeded(APIException):
+    status_code = status.HTTP_403_FORBIDDEN
+    default_detail = 'Not enough wipes remaining. Upgrade your subscription to continue.'
+    default_code = 'quota_exceeded'
+
+
+def consumes_quota(certificate_status):
+    return certificate_status != 'failed'
+
+
+def _plan(user_id):
+    # (unlimited, package_id) for the user's current package; one small query
+    package = (
+        User.objects.filter(pk=user_id)
+        .values_list('current_subscription_package_id', 'current_subscription_package__wipes_allowed')
+        .first()
+    )
+    if package is None or package[0] is None:
+        return False, None
+    return package[1] == 0, package[0]
+
+
+def _subscriptions(user_id, package_id):
+    return UserSubscription.objects.filter(user_id=user_id, package_id=package_id, status__in=ACTIVE_SUBSCRIPTION_STATUSES)
+
+
+def reserve(user_id, count=1):
+    # Take `count` wipes or raise QuotaExceeded without changing anything
+    if count <= 0:
+        return
+    unlimited, package_id = _plan(user_id)
+    with transaction.atomic():
+        summary.evict(user_id) # On commit: outside the block it would run before the UPDATE
+        if not unlimited:
+            usage = {'wipes_remaining': F('wipes_remaining') - count}
+            if package_id is None:
+                usage['free_wipes_used'] = F('free_wipes_used') + count
+            if not User.objects.filter(pk=user_id, wipes_remaining__gte=count).update(**usage):
+                raise QuotaExceeded()
+        if package_id is not None:
+            _subscriptions(user_id, package_id).update(wipes_used=F('wipes_used') + count)
+
+
+def reserve_up_to(user_id, count):
+    # Take as many of `count` wipes as are left and return how many that was. The read only
+    # sizes the request: reserve() still checks it in its UPDATE, and a parallel reservation
+    # that gets in between just means reading again.
+    if count <= 0:
+        return 0
+    unlimited, _ = _plan(user_id)
+    if unlimited:
+        reserve(user_id, count)
+        return count
+    while True:
+        remaining = User.objects.filter(pk=user_id).values_list('wipes_remaining', flat=True).first() or 0
+        granted = min(count, max(remaining, 0))
+        if not granted:
+            return 0
+        try:
+            reserve(user_id, granted)
+        except QuotaExceeded:
+            continue
+        return granted
+
+
+def release(user_id, count=1):
+    # Give back wipes taken by reserve() (e.g. a certificate that ended up failed)
+    if count <= 0:
+        return
+    unlimited, package_id = _plan(user_id)
+    with transaction.atomic():
+        summary.evict(user_id)
+        if not unlimited:
+            usage = {'wipes_remaining': F('wipes_remaining') + count}
+            if package_id is None:
+                # Clamped: a release without a matching reserve (e.g. rows from before the
+                # counter existed) must not push the counter below zero
+                usage['free_wipes_used'] = Greatest(F('free_wipes_used') - count, 0)
+            User.objects.filter(pk=user_id).update(**usage)
+        if package_id is not None:
+            _subscriptions(user_id, package_id).filter(wipes_used__gte=count).update(wipes_used=F('wipes_used') - count)
+
+
+def apply_status_change(user_id, old_status, new_status):
+    # Reserve or release when an update moves a certificate in or out of the failed state
+    if consumes_quota(old_status) and not consumes_quota(new_status):
+        release(user_id)
+    elif not consumes_quota(old_status) and consumes_quota(new_status):
+        reserve(user_id)
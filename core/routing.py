@@ -0,0 +1,276 @@
+# core/routing.py
+#
+# Read-replica routing. Writes and anything not opted in go to 'default'. Views that
+# mix in ReplicaReadMixin send their safe reads to one of settings.DATABASE_REPLICAS:
+# the public catalog viewsets and analytics. Their async twins (core/async_views.py) opt
+# in with @async_replica_reads; under ASGI, ReadYourWritesMiddleware gives every safe
+# request an inert ReadTarget that the decorator switches on.
+#
+# The replica is chosen lazily, on the first query of the request, so a catalog cache
+# hit never costs a lookup. Reads stay on the primary when:
+# - the user wrote something within DATABASE_REPLICA_MAX_LAG (read-your-writes, marked
+#   by ReadYourWritesMiddleware in the catalog cache)
+# - a model behind the response changed within that window (see cache.recently_bumped),
+#   so a lagging replica is never frozen into the catalog cache
+# - no replica is healthy, or the request is inside a transaction on the primary
+#
+# Health is checked per process, at most every DATABASE_REPLICA_CHECK_INTERVAL seconds
+# per replica: it has to answer and not lag more than DATABASE_REPLICA_MAX_LAG. A replica
+# that fails a query mid-request is marked down and the request is run again on the primary.
+
+import random
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import wraps
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.db import DatabaseError, InterfaceError, OperationalError, connections, transaction
+from django.utils.functional import SimpleLazyObject
+from rest_framework.permissions import SAFE_METHODS
+
+from . import cache
+
+REPLICAS = tuple(getattr(settings, 'DATABASE_REPLICAS', ()))
+MAX_LAG = getattr(settings, 'DATABASE_REPLICA_MAX_LAG', 5)
+CHECK_INTERVAL = getattr(settings, 'DATABASE_REPLICA_CHECK_INTERVAL', 10)
+
+# Seconds the replica is behind: 0 when it has replayed everything it received
+POSTGRES_LAG_SQL = (
+    "SELECT CASE WHEN NOT pg_is_in_recovery() OR pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0 "
+    "ELSE EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()) END"
+)
+
+_read_target = ContextVar('core_read_target', default=None)
+_health = {} # alias -> (healthy, checked_at)
+_health_lock = threading.Lock()
+
+
+# Health
+
+def check_replica(alias):
+    connection = connections[alias]
+    try:
+        with connection.cursor() as cursor:
+            if connection.vendor == 'postgresql':
+                cursor.execute(POSTGRES_LAG_SQL)
+                lag = cursor.fetchone()[0]
+                return lag is None or float(lag) <= MAX_LAG
+            cursor.execute('SELECT 1')
+            return True
+    except DatabaseError:
+        connection.close()
+        return False
+
+
+def is_healthy(alias):
+    with _health_lock:
+        healthy, checked_at = _health.get(alias, (None, 0))
+    if healthy is not None and time.monotonic() - checked_at < CHECK_INTERVAL:
+        return healthy
+    healthy = check_replica(alias)
+    with _health_lock:
+        _health[alias] = (healthy, time.monotonic())
+    return healthy
+
+
+def mark_down(alias):
+    # Skipped until the next check is due
+    with _health_lock:
+        _health[alias] = (False, time.monotonic())
+    connections[alias].close()
+
+
+def pick_replica():
+    candidates = list(REPLICAS)
+    random.shuffle(candidates) # Spread load; order doesn't matter for correctness
+    for alias in candidates:
+        if is_healthy(alias):
+            return alias
+    return None
+
+
+# Read-your-writes
+
+def sticky_key(user_id):
+    return f'db-sticky:{user_id}'
+
+
+def is_sticky(user_id):
+    return user_id is not None and cache.get_cache().get(sticky_key(user_id)) is not None
+
+
+def mark_sticky(user_id):
+    cache.get_cache().set(sticky_key(user_id), 1, timeout=MAX_LAG)
+
+
+async def amark_sticky(user_id):
+    await cache.get_cache().aset(sticky_key(user_id), 1, timeout=MAX_LAG)
+
+
+async def arequest_user(request):
+    # request.user is a lazy session lookup (sync only) unless DRF replaced it with the
+    # user it authenticated
+    user = getattr(request, 'user', None)
+    if isinstance(user, SimpleLazyObject):
+        return await request.auser()
+    return user
+
+
+class ReadYourWritesMiddleware:
+    # After a successful write, the user's reads stay on the primary for MAX_LAG seconds.
+    # DRF copies the authenticated user onto the Django request, so token users count too.
+    #
+    # The marker lives in the catalog cache. Without CATALOG_CACHE_URL that is a
+    # per-process locmem cache, so a write only pins the reads that the same worker
+    # serves. Point it at a shared Redis for stickiness across workers and servers.
+    #
+    # Runs natively in both modes: under ASGI the request is never pushed onto a thread.
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        response = self.get_response(request)
+        if self.wrote(request, response):
+            user = getattr(request, 'user', None)
+            if user is not None and user.is_authenticated:
+                mark_sticky(user.pk)
+        return response
+
+    async def __acall__(self, request):
+        token = None
+        if REPLICAS and request.method in SAFE_METHODS:
+            # Inert until an async view opts in (async_replica_reads); sync views under
+            # ASGI still route through ReplicaReadMixin
+            user = await arequest_user(request)
+            user_id = user.pk if user is not None and user.is_authenticated else None
+            token = _read_target.set(ReadTarget(user_id, (), opted_in=False))
+        try:
+            response = await self.get_response(request)
+        finally:
+            if token is not None:
+                _read_target.reset(token)
+        if self.wrote(request, response):
+            user = await arequest_user(request)
+            if user is not None and user.is_authenticated:
+                await amark_sticky(user.pk)
+        return response
+
+    def wrote(self, request, response):
+        return bool(REPLICAS) and request.method not in SAFE_METHODS and response.status_code < 400
+
+
+# Routing
+
+class ReadTarget:
+    # Where this request's reads go, resolved on its first query
+    def __init__(self, user_id, labels, opted_in=True):
+        self.user_id = user_id
+        self.labels = labels
+        self.opted_in = opted_in
+        self.alias = None
+        self.resolved = False
+
+    def resolve(self):
+        if not self.resolved:
+            self.resolved = True
+            if not is_sticky(self.user_id) and not cache.recently_bumped(self.labels):
+                self.alias = pick_replica()
+        return self.alias
+
+
+@contextmanager
+def read_from(alias):
+    # Route the reads in this block to `alias` (None: the primary)
+    target = ReadTarget(None, ())
+    target.alias, target.resolved = alias, True
+    token = _read_target.set(target)
+    try:
+        yield
+    finally:
+        _read_target.reset(token)
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        target = _read_target.get()
+        if target is None or not target.opted_in or connections['default'].in_atomic_block:
+            return None # Django falls back to the instance's database, then 'default'
+        return target.resolve()
+
+    def db_for_write(self, model, **hints):
+        return 'default'
+
+    def allow_relation(self, obj1, obj2, **hints):
+        return True # Replicas hold the same rows as the primary
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db not in REPLICAS
+
+
+class ReplicaReadMixin:
+    # ViewSet mixin: safe requests to `replica_actions` read from a replica
+    replica_actions = ('list', 'retrieve')
+
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        # Decided after authentication, so the token lookup itself stays on the primary
+        if REPLICAS and not self.replica_failed and request.method in SAFE_METHODS and getattr(self, 'action', None) in self.replica_actions:
+            labels = [cache.model_label(model) for model in getattr(self, 'cache_models', ())]
+            self.read_target = ReadTarget(request.user.pk if request.user.is_authenticated else None, labels)
+            self.read_target_token = _read_target.set(self.read_target)
+
+    def dispatch(self, request, *args, **kwargs):
+        self.replica_failed = False
+        self.read_target = None
+        try:
+            return super().dispatch(request, *args, **kwargs)
+        except (OperationalError, InterfaceError):
+            alias = self.read_target.alias if self.read_target is not None else None
+            if alias is None or not transaction.get_autocommit('default'):
+                raise
+            # The replica went away mid-request: take it out and answer from the primary
+            mark_down(alias)
+            self.clear_read_target()
+            self.replica_failed = True
+            return super().dispatch(request, *args, **kwargs)
+        finally:
+            self.clear_read_target()
+
+    def clear_read_target(self):
+        if self.read_target is not None:
+            _read_target.reset(self.read_target_token)
+            self.read_target = None
+
+
+def async_replica_reads(*models):
+    # The async views' ReplicaReadMixin: switches on the request's ReadTarget (set by
+    # ReadYourWritesMiddleware under ASGI), and re-runs the view on the primary if the
+    # replica fails mid-request. `models` are the ones behind the response.
+    labels = [cache.model_label(model) for model in models]
+
+    def decorate(view):
+        @wraps(view)
+        async def wrapper(request, *args, **kwargs):
+            target = _read_target.get()
+            if target is not None and not target.resolved:
+                target.labels, target.opted_in = labels, True
+            try:
+                return await view(request, *args, **kwargs)
+            except (OperationalError, InterfaceError):
+                if target is None or target.alias is None:
+                    raise
+                await sync_to_async(mark_down)(target.alias)
+                target.alias = None
+                return await view(request, *args, **kwargs)
+        return wrapper
+    return decorate
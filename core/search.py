@@ -0,0 +1,235 @@
+# core/search.py
+#
+# Listing search. On PostgreSQL this uses the weighted Listing.search_vector column (GIN
+# indexed) plus pg_trgm similarity on the title for typo tolerance. On SQLite (tests and
+# local development) it falls back to an FTS5 side table keyed by listing id.
+# On PostgreSQL a BEFORE INSERT/UPDATE trigger keeps search_vector current inside the same
+# statement; the SQLite side table is kept up to date from the post_save/post_delete
+# receivers in core/signals.py. Both are set up by `migrate` (see "Database setup" below).
+
+from django.contrib.postgres.search import SearchQuery, SearchRank, SearchVector, TrigramSimilarity
+from django.db import connections, router
+from django.db.models import Case, CharField, Count, F, FloatField, Q, Value, When
+from django.db.models.expressions import RawSQL
+from django.db.models.functions import Cast
+
+from .models import Listing
+from . import cache
+
+SEARCH_CONFIG = 'english'
+TRIGRAM_THRESHOLD = 0.3
+FTS_TABLE = 'core_listing_fts'
+
+PRICE_BUCKETS = [(0, 100), (100, 250), (250, 500), (500, 1000), (1000, None)]
+HEALTH_BUCKETS = [(0, 50), (50, 70), (70, 90), (90, None)]
+FACET_LIMIT = 20
+
+_fts_ready = set()
+
+
+def search_vector_expression():
+    return (
+        SearchVector('title', weight='A', config=SEARCH_CONFIG)
+        + SearchVector('brand', 'model_name', weight='B', config=SEARCH_CONFIG)
+        + SearchVector('description', weight='C', config=SEARCH_CONFIG)
+    )
+
+
+def _vendor(using=None):
+    return connections[using or router.db_for_write(Listing)].vendor
+
+
+def ensure_fts_table(using=None):
+    alias = using or router.db_for_write(Listing)
+    if alias in _fts_ready:
+        return
+    connection = connections[alias]
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} "
+            "USING fts5(title, brand, model_name, description, tokenize='porter unicode61')"
+        )
+    # SQLite DDL is transactional: created inside a transaction, it only counts once committed
+    if not connection.in_atomic_block:
+        _fts_ready.add(alias)
+
+
+# Database setup, run by `migrate` (receivers connected in apps.py). The tree keeps no
+# migrations, so this is what makes a plain `makemigrations && migrate` work:
+# - pre_migrate enables pg_trgm before the trigram GIN index on Listing.title is created
+#   (the database user needs CREATE on the database, or have a superuser run
+#   `CREATE EXTENSION pg_trgm` once)
+# - post_migrate installs the trigger that fills Listing.search_vector on PostgreSQL, or
+#   creates the FTS5 table on SQLite
+
+# Same weights and config as search_vector_expression(), so the trigger and rebuild_index() agree
+SEARCH_TRIGGER_SQL = f"""
+CREATE OR REPLACE FUNCTION core_listing_search_vector() RETURNS trigger AS $$
+BEGIN
+    NEW.search_vector :=
+        setweight(to_tsvector('{SEARCH_CONFIG}'::regconfig, COALESCE(NEW.title, '')), 'A')
+        || setweight(to_tsvector('{SEARCH_CONFIG}'::regconfig, COALESCE(NEW.brand, '') || ' ' || COALESCE(NEW.model_name, '')), 'B')
+        || setweight(to_tsvector('{SEARCH_CONFIG}'::regconfig, COALESCE(NEW.description, '')), 'C');
+    RETURN NEW;
+END
+$$ LANGUAGE plpgsql;
+DROP TRIGGER IF EXISTS core_listing_search_vector ON {Listing._meta.db_table};
+CREATE TRIGGER core_listing_search_vector
+    BEFORE INSERT OR UPDATE OF title, brand, model_name, description ON {Listing._meta.db_table}
+    FOR EACH ROW EXECUTE FUNCTION core_listing_search_vector();
+"""
+
+
+def enable_extensions(sender, using='default', **kwargs):
+    if connections[using].vendor == 'postgresql':
+        with connections[using].cursor() as cursor:
+            cursor.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+
+
+def install_search_index(sender, using='default', **kwargs):
+    vendor = connections[using].vendor
+    if vendor == 'postgresql':
+        with connections[using].cursor() as cursor:
+            cursor.execute(SEARCH_TRIGGER_SQL)
+    elif vendor == 'sqlite':
+        ensure_fts_table(using)
+
+
+# Index maintenance
+
+def index_listing(listing):
+    # PostgreSQL: the trigger fills search_vector within the INSERT/UPDATE itself
+    if _vendor() == 'sqlite':
+        ensure_fts_table()
+        with connections[router.db_for_write(Listing)].cursor() as cursor:
+            cursor.execute(f"DELETE FROM {FTS_TABLE} WHERE rowid = %s", [listing.pk])
+            cursor.execute(
+                f"INSERT INTO {FTS_TABLE} (rowid, title, brand, model_name, description) VALUES (%s, %s, %s, %s, %s)",
+                [listing.pk, listing.title, listing.brand or '', listing.model_name or '', listing.description or ''],
+            )
+
+
+def unindex_listing(listing_id):
+    if _vendor() == 'sqlite':
+        ensure_fts_table()
+        with connections[router.db_for_write(Listing)].cursor() as cursor:
+            cursor.execute(f"DELETE FROM {FTS_TABLE} WHERE rowid = %s", [listing_id])
+
+
+def rebuild_index():
+    # Full rebuild, e.g. after a bulk import that bypassed the signals
+    cache.invalidate(Listing) # Cached search results were ranked on the old index
+    if _vendor() == 'postgresql':
+        return Listing.objects.update(search_vector=search_vector_expression())
+    if _vendor() == 'sqlite':
+        ensure_fts_table()
+        with connections[router.db_for_write(Listing)].cursor() as cursor:
+            cursor.execute(f"DELETE FROM {FTS_TABLE}")
+            cursor.execute(
+                f"INSERT INTO {FTS_TABLE} (rowid, title, brand, model_name, description) "
+                f"SELECT id, title, COALESCE(brand, ''), COALESCE(model_name, ''), COALESCE(description, '') "
+                f"FROM {Listing._meta.db_table}"
+            )
+            return cursor.rowcount
+    return 0
+
+
+# Querying
+
+def fts5_match_expression(text):
+    # Quote every term so user input can't inject FTS5 syntax; prefix-match the last one
+    terms = [term.replace('"', '') for term in text.split()]
+    terms = [term for term in terms if term]
+    if not terms:
+        return None
+    quoted = [f'"{term}"' for term in terms]
+    quoted[-1] += '*'
+    return ' '.join(quoted)
+
+
+def filter_search(queryset, text):
+    # Restrict the queryset to matches (no annotations, so it can also feed facet_counts)
+    vendor = _vendor(queryset.db)
+    if vendor == 'postgresql':
+        query = SearchQuery(text, search_type='websearch', config=SEARCH_CONFIG)
+        return queryset.filter(Q(search_vector=query) | Q(title__trigram_similar=text))
+    if vendor == 'sqlite':
+        ensure_fts_table(queryset.db)
+        match = fts5_match_expression(text)
+        if match is None:
+            return queryset.none()
+        return queryset.filter(pk__in=RawSQL(f"SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s", [match]))
+    return queryset.filter(
+        Q(title__icontains=text) | Q(brand__icontains=text) | Q(model_name__icontains=text) | Q(description__icontains=text)
+    )
+
+
+def rank_search(queryset, text):
+    # Best matches first; created_at/id keep the order stable between pages
+    vendor = _vendor(queryset.db)
+    if vendor == 'postgresql':
+        query = SearchQuery(text, search_type='websearch', config=SEARCH_CONFIG)
+        queryset = queryset.annotate(
+            rank=SearchRank(F('search_vector'), query),
+            similarity=TrigramSimilarity('title', text),
+        )
+        return queryset.order_by('-rank', '-similarity', '-created_at', 'id')
+    if vendor == 'sqlite':
+        match = fts5_match_expression(text)
+        if match is None:
+            return queryset
+        # bm25() is lower-is-better, so negate it into a rank
+        queryset = queryset.annotate(rank=RawSQL(
+            f"SELECT -bm25({FTS_TABLE}) FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s AND rowid = {Listing._meta.db_table}.id",
+            [match],
+            output_field=FloatField(),
+        ))
+        return queryset.order_by('-rank', '-created_at', 'id')
+    return queryset.order_by('-created_at', 'id')
+
+
+def search_listings(queryset, text):
+    return rank_search(filter_search(queryset, text), text)
+
+
+# Facets
+
+def _bucket_expression(field, buckets):
+    whens = []
+    for low, high in buckets:
+        label = f'{low}+' if high is None else f'{low}-{high}'
+        condition = Q(**{f'{field}__gte': low})
+        if high is not None:
+            condition &= Q(**{f'{field}__lt': high})
+        whens.append(When(condition, then=Value(label)))
+    return Case(*whens, default=Value(None), output_field=CharField())
+
+
+def facet_expressions():
+    return [
+        ('condition', Cast('condition', CharField())),
+        ('category', Cast('category_id', CharField())),
+        ('brand', Cast('brand', CharField())),
+        ('status', Cast('status', CharField())),
+        ('price', _bucket_expression('price', PRICE_BUCKETS)),
+        ('health_score', _bucket_expression('health_score', HEALTH_BUCKETS)),
+    ]
+
+
+def facet_counts(queryset):
+    # All facets in one round trip: one GROUP BY per facet, glued together with UNION ALL
+    base = queryset.order_by()
+    parts = [
+        base.annotate(facet=Value(name, output_field=CharField()), value=expression)
+        .values('facet', 'value')
+        .annotate(count=Count('pk'))
+        .order_by()
+        for name, expression in facet_expressions()
+    ]
+    facets = {name: [] for name, _ in facet_expressions()}
+    for row in parts[0].union(*parts[1:], all=True):
+        facets[row['facet']].append({'value': row['value'], 'count': row['count']})
+    for name, buckets in facets.items():
+        buckets.sort(key=lambda bucket: (-bucket['count'], str(bucket['value'])))
+        del buckets[FACET_LIMIT:]
+    return facets
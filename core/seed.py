@@ -0,0 +1,461 @@
+# core/seed.py
+#
+# Synthetic data for performance work (`manage.py seed_perf`). Fills every core table
+# with realistic, referentially consistent rows at any size, e.g. 10^6 listings and 10^7
+# ledger rows:
+# - certificates belong to their users and count against those users' wipe quotas;
+# - listings of wiped devices point at the seller's own successful certificate;
+# - media has one primary per listing, copied to Listing.primary_media_url;
+# - redemptions only spend credits the buyer already has, and User.green_credits
+#   matches the ledger at the end.
+#
+# Output is deterministic: the same --seed and --end produce the same rows. Every table
+# has its own random stream, ids are assigned here, and UUIDs are derived from the seed.
+# On PostgreSQL the large tables are written with COPY. Other backends use bulk_create.
+# Only per-row facts that later tables need (owners, statuses, media counts) are kept in
+# memory, in compact arrays.
+
+import random
+import uuid
+from array import array
+from contextlib import contextmanager
+from datetime import timedelta
+from decimal import Decimal
+from itertools import islice
+
+from django.contrib.auth.hashers import make_password
+from django.core.management.color import no_style
+from django.db import connection, transaction
+
+from .models import (
+    User, Category, Certificate, Listing, ListingMedia,
+    AdminAction, SubscriptionPackage, UserSubscription, GreenCreditTransaction
+)
+from . import ledger
+
+DEFAULT_PASSWORD = 'perf-password'
+FREE_WIPES = 3 # Same as FREE_WIPES_ON_REGISTRATION in views.py
+STAFF_USERS = 5
+
+# name, wipes_allowed (0 = unlimited), price, green credits per renewal, share of users, wipe activity weight
+PACKAGES = [
+    ('Basic', 10, Decimal('9.99'), 50, 0.20, 2),
+    ('Pro', 50, Decimal('29.99'), 200, 0.10, 8),
+    ('Unlimited', 0, Decimal('99.99'), 500, 0.03, 40),
+]
+FREE_ACTIVITY = 0.5
+
+ROOT_CATEGORIES = ['Laptops', 'Phones', 'Tablets', 'Desktops', 'Storage', 'Servers', 'Wearables', 'Accessories']
+SUBCATEGORY_WORDS = ['Gaming', 'Business', 'Budget', 'Refurbished', 'Rugged', 'Compact', 'Pro', 'Classic', 'Student', 'Premium']
+BRANDS = {
+    'Laptops': ['Dell', 'Lenovo', 'HP', 'Apple', 'Asus', 'Acer'],
+    'Phones': ['Samsung', 'Apple', 'Google', 'OnePlus', 'Xiaomi', 'Motorola'],
+    'Tablets': ['Apple', 'Samsung', 'Lenovo', 'Amazon'],
+    'Desktops': ['Dell', 'HP', 'Lenovo', 'Apple'],
+    'Storage': ['Seagate', 'Western Digital', 'Samsung', 'Crucial', 'Kingston'],
+    'Servers': ['Dell', 'HP', 'Supermicro', 'Lenovo'],
+    'Wearables': ['Apple', 'Samsung', 'Garmin', 'Fitbit'],
+    'Accessories': ['Logitech', 'Anker', 'Belkin', 'Razer'],
+}
+MODEL_WORDS = ['Air', 'Pro', 'Max', 'Mini', 'Plus', 'Ultra', 'Lite', 'X', 'S', 'Edge']
+CONDITIONS = [('new', 5), ('like_new', 20), ('good', 45), ('fair', 22), ('poor', 8)]
+LISTING_STATUSES = [('active', 70), ('sold', 15), ('pending', 5), ('withdrawn', 5), ('draft', 5)]
+CERTIFICATE_STATUSES = [('success', 85), ('failed', 8), ('pending', 7)]
+WIPING_METHODS = [choice for choice, _ in Certificate.WIPING_METHOD_CHOICES]
+DEVICE_TYPES = [choice for choice, _ in Certificate.DEVICE_TYPE_CHOICES]
+OPERATING_SYSTEMS = [choice for choice, _ in Certificate.OS_CHOICES]
+ADMIN_ACTION_TYPES = ['delete_listing', 'suspend_user', 'invalidate_certificate', 'adjust_credits', 'approve_listing']
+
+STATUS_CODES = {'success': 0, 'failed': 1, 'pending': 2}
+SOLD = 1
+
+
+def _weighted(rng, choices):
+    values, weights = zip(*choices)
+    return lambda: rng.choices(values, weights)[0]
+
+
+@contextmanager
+def explicit_timestamps(model):
+    # bulk_create would overwrite auto_now/auto_now_add fields with the current time
+    fields = [field for field in model._meta.concrete_fields if getattr(field, 'auto_now', False) or getattr(field, 'auto_now_add', False)]
+    saved = [(field, field.auto_now, field.auto_now_add) for field in fields]
+    for field in fields:
+        field.auto_now = field.auto_now_add = False
+    try:
+        yield
+    finally:
+        for field, auto_now, auto_now_add in saved:
+            field.auto_now, field.auto_now_add = auto_now, auto_now_add
+
+
+class Seeder:
+    def __init__(self, seed=0, users=1000, listings=10000, certificates=20000, transactions=50000,
+                 categories=60, end=None, days=365, batch_size=5000, use_copy=True, log=None):
+        self.seed = seed
+        self.counts = {
+            'users': max(users, STAFF_USERS + 1), 'listings': listings, 'certificates': certificates,
+            'transactions': transactions, 'categories': max(categories, len(ROOT_CATEGORIES)),
+        }
+        self.end = end
+        self.start = end - timedelta(days=days)
+        self.window = (self.end - self.start).total_seconds()
+        self.batch_size = batch_size
+        self.use_copy = use_copy and connection.vendor == 'postgresql'
+        self.log = log or (lambda message: None)
+        self.namespace = uuid.uuid5(uuid.NAMESPACE_URL, f'cleanslate-seed-perf:{seed}')
+
+    def rng(self, table):
+        return random.Random(f'{self.seed}:{table}')
+
+    def uuid(self, kind, index):
+        return uuid.uuid5(self.namespace, f'{kind}:{index}')
+
+    def moment(self, index, total, rng, spread=0.0):
+        # Rows are spread evenly over the history window in id order, plus a little jitter
+        position = (index + 0.5 + rng.uniform(-spread, spread)) / max(total, 1)
+        return self.start + timedelta(seconds=self.window * min(max(position, 0.0), 1.0))
+
+    # Writing
+
+    def write(self, model, fields, rows):
+        # rows: iterable of tuples in `fields` order (attnames). Returns the number written.
+        written = 0
+        with transaction.atomic():
+            if self.use_copy:
+                columns = ', '.join(connection.ops.quote_name(model._meta.get_field(name).column) for name in fields)
+                with connection.cursor() as cursor:
+                    with cursor.copy(f'COPY {connection.ops.quote_name(model._meta.db_table)} ({columns}) FROM STDIN') as copy:
+                        for row in rows:
+                            copy.write_row(row)
+                            written += 1
+            else:
+                attnames = [model._meta.get_field(name).attname for name in fields]
+                rows = iter(rows)
+                with explicit_timestamps(model):
+                    while True:
+                        batch = [model(**dict(zip(attnames, row))) for row in islice(rows, self.batch_size)]
+                        if not batch:
+                            break
+                        model.objects.bulk_create(batch)
+                        written += len(batch)
+        self.log(f"{model._meta.label}: {written} row(s)")
+        return written
+
+    def reset_sequences(self):
+        models = [Category, Listing, ListingMedia, AdminAction, SubscriptionPackage, UserSubscription, GreenCreditTransaction]
+        with connection.cursor() as cursor:
+            for sql in connection.ops.sequence_reset_sql(no_style(), models):
+                cursor.execute(sql)
+
+    # Tables
+
+    def seed_packages(self):
+        self.packages = []
+        rows = []
+        for index, (name, allowance, price, credits, share, activity) in enumerate(PACKAGES, start=1):
+            self.packages.append({'id': index, 'allowance': allowance, 'credits': credits, 'share': share, 'activity': activity})
+            rows.append((index, name, f'{name} plan', allowance, price, True, credits))
+        self.write(SubscriptionPackage, ('id', 'name', 'description', 'wipes_allowed', 'price', 'is_active', 'green_credits_awarded'), rows)
+
+    def seed_categories(self):
+        rng = self.rng('categories')
+        total = self.counts['categories']
+        self.categories = [] # (id, root name)
+        rows = []
+        paths = {}
+        for index in range(1, total + 1):
+            if index <= len(ROOT_CATEGORIES):
+                name, parent, root = ROOT_CATEGORIES[index - 1], None, ROOT_CATEGORIES[index - 1]
+            else:
+                parent, root = self.categories[rng.randrange(len(self.categories))]
+                name = f'{rng.choice(SUBCATEGORY_WORDS)} {root} {index}'
+            path = (paths[parent][0] if parent else '/') + f'{index}/'
+            depth = paths[parent][1] + 1 if parent else 0
+            paths[index] = (path, depth)
+            self.categories.append((index, root))
+            rows.append((index, name, f'{name} devices', parent, path, depth))
+        self.write(Category, ('id', 'name', 'description', 'parent_category', 'path', 'depth'), rows)
+
+    def assign_users(self):
+        # Plan and wipe activity per user, decided up front so quotas can be filled in
+        rng = self.rng('plans')
+        self.user_ids = [self.uuid('user', index) for index in range(self.counts['users'])]
+        self.plans = array('b')
+        weights = []
+        for _ in self.user_ids:
+            roll, plan = rng.random(), -1
+            for position, package in enumerate(self.packages):
+                if roll < package['share']:
+                    plan = position
+                    break
+                roll -= package['share']
+            self.plans.append(plan)
+            activity = self.packages[plan]['activity'] if plan >= 0 else FREE_ACTIVITY
+            weights.append(activity * rng.paretovariate(2.0))
+        self.user_weights = weights
+
+    def assign_certificates(self):
+        # Owner and status of every certificate. Wipes beyond a user's quota are recorded
+        # as failed, which is what the quota check would have let through.
+        rng = self.rng('certificate-owners')
+        total = self.counts['certificates']
+        status_of = _weighted(rng, CERTIFICATE_STATUSES)
+        cumulative, running = [], 0.0
+        for weight in self.user_weights:
+            running += weight
+            cumulative.append(running)
+        self.cert_owners = array('I', rng.choices(range(len(self.user_ids)), cum_weights=cumulative, k=total))
+        self.cert_statuses = bytearray(STATUS_CODES[status_of()] for _ in range(total))
+        self.consumed = array('I', bytes(4 * len(self.user_ids)))
+        for index, owner in enumerate(self.cert_owners):
+            if self.cert_statuses[index] == STATUS_CODES['failed']:
+                continue
+            plan = self.plans[owner]
+            allowance = self.packages[plan]['allowance'] if plan >= 0 else FREE_WIPES
+            if allowance and self.consumed[owner] >= allowance:
+                self.cert_statuses[index] = STATUS_CODES['failed']
+                continue
+            self.consumed[owner] += 1
+
+    def seed_users(self, password):
+        rng = self.rng('users')
+        hashed = make_password(password, salt=f'seedperf{self.seed}')
+        total = len(self.user_ids)
+
+        def rows():
+            for index, user_id in enumerate(self.user_ids):
+                plan = self.plans[index]
+                package = self.packages[plan] if plan >= 0 else None
+                consumed = self.consumed[index]
+                if package is None:
+                    remaining, free_used = FREE_WIPES - consumed, consumed
+                else:
+                    remaining, free_used = (package['allowance'] - consumed) if package['allowance'] else 0, 0
+                joined = self.moment(index, total, rng, spread=0.5) - timedelta(days=30)
+                email = f'perf-user-{index}@example.com'
+                # username = email: djoser's token login looks the email up in USERNAME_FIELD
+                yield (
+                    user_id, hashed, None, False, email, f'First{index}', f'Last{index}',
+                    email, index < STAFF_USERS, True, joined,
+                    f'+1555{index:07d}', package['id'] if package else None, remaining, 0, free_used, joined, joined,
+                )
+        self.write(User, (
+            'id', 'password', 'last_login', 'is_superuser', 'username', 'first_name', 'last_name', 'email',
+            'is_staff', 'is_active', 'date_joined', 'phone_number', 'current_subscription_package',
+            'wipes_remaining', 'green_credits', 'free_wipes_used', 'updated_at', 'update_at',
+        ), rows())
+
+    def seed_subscriptions(self):
+        rng = self.rng('subscriptions')
+
+        def rows():
+            subscription_id = 0
+            for index, user_id in enumerate(self.user_ids):
+                plan = self.plans[index]
+                if plan < 0:
+                    continue
+                package = self.packages[plan]
+                # Some lapsed history, then the current period
+                for months_ago in range(rng.randrange(3), 0, -1):
+                    subscription_id += 1
+                    start = self.end - timedelta(days=30 * months_ago + rng.randrange(30))
+                    yield (
+                        subscription_id, user_id, package['id'], start, start + timedelta(days=30), 'expired',
+                        package['allowance'] or None, package['allowance'], {'auto_renew': False},
+                    )
+                subscription_id += 1
+                start = self.end - timedelta(days=rng.randrange(30))
+                yield (
+                    subscription_id, user_id, package['id'], start, start + timedelta(days=30),
+                    'trial' if rng.random() < 0.05 else 'active',
+                    package['allowance'] or None, self.consumed[index], {'auto_renew': rng.random() < 0.7},
+                )
+        # JSON payment_details: always through bulk_create
+        use_copy, self.use_copy = self.use_copy, False
+        try:
+            self.write(UserSubscription, (
+                'id', 'user', 'package', 'start_date', 'end_date', 'status',
+                'initial_wipes_allocated', 'wipes_used', 'payment_details',
+            ), rows())
+        finally:
+            self.use_copy = use_copy
+
+    def certificate_time(self, index):
+        return self.start + timedelta(seconds=self.window * (index + 0.5) / self.counts['certificates'])
+
+    def seed_certificates(self):
+        rng = self.rng('certificates')
+        statuses = {code: name for name, code in STATUS_CODES.items()}
+
+        def rows():
+            for index, owner in enumerate(self.cert_owners):
+                status = statuses[self.cert_statuses[index]]
+                wiped_at = self.certificate_time(index)
+                completed_at = wiped_at + timedelta(minutes=rng.randrange(5, 240)) if status != 'pending' else None
+                yield (
+                    self.uuid('certificate', index), self.user_ids[owner], f'PERF-{self.seed}-{index:010d}',
+                    rng.choice(WIPING_METHODS), status, wiped_at, completed_at,
+                    rng.choice(DEVICE_TYPES), rng.choice(OPERATING_SYSTEMS), rng.randrange(40, 101),
+                    None, None, completed_at or wiped_at, False,
+                )
+        self.write(Certificate, (
+            'id', 'user', 'device_serial_number', 'wiping_method', 'status', 'wiped_at', 'completed_at',
+            'device_type', 'operating_system', 'health_score_at_wipe', 'blockchain_tx_hash', 'qr_code_data',
+            'generated_at', 'is_invalidated',
+        ), rows())
+
+    def listing_time(self, index):
+        return self.start + timedelta(seconds=self.window * (index + 0.5) / self.counts['listings'])
+
+    def seed_listings(self):
+        rng = self.rng('listings')
+        condition_of = _weighted(rng, CONDITIONS)
+        status_of = _weighted(rng, LISTING_STATUSES)
+        total = self.counts['listings']
+        self.listing_sold = bytearray(total)
+        self.listing_credit_price = array('I', bytes(4 * total))
+        self.media_counts = bytearray(total)
+
+        def rows():
+            for index in range(total):
+                listing_id = index + 1
+                created_at = self.listing_time(index)
+                certificate = owner = None
+                # Devices wiped on the platform are listed by their owner, after the wipe
+                if (
+                    index < self.counts['certificates'] and self.cert_statuses[index] == STATUS_CODES['success']
+                    and self.certificate_time(index) < created_at and rng.random() < 0.7
+                ):
+                    certificate, owner = self.uuid('certificate', index), self.cert_owners[index]
+                if owner is None:
+                    owner = rng.randrange(len(self.user_ids))
+                category_id, root = self.categories[rng.randrange(len(self.categories))]
+                brand = rng.choice(BRANDS[root])
+                model_name = f'{rng.choice(MODEL_WORDS)} {rng.randrange(1, 16)}'
+                storage = rng.choice((64, 128, 256, 512, 1024))
+                price = Decimal(rng.randrange(1500, 250000)) / 100
+                condition = condition_of()
+                status = status_of()
+                redeemable = rng.random() < 0.25
+                credit_price = max(10, int(price) // 2) if redeemable else None
+                if status == 'sold':
+                    self.listing_sold[index] = SOLD
+                    self.listing_credit_price[index] = credit_price or 0
+                media = rng.choices(range(5), (10, 25, 30, 20, 15))[0]
+                self.media_counts[index] = media
+                yield (
+                    listing_id, self.user_ids[owner], f'{brand} {model_name} {storage}GB',
+                    f'{brand} {model_name} with {storage}GB storage in {dict(Listing.CONDITION_CHOICES)[condition].lower()} condition.',
+                    price, category_id, brand, model_name, condition, rng.randrange(30, 101), status,
+                    created_at, created_at + timedelta(hours=rng.randrange(0, 72)), redeemable, credit_price,
+                    certificate, self.media_url(listing_id, 0) if media else None,
+                )
+        self.write(Listing, (
+            'id', 'user', 'title', 'description', 'price', 'category', 'brand', 'model_name', 'condition',
+            'health_score', 'status', 'created_at', 'updated_at', 'is_redeemable_with_green_credits',
+            'green_credit_price', 'certificate', 'primary_media_url',
+        ), rows())
+
+    @staticmethod
+    def media_url(listing_id, position):
+        return f'https://cdn.example.com/listings/{listing_id}/{position}.jpg'
+
+    def seed_media(self):
+        rng = self.rng('media')
+
+        def rows():
+            media_id = 0
+            for index, count in enumerate(self.media_counts):
+                listing_id = index + 1
+                created_at = self.listing_time(index)
+                for position in range(count):
+                    media_id += 1
+                    video = position > 0 and rng.random() < 0.1
+                    url = self.media_url(listing_id, position).replace('.jpg', '.mp4') if video else self.media_url(listing_id, position)
+                    yield (media_id, listing_id, url, 'video' if video else 'image', position == 0, position, created_at)
+        self.write(ListingMedia, ('id', 'listing', 'file_url', 'media_type', 'is_primary', 'position', 'created_at'), rows())
+
+    def seed_ledger(self):
+        # Awards for every successful wipe first, then redemptions for sold redeemable
+        # listings (only by buyers who can afford them), then other entries up to the target
+        rng = self.rng('ledger')
+        balances = array('q', bytes(8 * len(self.user_ids)))
+        target = self.counts['transactions']
+
+        def rows():
+            entry_id = 0
+            for index, owner in enumerate(self.cert_owners):
+                if entry_id >= target:
+                    return
+                if self.cert_statuses[index] != STATUS_CODES['success']:
+                    continue
+                amount = 20 if self.plans[owner] >= 0 else 10
+                balances[owner] += amount
+                entry_id += 1
+                yield (
+                    entry_id, self.user_ids[owner], self.uuid('certificate', index), None, 'awarded_wipe', amount,
+                    self.certificate_time(index) + timedelta(minutes=5), f'Awarded {amount} green credits for a wipe.',
+                )
+            for index, sold in enumerate(self.listing_sold):
+                if entry_id >= target:
+                    return
+                price = self.listing_credit_price[index]
+                if not sold or not price:
+                    continue
+                buyer = rng.randrange(len(self.user_ids))
+                if balances[buyer] < price:
+                    continue
+                balances[buyer] -= price
+                entry_id += 1
+                yield (
+                    entry_id, self.user_ids[buyer], None, index + 1, 'redeemed_purchase', -price,
+                    self.listing_time(index) + timedelta(hours=rng.randrange(1, 96)), f'Redeemed {price} green credits for a listing.',
+                )
+            remaining = target - entry_id
+            for position in range(remaining):
+                user = rng.randrange(len(self.user_ids))
+                kind = rng.choices(('other', 'admin_adjustment', 'refund'), (6, 2, 2))[0]
+                amount = rng.randrange(5, 100)
+                if kind == 'admin_adjustment' and balances[user] >= amount and rng.random() < 0.5:
+                    amount = -amount
+                balances[user] += amount
+                entry_id += 1
+                yield (
+                    entry_id, self.user_ids[user], None, None, kind, amount,
+                    self.moment(position, remaining, rng, spread=0.5), f'{kind.replace("_", " ").capitalize()} of {amount} credits.',
+                )
+        self.write(GreenCreditTransaction, (
+            'id', 'user', 'certificate', 'listing', 'transaction_type', 'amount', 'transaction_time', 'description',
+        ), rows())
+
+    def seed_admin_actions(self):
+        rng = self.rng('admin-actions')
+        total = max(10, self.counts['listings'] // 1000)
+
+        def rows():
+            for index in range(total):
+                action = rng.choice(ADMIN_ACTION_TYPES)
+                target = ('listings', str(rng.randrange(1, self.counts['listings'] + 1))) if self.counts['listings'] else ('users', str(self.user_ids[-1]))
+                yield (
+                    index + 1, self.user_ids[rng.randrange(STAFF_USERS)], action, target[0], target[1],
+                    self.moment(index, total, rng, spread=0.5), f'{action.replace("_", " ")} (seeded)', f'10.0.{index // 256 % 256}.{index % 256}',
+                )
+        self.write(AdminAction, ('id', 'admin_user', 'action_type', 'target_table', 'target_id', 'performed_at', 'reason', 'ip_address'), rows())
+
+    def run(self, password=DEFAULT_PASSWORD):
+        self.seed_packages()
+        self.seed_categories()
+        self.assign_users()
+        self.assign_certificates()
+        self.seed_users(password)
+        self.seed_subscriptions()
+        self.seed_certificates()
+        self.seed_listings()
+        self.seed_media()
+        self.seed_ledger()
+        self.seed_admin_actions()
+        self.reset_sequences()
+        # One aggregate UPDATE brings every balance in line with the ledger just written
+        ledger.reconcile_balances()
+        self.log("Balances reconciled with the ledger")
@@ -5,8 +5,33 @@ from .models import (
     AdminAction, SubscriptionPackage, UserSubscription, GreenCreditTransaction
 )
 
+
+def requested_fields(request):
+    # Parses ?fields=a,b and ?expand=c into (fields or None, expand)
+    if request is None:
+        return None, set()
+    def parse(name):
+        value = request.query_params.get(name)
+        return {field.strip() for field in value.split(',') if field.strip()} if value else None
+    return parse('fields'), parse('expand') or set()
+
+
+# Sparse fieldsets: ?fields=id,title,price keeps only those fields in GET responses and
+# ?expand=media adds fields on top of them. Without ?fields= output is unchanged.
+class DynamicFieldsMixin:
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        request = self.context.get('request')
+        if request is None or request.method != 'GET':
+            return
+        fields, expand = requested_fields(request)
+        if fields is None:
+            return
+        for name in set(self.fields) - (fields | expand):
+            self.fields.pop(name)
+
 # 1. User Serializer
-class UserSerializer(serializers.ModelSerializer):
+class UserSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
     class Meta:
         model = User
         fields = (
@@ -18,14 +43,20 @@ class UserSerializer(serializers.ModelSerializer):
 
 
 # 2. Category Serializer
-class CategorySerializer(serializers.ModelSerializer):
+class CategorySerializer(DynamicFieldsMixin, serializers.ModelSerializer):
     class Meta:
         model = Category
-        fields = ('id', 'name', 'description', 'parent_category')
+        fields = ('id', 'name', 'description', 'parent_category', 'path', 'depth')
+        read_only_fields = ('path', 'depth')
+
+    def validate_parent_category(self, value):
+        if self.instance is not None and value is not None and self.instance.would_create_cycle(value.pk):
+            raise serializers.ValidationError('A category cannot be moved under itself or one of its subcategories.')
+        return value
 
 
 # 3. Certificate Serializer
-class CertificateSerializer(serializers.ModelSerializer):
+class CertificateSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
     user_email = serializers.ReadOnlyField(source='user.email') # Display user's email, not just ID
 
     class Meta:
@@ -39,16 +70,44 @@ class CertificateSerializer(serializers.ModelSerializer):
         read_only_fields = ('id', 'generated_at', 'user_email','health_score_at_wipe','device_serial_number') #i added with concern , chetan bagat
 
 
+# 3b. Certificate bulk item Serializer (used by the bulk ingestion endpoint)
+class CertificateBulkItemSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = Certificate
+        fields = (
+            'device_serial_number', 'wiping_method', 'status', 'wiped_at', 'completed_at',
+            'device_type', 'operating_system', 'health_score_at_wipe', 'qr_code_data'
+        )
+        # Serial uniqueness is checked for the whole batch with one IN query, not per item
+        extra_kwargs = {'device_serial_number': {'validators': []}}
+
+
 # 4. ListingMedia Serializer (nested for Listing)
-class ListingMediaSerializer(serializers.ModelSerializer):
+class ListingMediaSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
     class Meta:
         model = ListingMedia
-        fields = ('id', 'file_url', 'media_type', 'is_primary', 'created_at')
+        fields = ('id', 'listing', 'file_url', 'media_type', 'is_primary', 'position', 'created_at')
         read_only_fields = ('id', 'created_at')
+        validators = [] # Saving a new primary demotes the old one (ListingMedia.save), so no uniqueness check here
+
+    def get_fields(self):
+        fields = super().get_fields()
+        # Nested under a listing the parent is implied
+        if isinstance(self.parent, serializers.ListSerializer) and self.parent.parent is not None:
+            fields.pop('listing', None)
+        return fields
+
+    def validate_listing(self, value):
+        request = self.context.get('request')
+        if request is not None and not request.user.is_staff and value.user_id != request.user.pk:
+            raise serializers.ValidationError("You can only add media to your own listings.")
+        if self.instance is not None and value.pk != self.instance.listing_id:
+            raise serializers.ValidationError("Media cannot be moved to another listing.")
+        return value
 
 
 # 5. Listing Serializer
-class ListingSerializer(serializers.ModelSerializer):
+class ListingSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
     media = ListingMediaSerializer(many=True, read_only=True) # Nested serializer for media
     category_name = serializers.ReadOnlyField(source='category.name')
     user_email = serializers.ReadOnlyField(source='user.email')
@@ -60,14 +119,23 @@ class ListingSerializer(serializers.ModelSerializer):
             'id', 'user', 'user_email', 'title', 'description', 'price',
             'category', 'category_name', 'brand', 'model_name', 'condition',
             'health_score', 'status', 'created_at', 'updated_at',
-            'is_redeemable_with_green_credits', 'green_credit_price',
-            'certificate', 'certificate_id', 'media'
+            'is_redeemable_with_green_credits', 'green_credit_price', 'sold_at',
+            'certificate', 'certificate_id', 'primary_media_url', 'media'
         )
-        read_only_fields = ('id', 'created_at', 'updated_at', 'user_email', 'category_name', 'certificate_id', 'media')
+        read_only_fields = ('id', 'created_at', 'updated_at', 'user_email', 'category_name', 'certificate_id', 'primary_media_url', 'media', 'sold_at')
+
+    def validate_status(self, value):
+        # Only a purchase (core/marketplace.py) sells a listing: it also records the buyer and the payment
+        current = self.instance.status if self.instance is not None else None
+        if value == 'sold' and current != 'sold':
+            raise serializers.ValidationError("Listings are sold through POST /api/listings/{id}/purchase/.")
+        if current == 'sold' and value != 'sold':
+            raise serializers.ValidationError("A sold listing cannot be put back on sale.")
+        return value
 
 
 # 6. AdminAction Serializer
-class AdminActionSerializer(serializers.ModelSerializer):
+class AdminActionSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
     admin_user_email = serializers.ReadOnlyField(source='admin_user.email')
 
     class Meta:
@@ -80,7 +148,7 @@ class AdminActionSerializer(serializers.ModelSerializer):
 
 
 # 7. SubscriptionPackage Serializer
-class SubscriptionPackageSerializer(serializers.ModelSerializer):
+class SubscriptionPackageSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
     class Meta:
         model = SubscriptionPackage
         fields = ('id', 'name', 'description', 'wipes_allowed', 'price', 'is_active')
@@ -88,7 +156,7 @@ class SubscriptionPackageSerializer(serializers.ModelSerializer):
 
 
 # 8. UserSubscription Serializer
-class UserSubscriptionSerializer(serializers.ModelSerializer):
+class UserSubscriptionSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
     user_email = serializers.ReadOnlyField(source='user.email')
     package_name = serializers.ReadOnlyField(source='package.name')
 
@@ -100,10 +168,21 @@ class UserSubscriptionSerializer(serializers.ModelSerializer):
             'wipes_used', 'payment_details'
         )
         read_only_fields = ('id', 'start_date', 'user_email', 'package_name', 'wipes_used')
+        # What a subscription grants: only staff (or the scheduler) set these
+        staff_only_fields = ('user', 'package', 'status', 'end_date', 'initial_wipes_allocated', 'payment_details')
+
+    def get_fields(self):
+        fields = super().get_fields()
+        request = self.context.get('request')
+        if request is None or not request.user.is_staff:
+            for name in self.Meta.staff_only_fields:
+                if name in fields:
+                    fields[name].read_only = True
+        return fields
 
 
 # 9. GreenCreditTransaction Serializer
-class GreenCreditTransactionSerializer(serializers.ModelSerializer):
+class GreenCreditTransactionSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
     user_email = serializers.ReadOnlyField(source='user.email')
     certificate_id = serializers.ReadOnlyField(source='certificate.id')
     listing_id = serializers.ReadOnlyField(source='listing.id')
@@ -115,7 +194,14 @@ class GreenCreditTransactionSerializer(serializers.ModelSerializer):
             'listing', 'listing_id', 'transaction_type', 'amount',
             'transaction_time', 'description'
         )
-        read_only_fields = ('id', 'transaction_time', 'user_email', 'certificate_id', 'listing_id')
+        read_only_fields = ('id', 'user', 'transaction_time', 'user_email', 'certificate_id', 'listing_id') # The owner comes from the request
+
+    def validate_transaction_type(self, value):
+        if value == 'redeemed_purchase':
+            raise serializers.ValidationError("Purchases are recorded by POST /api/listings/{id}/purchase/.")
+        if value == 'registration_bonus':
+            raise serializers.ValidationError("The registration bonus is granted once, by the grant_registration_bonus job.")
+        return value
 
 
 
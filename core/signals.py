@@ -1,32 +1,141 @@
 # core/signals.py
 
-from django.db.models.signals import post_save
+from django.db.models import F, Value
+from django.db.models.functions import Concat, Substr
+from django.db.models.signals import post_save, post_delete, pre_delete, pre_save
 from django.dispatch import receiver
-from .models import User, GreenCreditTransaction
+from rest_framework.authtoken.models import Token
+from .models import User, Category, Certificate, Listing, ListingMedia, SubscriptionPackage, UserSubscription, GreenCreditTransaction
+from . import analytics, anchoring, authentication, cache, jobs, search, summary, verification
+from .tasks import FREE_WIPES_ON_REGISTRATION
 
-# Configuration for initial free wipes and credits
-FREE_WIPES_ON_REGISTRATION = 3
-GREEN_CREDITS_PER_FREE_WIPE = 10 # Adjust as per your business model, e.g., 10 credits per wipe
+# New accounts get their free wipes in the INSERT itself, so they can submit a wipe right
+# away. The matching green credits follow from a background job (core/tasks.py): until it
+# runs, the balance just reads 0.
+@receiver(pre_save, sender=User)
+def grant_free_wipes_on_registration(sender, instance, **kwargs):
+    if instance._state.adding and not instance.is_superuser:
+        instance.wipes_remaining += FREE_WIPES_ON_REGISTRATION
 
 @receiver(post_save, sender=User)
 def grant_free_wipes_and_credits_on_registration(sender, instance, created, **kwargs):
     if created and instance.is_superuser == False: # Only for new, non-superuser accounts
-        # Grant free wipes
-        instance.wipes_remaining += FREE_WIPES_ON_REGISTRATION
+        jobs.enqueue('grant_registration_bonus', {'user_id': str(instance.pk)}, key=f'registration:{instance.pk}')
+
+
+# Certificate side effects run on the job queue so the request path only does the INSERT
+@receiver(post_save, sender=Certificate)
+def enqueue_certificate_side_effects(sender, instance, created, **kwargs):
+    payload = {'certificate_ids': [str(instance.pk)]}
+    if created:
+        jobs.enqueue('generate_qr_code', payload, key=f'qr:{instance.pk}')
+        jobs.enqueue('send_wipe_notification', payload, key=f'notify:{instance.pk}')
+    if instance.status == 'success':
+        jobs.enqueue('award_wipe_credits', payload, key=f'credits:{instance.pk}')
+        anchoring.schedule_anchoring()
+
+
+# Catalog cache invalidation: bump the model's cache version so every cached
+# response built from the old rows is skipped (see core/cache.py)
+CATALOG_MODELS = (Category, SubscriptionPackage, Listing, ListingMedia)
+
+@receiver(post_save)
+@receiver(post_delete)
+def invalidate_catalog_cache(sender, **kwargs):
+    if sender in CATALOG_MODELS:
+        cache.invalidate(sender)
+
+# Listings only show their certificate's id, so wipes (the hottest write) leave the listing
+# cache alone. Deleting a linked certificate nulls Listing.certificate with an UPDATE
+# that sends no post_save, so that case bumps the listings here.
+@receiver(pre_delete, sender=Certificate)
+def invalidate_listings_of_certificate(sender, instance, **kwargs):
+    if Listing.objects.filter(certificate_id=instance.pk).exists():
+        cache.invalidate(Listing)
+
+
+# Deleting a category turns its children into roots (parent_category is SET_NULL),
+# so strip the deleted prefix from every materialized path below it
+@receiver(pre_delete, sender=Category)
+def reroot_category_subtree(sender, instance, **kwargs):
+    if not instance.path:
+        return
+    Category.objects.filter(path__startswith=instance.path).exclude(pk=instance.pk).update(
+        path=Concat(Value('/'), Substr('path', len(instance.path) + 1)),
+        depth=F('depth') - (instance.depth + 1),
+    )
+
+
+# Deleting media may remove the primary image: promote the next one and refresh
+# Listing.primary_media_url (saves are handled in ListingMedia.save)
+@receiver(post_delete, sender=ListingMedia)
+def sync_primary_media_on_delete(sender, instance, **kwargs):
+    ListingMedia.sync_primary(instance.listing_id)
+
 
-        # Grant initial green credits for free wipes
-        initial_green_credits = FREE_WIPES_ON_REGISTRATION * GREEN_CREDITS_PER_FREE_WIPE
-        instance.green_credits += initial_green_credits
+# Keep the listing search index (tsvector column or SQLite FTS5 table) in step, one row at a time
+@receiver(post_save, sender=Listing)
+def index_listing_for_search(sender, instance, **kwargs):
+    search.index_listing(instance)
 
-        # Save the user instance to persist the changes
-        instance.save(update_fields=['wipes_remaining', 'green_credits'])
+@receiver(post_delete, sender=Listing)
+def unindex_listing_for_search(sender, instance, **kwargs):
+    search.unindex_listing(instance.pk)
 
-        # Optionally, create a GreenCreditTransaction for transparency
-        GreenCreditTransaction.objects.create(
-            user=instance,
-            transaction_type='awarded_wipe',
-            amount=initial_green_credits,
-            description=f"Initial {initial_green_credits} green credits awarded for {FREE_WIPES_ON_REGISTRATION} free wipes on registration."
-        )
 
-        print(f"User {instance.email} registered. Granted {FREE_WIPES_ON_REGISTRATION} free wipes and {initial_green_credits} green credits.")
\ No newline at end of file
+# Drop this process's cached verification result when a certificate changes. A changed
+# serial number leaves an entry under the old serial too, so remember it before the save.
+@receiver(pre_save, sender=Certificate)
+def remember_previous_serial(sender, instance, update_fields=None, **kwargs):
+    instance._previous_serial = None
+    if instance._state.adding or (update_fields is not None and 'device_serial_number' not in update_fields):
+        return
+    previous = Certificate.objects.filter(pk=instance.pk).values_list('device_serial_number', flat=True).first()
+    if previous is not None and previous != instance.device_serial_number:
+        instance._previous_serial = previous
+
+@receiver(post_save, sender=Certificate)
+@receiver(post_delete, sender=Certificate)
+def evict_certificate_verification(sender, instance, **kwargs):
+    verification.evict(instance, getattr(instance, '_previous_serial', None))
+
+
+# Analytics rollups: queue a rebuild of the day the row belongs to (debounced per window)
+@receiver(post_save, sender=Certificate)
+@receiver(post_delete, sender=Certificate)
+def refresh_wipe_analytics(sender, instance, **kwargs):
+    analytics.schedule_refresh(instance.generated_at)
+
+@receiver(post_save, sender=GreenCreditTransaction)
+@receiver(post_delete, sender=GreenCreditTransaction)
+def refresh_credit_analytics(sender, instance, **kwargs):
+    analytics.schedule_refresh(instance.transaction_time)
+
+
+# /api/me/summary/ is cached per user; drop it when any of its parts is saved or deleted
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def evict_user_summary(sender, instance, **kwargs):
+    summary.evict(instance.pk)
+
+@receiver(post_save, sender=Certificate)
+@receiver(post_delete, sender=Certificate)
+@receiver(post_save, sender=GreenCreditTransaction)
+@receiver(post_delete, sender=GreenCreditTransaction)
+@receiver(post_save, sender=UserSubscription)
+@receiver(post_delete, sender=UserSubscription)
+def evict_owner_summary(sender, instance, **kwargs):
+    summary.evict(instance.user_id)
+
+
+# Cached token authentication: logout deletes the token; a user save covers password
+# changes and is_active flips (core/authentication.py)
+@receiver(post_save, sender=Token)
+@receiver(post_delete, sender=Token)
+def evict_cached_token(sender, instance, **kwargs):
+    authentication.evict_token(instance.key)
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def evict_cached_token_user(sender, instance, **kwargs):
+    authentication.evict_user(instance.pk)
@@ -0,0 +1,163 @@
+# core/subscriptions.py
+#
+# Subscription lifecycle, run periodically by `manage.py run_subscription_scheduler`
+# instead of being checked on every request. Subscriptions whose end_date has passed are
+# handled in batches. Auto-renewing ones (payment_details.auto_renew) get a new period,
+# a wipe refill and the package's green credits. The rest expire, and their users drop
+# back to SUBSCRIPTION_FALLBACK_PACKAGE. Each batch is one transaction of set-based
+# UPDATEs over rows claimed with SKIP LOCKED. A whole run holds an advisory lock, so
+# starting the scheduler on several nodes is harmless.
+
+import logging
+from collections import defaultdict
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Exists, F, OuterRef, Subquery, Value
+from django.db.models.functions import Greatest
+from django.utils import timezone
+
+from .locks import advisory_lock
+from .models import User, SubscriptionPackage, UserSubscription, GreenCreditTransaction
+from . import ledger, summary
+
+logger = logging.getLogger(__name__)
+
+ACTIVE_STATUSES = ('active', 'trial')
+LOCK_NAME = 'core.subscriptions.scheduler'
+
+
+def _setting(name, default):
+    return getattr(settings, name, default)
+
+
+def due_subscriptions(now):
+    return UserSubscription.objects.filter(status__in=ACTIVE_STATUSES, end_date__lte=now)
+
+
+def renew(subscription_ids, now):
+    # One UPDATE for the period change, one per package for the refill, one bulk ledger insert
+    if not subscription_ids:
+        return 0
+    period = timedelta(days=_setting('SUBSCRIPTION_PERIOD_DAYS', 30))
+    rows = list(
+        UserSubscription.objects.filter(pk__in=subscription_ids)
+        .values('user_id', 'package_id', 'package__name', 'package__wipes_allowed', 'package__green_credits_awarded')
+    )
+    # A renewal that was missed for a while starts from now, not from the old end_date
+    UserSubscription.objects.filter(pk__in=subscription_ids).update(
+        status='active',
+        end_date=Greatest(F('end_date'), Value(now)) + period,
+        wipes_used=0,
+    )
+    users_by_allowance = defaultdict(list)
+    for row in rows:
+        if row['package__wipes_allowed']: # 0 is unlimited: nothing to refill
+            users_by_allowance[row['package__wipes_allowed']].append(row['user_id'])
+    for allowance, user_ids in users_by_allowance.items():
+        # Refill up to the allowance; wipes above it (e.g. unused free wipes) are kept
+        User.objects.filter(pk__in=user_ids).update(wipes_remaining=Greatest(F('wipes_remaining'), Value(allowance)))
+    ledger.record_transactions(
+        GreenCreditTransaction(
+            user_id=row['user_id'],
+            transaction_type='subscription_renewal',
+            amount=row['package__green_credits_awarded'],
+            description=f"Awarded {row['package__green_credits_awarded']} green credits for renewing {row['package__name']}.",
+        )
+        for row in rows if row['package__green_credits_awarded'] > 0
+    )
+    return len(rows)
+
+
+def expire(subscription_ids):
+    if not subscription_ids:
+        return 0
+    return UserSubscription.objects.filter(pk__in=subscription_ids).update(status='expired')
+
+
+def fallback_package():
+    name = _setting('SUBSCRIPTION_FALLBACK_PACKAGE', None)
+    return SubscriptionPackage.objects.filter(name=name).first() if name else None
+
+
+def downgrade(user_ids):
+    # Users left without an active subscription to their current package fall back to
+    # SUBSCRIPTION_FALLBACK_PACKAGE (or no package) and its allowance
+    if not user_ids:
+        return 0
+    fallback = fallback_package()
+    still_active = UserSubscription.objects.filter(
+        user=OuterRef('pk'), package=OuterRef('current_subscription_package'), status__in=ACTIVE_STATUSES,
+    )
+    users = User.objects.filter(pk__in=user_ids).exclude(current_subscription_package=None)
+    if fallback is not None:
+        users = users.exclude(current_subscription_package=fallback)
+    return users.exclude(Exists(still_active)).update(
+        current_subscription_package=fallback,
+        wipes_remaining=fallback.wipes_allowed if fallback else 0,
+    )
+
+
+def sync_current_packages(user_ids=None):
+    # Point User.current_subscription_package at the user's newest active subscription
+    newest = (
+        UserSubscription.objects.filter(user=OuterRef('pk'), status__in=ACTIVE_STATUSES)
+        .order_by('-start_date', '-id').values('package')[:1]
+    )
+    if user_ids is None:
+        user_ids = UserSubscription.objects.filter(status__in=ACTIVE_STATUSES).values('user_id')
+    users = (
+        User.objects.filter(pk__in=user_ids)
+        .annotate(active_package=Subquery(newest))
+        .exclude(active_package=None)
+        .exclude(current_subscription_package=F('active_package'))
+    )
+    stale = list(users.values_list('pk', flat=True))
+    if stale:
+        User.objects.filter(pk__in=stale).update(current_subscription_package=Subquery(newest))
+        summary.evict(*stale)
+    return len(stale)
+
+
+def process_batch(now, batch_size):
+    # Claim one batch of due subscriptions and settle it; returns (renewed, expired, downgraded)
+    with transaction.atomic():
+        claimed = list(
+            due_subscriptions(now)
+            .select_for_update(skip_locked=True, of=('self',))
+            .order_by('end_date', 'id')
+            .values('id', 'user_id', 'payment_details__auto_renew', 'package__is_active')[:batch_size]
+        )
+        if not claimed:
+            return None
+        renewing = {row['id'] for row in claimed if row['payment_details__auto_renew'] is True and row['package__is_active']}
+        expiring = [row['id'] for row in claimed if row['id'] not in renewing]
+        renewed = renew(list(renewing), now)
+        expired = expire(expiring)
+        user_ids = {row['user_id'] for row in claimed}
+        sync_current_packages(user_ids)
+        downgraded = downgrade(user_ids)
+        summary.evict(*user_ids)
+    return renewed, expired, downgraded
+
+
+def run(now=None, batch_size=None):
+    # One scheduler pass. Returns the totals, or None when another node holds the lock.
+    now = now or timezone.now()
+    batch_size = batch_size or _setting('SUBSCRIPTION_BATCH_SIZE', 500)
+    totals = {'renewed': 0, 'expired': 0, 'downgraded': 0, 'synced': 0}
+    with advisory_lock(LOCK_NAME) as acquired:
+        if not acquired:
+            logger.info("Subscription scheduler already running on another node")
+            return None
+        while True:
+            result = process_batch(now, batch_size)
+            if result is None:
+                break
+            totals['renewed'] += result[0]
+            totals['expired'] += result[1]
+            totals['downgraded'] += result[2]
+        # Subscriptions created or reactivated outside the scheduler
+        totals['synced'] = sync_current_packages()
+    return totals
@@ -0,0 +1,88 @@
+# core/summary.py
+#
+# The app's home screen in one payload: profile, active subscription, wipe quota, credit
+# balance and the latest certificates and ledger entries. A miss costs four queries
+# whatever the account size (user + package, subscription + package, certificates,
+# transactions). The result is cached per user and limit, and evicted after every write
+# that changes one of those parts. The model receivers in signals.py cover ordinary
+# saves. The set-based paths (ledger, quota, subscriptions) evict explicitly. Evictions
+# run on commit, so a concurrent request cannot re-cache the pre-commit state.
+
+from django.conf import settings
+from django.db import transaction
+
+from .cache import get_cache
+from .models import User, Certificate, UserSubscription, GreenCreditTransaction
+
+DEFAULT_LIMIT = 5
+MAX_LIMIT = 20
+ACTIVE_SUBSCRIPTION_STATUSES = ('active', 'trial')
+
+PROFILE_FIELDS = ('id', 'email', 'username', 'first_name', 'last_name', 'phone_number')
+CERTIFICATE_FIELDS = ('id', 'device_serial_number', 'wiping_method', 'status', 'device_type', 'wiped_at', 'completed_at', 'generated_at')
+TRANSACTION_FIELDS = ('id', 'transaction_type', 'amount', 'transaction_time', 'description', 'certificate_id', 'listing_id')
+
+
+def cache_key(user_id, limit):
+    return f'me-summary:{user_id}:{limit}'
+
+
+def evict(*user_ids):
+    # Drop the cached summaries (every limit) once the current transaction commits
+    keys = [cache_key(user_id, limit) for user_id in user_ids for limit in range(1, MAX_LIMIT + 1)]
+    if keys:
+        transaction.on_commit(lambda: get_cache().delete_many(keys))
+
+
+def _package(package):
+    if package is None:
+        return None
+    return {
+        'id': package.id, 'name': package.name, 'wipes_allowed': package.wipes_allowed,
+        'unlimited': package.wipes_allowed == 0, 'green_credits_awarded': package.green_credits_awarded,
+    }
+
+
+def build_summary(user_id, limit=DEFAULT_LIMIT):
+    user = User.objects.select_related('current_subscription_package').get(pk=user_id)
+    subscription = (
+        UserSubscription.objects.filter(user_id=user_id, status__in=ACTIVE_SUBSCRIPTION_STATUSES)
+        .select_related('package').order_by('-start_date', '-id').first()
+    )
+    certificates = list(
+        Certificate.objects.filter(user_id=user_id).order_by('-generated_at', 'id').values(*CERTIFICATE_FIELDS)[:limit]
+    )
+    transactions = list(
+        GreenCreditTransaction.objects.filter(user_id=user_id).order_by('-transaction_time', 'id').values(*TRANSACTION_FIELDS)[:limit]
+    )
+    package = user.current_subscription_package
+    return {
+        'profile': {field: getattr(user, field) for field in PROFILE_FIELDS},
+        'subscription': None if subscription is None else {
+            'id': subscription.id,
+            'status': subscription.status,
+            'start_date': subscription.start_date,
+            'end_date': subscription.end_date,
+            'wipes_used': subscription.wipes_used,
+            'package': _package(subscription.package),
+        },
+        'quota': {
+            'package': _package(package),
+            'unlimited': package is not None and package.wipes_allowed == 0,
+            'wipes_remaining': user.wipes_remaining,
+            'free_wipes_used': user.free_wipes_used,
+        },
+        'green_credits': user.green_credits,
+        'certificates': certificates,
+        'transactions': transactions,
+    }
+
+
+def get_summary(user_id, limit=DEFAULT_LIMIT):
+    cache = get_cache()
+    key = cache_key(user_id, limit)
+    data = cache.get(key)
+    if data is None:
+        data = build_summary(user_id, limit)
+        cache.set(key, data, timeout=getattr(settings, 'ME_SUMMARY_CACHE_TIMEOUT', 300))
+    return data
@@ -0,0 +1,96 @@
+# core/tasks.py
+#
+# Job handlers for post-write side effects (see core/jobs.py). Every handler must be
+# safe to run more than once: workers retry on failure and may re-run a job whose
+# worker died half way.
+
+import logging
+
+from django.conf import settings
+from django.db import transaction
+from django.utils.dateparse import parse_date
+
+from .jobs import job_handler
+from .models import User, Certificate, GreenCreditTransaction
+from . import analytics, anchoring, jobs, ledger
+
+logger = logging.getLogger(__name__)
+
+FREE_WIPES_ON_REGISTRATION = 3
+GREEN_CREDITS_PER_FREE_WIPE = 10
+GREEN_CREDITS_PER_PAID_WIPE = 20
+
+
+@job_handler('grant_registration_bonus')
+def grant_registration_bonus(user_id):
+    # The free wipes themselves are granted when the user row is inserted (core/signals.py).
+    # The registration_bonus row is the marker that the credits were paid; the user row
+    # lock makes a second run wait for the first one and then see it.
+    initial_green_credits = FREE_WIPES_ON_REGISTRATION * GREEN_CREDITS_PER_FREE_WIPE
+    with transaction.atomic():
+        user = User.objects.select_for_update().filter(pk=user_id).first()
+        if user is None or GreenCreditTransaction.objects.filter(user_id=user_id, transaction_type='registration_bonus').exists():
+            return
+        ledger.record_transaction(
+            user=user,
+            amount=initial_green_credits,
+            transaction_type='registration_bonus',
+            description=f"Initial {initial_green_credits} green credits awarded for {FREE_WIPES_ON_REGISTRATION} free wipes on registration."
+        )
+    logger.info("User %s registered. Granted %s free wipes and %s green credits.", user.email, FREE_WIPES_ON_REGISTRATION, initial_green_credits)
+
+
+@job_handler('award_wipe_credits')
+def award_wipe_credits(certificate_ids):
+    # Set-based: one query for the certificates still owed credits, one bulk ledger insert
+    owed = (
+        Certificate.objects
+        .filter(pk__in=certificate_ids, status='success', is_invalidated=False)
+        .exclude(credit_transactions__transaction_type='awarded_wipe')
+        .values('id', 'user_id', 'device_serial_number')
+    )
+    ledger.record_transactions(
+        GreenCreditTransaction(
+            user_id=row['user_id'],
+            certificate_id=row['id'],
+            transaction_type='awarded_wipe',
+            amount=GREEN_CREDITS_PER_PAID_WIPE,
+            description=f"Awarded {GREEN_CREDITS_PER_PAID_WIPE} green credits for wiping {row['device_serial_number']}.",
+        )
+        for row in owed
+    )
+
+
+@job_handler('generate_qr_code')
+def generate_qr_code(certificate_ids):
+    # The QR code encodes the public verification URL; client-supplied data is kept
+    url_template = getattr(settings, 'CERTIFICATE_VERIFY_URL', '/api/verify/{id}/')
+    for certificate_id in Certificate.objects.filter(pk__in=certificate_ids, qr_code_data__isnull=True).values_list('id', flat=True):
+        Certificate.objects.filter(pk=certificate_id, qr_code_data__isnull=True).update(
+            qr_code_data=url_template.format(id=certificate_id)
+        )
+
+
+@job_handler('send_wipe_notification')
+def send_wipe_notification(certificate_ids):
+    # No delivery channel exists yet; log so the hook is in place for email/push
+    for row in Certificate.objects.filter(pk__in=certificate_ids).values('user__email', 'device_serial_number', 'status'):
+        logger.info("Notify %s: wipe of %s is %s", row['user__email'], row['device_serial_number'], row['status'])
+
+
+@job_handler('anchor_certificates')
+def anchor_certificates(window=None):
+    # Cut the batches for the closing window; the chain submission is a job of its own
+    # so a flaky RPC endpoint is retried without re-batching
+    for batch in anchoring.anchor_pending(force=True):
+        jobs.enqueue('submit_anchor_batch', {'batch_id': batch.id}, key=f'anchor-submit:{batch.id}')
+
+
+@job_handler('submit_anchor_batch', max_attempts=10)
+def submit_anchor_batch(batch_id):
+    anchoring.submit_batch(batch_id)
+
+
+@job_handler('refresh_analytics')
+def refresh_analytics(day):
+    analytics.refresh_day(parse_date(day))
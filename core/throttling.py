@@ -0,0 +1,46 @@
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from rest_framework.throttling import BaseThrottle
+
+
+# Token bucket per client: `capacity` requests of burst, refilled at `rate` tokens/second.
+# Buckets live in process memory (no cache round trip on the hot path); the number of
+# tracked clients is bounded and the least recently seen are dropped first.
+class TokenBucketThrottle(BaseThrottle):
+    capacity_setting = 'VERIFY_THROTTLE_BURST'
+    rate_setting = 'VERIFY_THROTTLE_RATE'
+    default_capacity = 30
+    default_rate = 10.0
+    max_clients = 100000
+
+    _lock = threading.Lock()
+    _buckets = OrderedDict()
+
+    def __init__(self):
+        self.capacity = getattr(settings, self.capacity_setting, self.default_capacity)
+        self.rate = getattr(settings, self.rate_setting, self.default_rate)
+        self.retry_after = None
+
+    def allow_request(self, request, view):
+        ident = self.get_ident(request)
+        now = time.monotonic()
+        with self._lock:
+            tokens, updated = self._buckets.get(ident, (self.capacity, now))
+            tokens = min(self.capacity, tokens + (now - updated) * self.rate)
+            if tokens >= 1:
+                self._buckets[ident] = (tokens - 1, now)
+                allowed = True
+            else:
+                self._buckets[ident] = (tokens, now)
+                self.retry_after = (1 - tokens) / self.rate
+                allowed = False
+            self._buckets.move_to_end(ident)
+            while len(self._buckets) > self.max_clients:
+                self._buckets.popitem(last=False)
+        return allowed
+
+    def wait(self):
+        return self.retry_after
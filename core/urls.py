@@ -1,9 +1,11 @@
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
+from . import async_views
 from .views import (
     UserViewSet, CategoryViewSet, CertificateViewSet, ListingViewSet,
     ListingMediaViewSet, AdminActionViewSet, SubscriptionPackageViewSet,
-    UserSubscriptionViewSet, GreenCreditTransactionViewSet
+    UserSubscriptionViewSet, GreenCreditTransactionViewSet, CertificateVerifyView, AnalyticsViewSet,
+    MeSummaryView
 )
 
 # Create a router and register our viewsets with it.
@@ -17,8 +19,17 @@ router.register(r'admin-actions', AdminActionViewSet)
 router.register(r'subscription-packages', SubscriptionPackageViewSet)
 router.register(r'user-subscriptions', UserSubscriptionViewSet)
 router.register(r'green-credit-transactions', GreenCreditTransactionViewSet)
+router.register(r'analytics', AnalyticsViewSet, basename='analytics')
 
 # The API URLs are now determined automatically by the router.
 urlpatterns = [
+    path('verify/<str:key>/', CertificateVerifyView.as_view(), name='certificate-verify'), # Public QR code target
+    path('me/summary/', MeSummaryView.as_view(), name='me-summary'),
+    # Async read paths (core/async_views.py); route /api/async/ to the ASGI workers
+    path('async/listings/', async_views.listing_list, name='async-listing-list'),
+    path('async/listings/<int:pk>/', async_views.listing_detail, name='async-listing-detail'),
+    path('async/categories/', async_views.category_list, name='async-category-list'),
+    path('async/subscription-packages/', async_views.subscription_package_list, name='async-package-list'),
+    path('async/verify/<str:key>/', async_views.certificate_verify, name='async-certificate-verify'),
     path('', include(router.urls)),
 ]
\ No newline at end of file
@@ -0,0 +1,149 @@
+# core/verification.py
+#
+# Public certificate verification (what a buyer hits after scanning the QR code).
+# Lookups go through a narrow .values() projection of Certificate + its anchor proof,
+# and the signed result is kept in a per-process LRU cache. Unknown ids and serials are
+# cached too (for a shorter time) so scanners and scrapers can't hammer the DB with misses.
+
+import threading
+import time
+import uuid
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core import signing
+
+from .models import Certificate
+
+SIGNING_SALT = 'core.verification'
+
+PROJECTION = (
+    'id', 'device_serial_number', 'status', 'wiping_method', 'device_type',
+    'wiped_at', 'completed_at', 'is_invalidated',
+    'anchor_proof__batch__merkle_root', 'anchor_proof__batch__tx_hash', 'anchor_proof__batch__chain',
+)
+
+_MISSING = object()
+
+
+class LRUCache:
+    # Thread-safe LRU with a per-entry TTL
+    def __init__(self, max_size, ttl):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.lock = threading.Lock()
+        self.entries = OrderedDict()
+        self.hits = self.misses = 0
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None or entry[1] < time.monotonic():
+                if entry is not None:
+                    del self.entries[key]
+                self.misses += 1
+                return _MISSING
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def set(self, key, value, ttl=None):
+        with self.lock:
+            self.entries[key] = (value, time.monotonic() + (self.ttl if ttl is None else ttl))
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_size:
+                self.entries.popitem(last=False)
+
+    def delete(self, *keys):
+        with self.lock:
+            for key in keys:
+                self.entries.pop(key, None)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+
+cache = LRUCache(
+    max_size=getattr(settings, 'VERIFY_CACHE_SIZE', 50000),
+    ttl=getattr(settings, 'VERIFY_CACHE_TTL', 60),
+)
+NEGATIVE_TTL = getattr(settings, 'VERIFY_NEGATIVE_CACHE_TTL', 10)
+
+
+def cache_key(lookup):
+    # A UUID is looked up by id, anything else by device serial number
+    try:
+        return f'id:{uuid.UUID(lookup)}'
+    except ValueError:
+        return f'serial:{lookup}'
+
+
+def build_payload(row):
+    payload = {
+        'certificate_id': str(row['id']),
+        'device_serial_number': row['device_serial_number'],
+        'status': row['status'],
+        'valid': row['status'] == 'success' and not row['is_invalidated'],
+        'wiping_method': row['wiping_method'],
+        'device_type': row['device_type'],
+        'wiped_at': row['wiped_at'].isoformat() if row['wiped_at'] else None,
+        'completed_at': row['completed_at'].isoformat() if row['completed_at'] else None,
+        'merkle_root': row['anchor_proof__batch__merkle_root'],
+        'tx_hash': row['anchor_proof__batch__tx_hash'],
+        'chain': row['anchor_proof__batch__chain'],
+    }
+    # The token lets a third party confirm the payload came from us (signing.loads with the same salt)
+    return {**payload, 'signature': signing.Signer(salt=SIGNING_SALT).sign_object(payload)}
+
+
+def lookup_queryset(key):
+    kind, value = key.split(':', 1)
+    field = 'id' if kind == 'id' else 'device_serial_number'
+    return Certificate.objects.filter(**{field: value}).values(*PROJECTION)
+
+
+def verify(lookup):
+    # Returns the signed payload or None for an unknown certificate
+    key = cache_key(lookup)
+    cached = cache.get(key)
+    if cached is not _MISSING:
+        return cached
+    return store(key, lookup_queryset(key).first())
+
+
+async def averify(lookup):
+    # verify() for async views: a cache hit never leaves the event loop
+    key = cache_key(lookup)
+    cached = cache.get(key)
+    if cached is not _MISSING:
+        return cached
+    return store(key, await lookup_queryset(key).afirst())
+
+
+def store(key, row):
+    if row is None:
+        cache.set(key, None, ttl=NEGATIVE_TTL)
+        return None
+    payload = build_payload(row)
+    # Cache under both keys so a later lookup by the other one is a hit too
+    cache.set(f"id:{row['id']}", payload)
+    cache.set(f"serial:{row['device_serial_number']}", payload)
+    return payload
+
+
+def evict(certificate, previous_serial=None):
+    # previous_serial: the serial the certificate had before this save, if it changed
+    evict_rows([(certificate.pk, certificate.device_serial_number)])
+    if previous_serial is not None:
+        cache.delete(f'serial:{previous_serial}')
+
+
+def evict_rows(rows):
+    # rows: (id, device_serial_number) pairs, e.g. from a .values_list()
+    cache.delete(*[key for pk, serial in rows for key in (f'id:{pk}', f'serial:{serial}')])
+
+
+def evict_batch(batch_id):
+    # Anchoring changes the merkle root/tx hash of every certificate in the batch
+    evict_rows(Certificate.objects.filter(anchor_proof__batch_id=batch_id).values_list('id', 'device_serial_number'))
@@ -1,13 +1,33 @@
-from rest_framework import viewsets, status #status added
+from rest_framework import mixins, viewsets, status #status added
 from rest_framework.permissions import IsAdminUser, IsAuthenticated, AllowAny # Import permissions
 from rest_framework.response import Response 
+from rest_framework.exceptions import NotFound, ValidationError
+from django.core.exceptions import ValidationError as DjangoValidationError
+from django.db import transaction
+from django.http import StreamingHttpResponse
+from django.utils.cache import patch_vary_headers
 from django.utils import timezone #i added
+from django.utils.dateparse import parse_date
 import uuid #i added
 from .models import (
     User, Category, Certificate, Listing, ListingMedia,
     AdminAction, SubscriptionPackage, UserSubscription, GreenCreditTransaction
 )
 from rest_framework.decorators import action  #added
+from rest_framework.pagination import PageNumberPagination
+from rest_framework.parsers import JSONParser
+from rest_framework.views import APIView
+from .throttling import TokenBucketThrottle
+from .filters import ListingFilterBackend
+from .parsers import NDJSONParser
+from . import analytics, anchoring, export, ingestion, lean, marketplace, quota, search, summary, verification
+from .cache import CachedResponseMixin, cached_value
+from .idempotency import IdempotentCreateMixin, run_once
+from .instrumentation import InstrumentedViewMixin
+from .routing import ReplicaReadMixin
+from . import ledger
+from .pagination import ListingPagination, CertificatePagination, GreenCreditTransactionPagination
+from .serializers import requested_fields
 from .serializers import (
     UserSerializer, CategorySerializer, CertificateSerializer, ListingSerializer,
     ListingMediaSerializer, AdminActionSerializer, SubscriptionPackageSerializer,
@@ -23,6 +43,32 @@ class IsOwnerOrAdmin(IsAuthenticated):
         # Allow users to view/edit their own profile
         return obj == request.user
     
+# Streaming export shared by the certificate and credit viewsets:
+# ?output=csv|ndjson&since=&until=&resume_after=<id>, plus ?user=<id> for staff.
+# Gzipped when the client sends Accept-Encoding: gzip.
+def export_response(request, name, queryset):
+    params = request.query_params
+    output = params.get('output', 'csv')
+    compress = 'gzip' in request.META.get('HTTP_ACCEPT_ENCODING', '')
+    try:
+        if request.user.is_staff and params.get('user'):
+            queryset = queryset.filter(user_id=export.parse_user(params['user']))
+        chunks = export.stream_export(
+            name, queryset, output=output,
+            since=export.parse_bound(params.get('since'), 'since'),
+            until=export.parse_bound(params.get('until'), 'until'),
+            resume_after=params.get('resume_after') or None,
+            compress=compress,
+        )
+    except export.ExportError as exc:
+        raise ValidationError({'detail': str(exc)})
+    response = StreamingHttpResponse(chunks, content_type=export.OUTPUT_FORMATS[output])
+    response['Content-Disposition'] = f'attachment; filename="{name}-{timezone.now():%Y%m%d%H%M%S}.{output}"'
+    if compress:
+        response['Content-Encoding'] = 'gzip'
+    patch_vary_headers(response, ('Accept-Encoding',))
+    return response
+
 FREE_WIPES_ON_REGISTRATION = 3 #i added
 
 GREEN_CREDITS_PER_FREE_WIPE = 10 #i added
@@ -30,7 +76,7 @@ GREEN_CREDITS_PER_FREE_WIPE = 10 #i added
 GREEN_CREDITS_PER_PAID_WIPE = 20 #i added
 
 # 1. User ViewSet
-class UserViewSet(viewsets.ModelViewSet):
+class UserViewSet(InstrumentedViewMixin, viewsets.ModelViewSet):
     queryset = User.objects.all().order_by('email')
     serializer_class = UserSerializer
     # Apply permissions: Only staff can list all, users can retrieve/update their own
@@ -45,27 +91,71 @@ class UserViewSet(viewsets.ModelViewSet):
 
 
 # 2. Category ViewSet - Can be viewed by anyone, but only staff can create/edit/delete
-class CategoryViewSet(viewsets.ModelViewSet):
+class CategoryViewSet(InstrumentedViewMixin, ReplicaReadMixin, CachedResponseMixin, viewsets.ModelViewSet):
     queryset = Category.objects.all().order_by('name')
     serializer_class = CategorySerializer
+    cache_models = (Category,)
+    replica_actions = ('list', 'retrieve', 'tree')
+    query_budgets = {'list': 4, 'retrieve': 3, 'tree': 3}
     def get_permissions(self):
-        if self.action in ['list', 'retrieve']:
+        if self.action in ['list', 'retrieve', 'tree']:
             permission_classes = [AllowAny] # Anyone can view categories
         else:
             permission_classes = [IsAdminUser] # Only admin can create, update, delete
         return [permission() for permission in permission_classes]
 
+    # Category.save() re-checks for cycles inside its transaction (a concurrent move can slip
+    # past the serializer check), so its ValidationError has to come back as a 400, not a 500
+    def perform_create(self, serializer):
+        self.save_category(serializer)
+
+    def perform_update(self, serializer):
+        self.save_category(serializer)
+
+    @staticmethod
+    def save_category(serializer):
+        try:
+            serializer.save()
+        except DjangoValidationError as exc:
+            raise ValidationError(exc.message_dict if hasattr(exc, 'error_dict') else exc.messages)
+
+    # GET /api/categories/tree/ - the whole category tree, nested, from one query
+    @action(detail=False, methods=['get'])
+    def tree(self, request):
+        return Response(cached_value('category-tree', (Category,), self.build_tree))
+
+    @staticmethod
+    def build_tree():
+        nodes = {}
+        roots = []
+        # Ordering by path guarantees parents are seen before their children
+        for row in Category.objects.order_by('path').values('id', 'name', 'description', 'parent_category', 'depth'):
+            node = {**row, 'subcategories': []}
+            nodes[row['id']] = node
+            parent = nodes.get(row['parent_category'])
+            (parent['subcategories'] if parent else roots).append(node)
+        for node in [*nodes.values(), {'subcategories': roots}]:
+            node['subcategories'].sort(key=lambda child: child['name'])
+        return roots
+
 
 
 # 3. Certificate ViewSet - Only authenticated users can list/retrieve their own, staff can manage all
-class CertificateViewSet(viewsets.ModelViewSet):
+class CertificateViewSet(IdempotentCreateMixin, InstrumentedViewMixin, viewsets.ModelViewSet):
     queryset = Certificate.objects.none()   #was not there
     serializer_class = CertificateSerializer #was not there
+    pagination_class = CertificatePagination # Page numbers by default, keyset with ?cursor=
+    query_budgets = {'list': 4, 'retrieve': 3, 'verify': 3}
     def get_queryset(self):
         # Only show certificates belonging to the authenticated user, or all for admin
+        # select_related('user') because the serializer reads user.email for every row
         if self.request.user.is_staff:
-            return Certificate.objects.all().order_by('-generated_at')
-        return Certificate.objects.filter(user=self.request.user).order_by('-generated_at')
+            queryset = Certificate.objects.all().select_related('user').order_by('-generated_at', 'id')
+        else:
+            queryset = Certificate.objects.filter(user=self.request.user).select_related('user').order_by('-generated_at', 'id')
+        if self.action == 'verify':
+            queryset = queryset.select_related('anchor_proof__batch') # Proof and batch in the same query
+        return queryset
     
     serializer_class = CertificateSerializer #i added
     permission_classes = [IsAuthenticated]  #i added
@@ -84,7 +174,73 @@ class CertificateViewSet(viewsets.ModelViewSet):
 
     # You might want to override perform_create to automatically set the user for a new certificate
     def perform_create(self, serializer):
-        serializer.save(user=self.request.user)
+        # The wipe is reserved in the same transaction as the INSERT (core/quota.py)
+        with transaction.atomic():
+            if quota.consumes_quota(serializer.validated_data.get('status', 'pending')):
+                quota.reserve(self.request.user.pk)
+            serializer.save(user=self.request.user)
+
+    def perform_update(self, serializer):
+        # Turning a certificate into a failed wipe gives its wipe back (and the reverse takes one).
+        # The status moves with a compare-and-set UPDATE first: of two requests failing the same
+        # certificate at once only the one that matched the old status touches the quota.
+        certificate = serializer.instance
+        new_status = serializer.validated_data.get('status', certificate.status)
+        with transaction.atomic():
+            previous_status = certificate.status
+            while previous_status != new_status:
+                if Certificate.objects.filter(pk=certificate.pk, status=previous_status).update(status=new_status):
+                    quota.apply_status_change(certificate.user_id, previous_status, new_status)
+                    break
+                # Someone else changed it since we read it: go again from the current status
+                previous_status = Certificate.objects.filter(pk=certificate.pk).values_list('status', flat=True).first()
+                if previous_status is None:
+                    raise NotFound()
+            serializer.save()
+
+    # GET /api/certificates/{id}/verify/ - offline Merkle proof check against the anchored root
+    @action(detail=True, methods=['get'])
+    def verify(self, request, pk=None):
+        certificate = self.get_object()
+        return Response({'certificate': certificate.id, **anchoring.verify_certificate(certificate)})
+
+    # GET /api/certificates/export/ - every certificate in range, streamed as CSV or NDJSON
+    @action(detail=False, methods=['get'])
+    def export(self, request):
+        return export_response(request, 'certificates', self.get_queryset())
+
+    # POST /api/certificates/bulk/ - JSON array or NDJSON stream of certificates from a wiping station
+    @action(detail=False, methods=['post'], url_path='bulk', parser_classes=[JSONParser, NDJSONParser])
+    def bulk(self, request):
+        # A retried upload with the same Idempotency-Key gets the first upload's results back
+        return run_once(request, self.get_idempotency_scope('bulk'), lambda: self.bulk_response(request))
+
+    def bulk_response(self, request):
+        items = request.data
+        if not isinstance(items, list):
+            return Response({'detail': 'Expected a JSON array or NDJSON stream of certificates.'}, status=status.HTTP_400_BAD_REQUEST)
+        if len(items) > ingestion.MAX_BULK_CERTIFICATES:
+            return Response(
+                {'detail': f'At most {ingestion.MAX_BULK_CERTIFICATES} certificates per request.'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        results = ingestion.ingest_certificates(request.user, items)
+        summary = ingestion.summarize(results)
+        response_status = status.HTTP_201_CREATED if summary['created'] else status.HTTP_200_OK
+        return Response({**summary, 'results': results}, status=response_status)
+
+
+# 3b. Public certificate verification - anyone with the QR code, by certificate id or device serial
+class CertificateVerifyView(APIView):
+    permission_classes = [AllowAny]
+    authentication_classes = [] # Anonymous by design; skips the session/token lookups
+    throttle_classes = [TokenBucketThrottle]
+
+    def get(self, request, key):
+        payload = verification.verify(key)
+        if payload is None:
+            return Response({'valid': False, 'detail': 'Certificate not found.'}, status=status.HTTP_404_NOT_FOUND)
+        return Response(payload)
 
 
 # 4. Listing ViewSet - Anyone can view, only owner/admin can edit/delete
@@ -94,14 +250,35 @@ class IsListingOwnerOrAdmin(IsAuthenticated):
             return True
         return obj.user == request.user
 
-class ListingViewSet(viewsets.ModelViewSet):
-    queryset = Listing.objects.all().select_related('user', 'category', 'certificate').prefetch_related('media').order_by('-created_at')
+class ListingViewSet(IdempotentCreateMixin, InstrumentedViewMixin, ReplicaReadMixin, CachedResponseMixin, viewsets.ModelViewSet):
+    queryset = Listing.objects.all().select_related('user', 'category', 'certificate').order_by('-created_at', 'id')
     serializer_class = ListingSerializer
+    cache_models = (Listing, ListingMedia, Category)
+    replica_actions = ('list', 'retrieve', 'search')
+    query_budgets = {'list': 5, 'retrieve': 4, 'search': 6}
+    filter_backends = [ListingFilterBackend] # ?status=, ?category=, ?price_min= etc. (core/filters.py)
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        # Media is only prefetched when it will be serialized (always, unless ?fields= leaves it out)
+        fields, expand = requested_fields(self.request)
+        if fields is None or 'media' in fields | expand:
+            queryset = queryset.prefetch_related('media')
+        # ?category_subtree=<id> - listings in a category or any of its subcategories
+        subtree = self.request.query_params.get('category_subtree')
+        if subtree is not None and self.action in ['list', 'search']:
+            try:
+                subtree = int(subtree)
+            except ValueError:
+                raise ValidationError({'category_subtree': 'Must be a category id.'})
+            queryset = queryset.filter(category__in=Category.subtree_ids(subtree))
+        return queryset
+    pagination_class = ListingPagination # Page numbers by default, keyset with ?cursor=
     def get_permissions(self):
-        if self.action in ['list', 'retrieve']:
+        if self.action in ['list', 'retrieve', 'search']:
             permission_classes = [AllowAny] # Anyone can view listings
-        elif self.action == 'create':
-            permission_classes = [IsAuthenticated] # Only authenticated users can create listings
+        elif self.action in ['create', 'purchase']:
+            permission_classes = [IsAuthenticated] # Only authenticated users can create or buy listings
         else: # update, partial_update, destroy
             permission_classes = [IsListingOwnerOrAdmin] # Only owner or admin can edit/delete
         return [permission() for permission in permission_classes]
@@ -109,6 +286,52 @@ class ListingViewSet(viewsets.ModelViewSet):
     def perform_create(self, serializer):
         serializer.save(user=self.request.user)
 
+    def list(self, request, *args, **kwargs):
+        # With ?fields= the grid takes the lean path: .values() rows straight to dicts
+        fields, expand = requested_fields(request)
+        if fields is None:
+            return super().list(request, *args, **kwargs)
+        return self.cached_response(request, lambda: self.lean_list(request, fields | expand))
+
+    def lean_list(self, request, fields):
+        queryset = lean.lean_listing_queryset(self.filter_queryset(self.get_queryset()), fields)
+        page = self.paginate_queryset(queryset)
+        rows = list(page) if page is not None else list(queryset)
+        data = lean.serialize_listings(rows, fields)
+        return self.get_paginated_response(data) if page is not None else Response(data)
+
+    # GET /api/listings/search/?q=... - ranked full-text results plus facet counts
+    @action(detail=False, methods=['get'])
+    def search(self, request):
+        return self.cached_response(request, lambda: self.search_response(request))
+
+    # POST /api/listings/{id}/purchase/ - buy with green credits; 409 if someone else got it first
+    @action(detail=True, methods=['post'])
+    def purchase(self, request, pk=None):
+        return run_once(request, self.get_idempotency_scope('purchase'), lambda: self.purchase_response(request, pk))
+
+    def purchase_response(self, request, pk):
+        listing, entry = marketplace.purchase(pk, request.user.pk)
+        return Response({
+            'listing': listing['id'],
+            'status': listing['status'],
+            'sold_at': listing['sold_at'],
+            'green_credits_spent': -entry.amount,
+            'transaction': entry.pk,
+        })
+
+    def search_response(self, request):
+        text = request.query_params.get('q', '').strip()
+        if not text:
+            raise ValidationError({'q': 'This parameter is required.'})
+        matches = search.filter_search(self.filter_queryset(self.get_queryset()), text)
+        # Search results are ordered by rank, so they always use page numbers
+        paginator = PageNumberPagination()
+        page = paginator.paginate_queryset(search.rank_search(matches, text), request, view=self)
+        response = paginator.get_paginated_response(self.get_serializer(page, many=True).data)
+        response.data['facets'] = search.facet_counts(matches)
+        return response
+
 
 # 5. ListingMedia ViewSet - Publicly viewable, but only listing owner/admin can create/edit/delete
 class IsListingMediaOwnerOrAdmin(IsAuthenticated):
@@ -117,9 +340,11 @@ class IsListingMediaOwnerOrAdmin(IsAuthenticated):
             return True
         return obj.listing.user == request.user
 
-class ListingMediaViewSet(viewsets.ModelViewSet):
-    queryset = ListingMedia.objects.all().order_by('listing', 'is_primary')
+class ListingMediaViewSet(IdempotentCreateMixin, InstrumentedViewMixin, ReplicaReadMixin, viewsets.ModelViewSet):
+    # select_related: object permissions and __str__ both go through listing (and listing.user)
+    queryset = ListingMedia.objects.all().select_related('listing__user').order_by('listing', 'position', 'id')
     serializer_class = ListingMediaSerializer
+    query_budgets = {'list': 4, 'retrieve': 3}
     def get_permissions(self):
         if self.action in ['list', 'retrieve']:
             permission_classes = [AllowAny] # Anyone can view media
@@ -129,7 +354,7 @@ class ListingMediaViewSet(viewsets.ModelViewSet):
 
 
 # 6. AdminAction ViewSet - Strictly Admin Only
-class AdminActionViewSet(viewsets.ModelViewSet):
+class AdminActionViewSet(InstrumentedViewMixin, viewsets.ModelViewSet):
     queryset = AdminAction.objects.all().order_by('-performed_at')
     serializer_class = AdminActionSerializer
     permission_classes = [IsAdminUser] # Only admin users can view/manage admin actions
@@ -139,9 +364,11 @@ class AdminActionViewSet(viewsets.ModelViewSet):
 
 
 # 7. SubscriptionPackage ViewSet - Publicly viewable, staff only for changes
-class SubscriptionPackageViewSet(viewsets.ModelViewSet):
+class SubscriptionPackageViewSet(InstrumentedViewMixin, ReplicaReadMixin, CachedResponseMixin, viewsets.ModelViewSet):
     queryset = SubscriptionPackage.objects.all().order_by('name')
     serializer_class = SubscriptionPackageSerializer
+    cache_models = (SubscriptionPackage,)
+    query_budgets = {'list': 4, 'retrieve': 3}
     def get_permissions(self):
         if self.action in ['list', 'retrieve']:
             permission_classes = [AllowAny] # Anyone can view packages
@@ -158,7 +385,7 @@ class IsUserSubscriptionOwnerOrAdmin(IsAuthenticated):
             return True
         return obj.user == request.user
 
-class UserSubscriptionViewSet(viewsets.ModelViewSet):
+class UserSubscriptionViewSet(IdempotentCreateMixin, InstrumentedViewMixin, viewsets.ModelViewSet):
     queryset = UserSubscription.objects.none()
     serializer_class = UserSubscriptionSerializer
     def get_queryset(self):
@@ -169,15 +396,14 @@ class UserSubscriptionViewSet(viewsets.ModelViewSet):
     def get_permissions(self):
         if self.action == 'list':
             permission_classes = [IsAuthenticated] # Authenticated user can list their own
-        elif self.action in ['retrieve', 'update', 'partial_update', 'destroy']:
-            permission_classes = [IsUserSubscriptionOwnerOrAdmin] # Only owner or admin can edit/delete
-        else: # For create
-            permission_classes = [IsAuthenticated] # Authenticated users can create (e.g., via payment)
+        elif self.action == 'retrieve':
+            permission_classes = [IsUserSubscriptionOwnerOrAdmin]
+        else: # create, update, partial_update, destroy
+            # An active subscription grants a package, wipes and renewal credits, so users
+            # can't write their own: staff (or a payment integration acting as staff) do
+            permission_classes = [IsAdminUser]
         return [permission() for permission in permission_classes]
 
-    def perform_create(self, serializer):
-        serializer.save(user=self.request.user)
-
 
 # 9. GreenCreditTransaction ViewSet - Only users can see their own, admin can see all
 class IsGreenCreditTransactionOwnerOrAdmin(IsAuthenticated):
@@ -186,24 +412,99 @@ class IsGreenCreditTransactionOwnerOrAdmin(IsAuthenticated):
             return True
         return obj.user == request.user
 
-class GreenCreditTransactionViewSet(viewsets.ModelViewSet):
+class GreenCreditTransactionViewSet(IdempotentCreateMixin, InstrumentedViewMixin, mixins.CreateModelMixin, mixins.ListModelMixin, mixins.RetrieveModelMixin, viewsets.GenericViewSet):
+    # The ledger is append-only: no update/destroy, mistakes are fixed with a correcting entry.
+    # Users only read their own rows; credits are awarded by jobs and spent through
+    # /api/listings/{id}/purchase/, so only staff post entries here (adjustments, refunds,
+    # for another account with ?user=<id>).
     queryset = GreenCreditTransaction.objects.none()
     serializer_class = GreenCreditTransactionSerializer
+    pagination_class = GreenCreditTransactionPagination # Page numbers by default, keyset with ?cursor=
+    query_budgets = {'list': 4, 'retrieve': 3}
     def get_queryset(self):
         if self.request.user.is_staff:
-            return GreenCreditTransaction.objects.all().select_related('user', 'certificate', 'listing').order_by('-transaction_time')
-        return GreenCreditTransaction.objects.filter(user=self.request.user).select_related('user', 'certificate', 'listing').order_by('-transaction_time')
+            return GreenCreditTransaction.objects.all().select_related('user', 'certificate', 'listing').order_by('-transaction_time', 'id')
+        return GreenCreditTransaction.objects.filter(user=self.request.user).select_related('user', 'certificate', 'listing').order_by('-transaction_time', 'id')
 
     def get_permissions(self):
-        if self.action == 'list':
+        if self.action == 'create':
+            permission_classes = [IsAdminUser] # Only staff write ledger entries
+        elif self.action == 'retrieve':
+            permission_classes = [IsGreenCreditTransactionOwnerOrAdmin]
+        else: # list, export
             permission_classes = [IsAuthenticated] # Authenticated user can list their own
-        elif self.action in ['retrieve', 'update', 'partial_update', 'destroy']:
-            permission_classes = [IsGreenCreditTransactionOwnerOrAdmin] # Only owner or admin can edit/delete
-        else: # For create
-            permission_classes = [IsAuthenticated] # Authenticated users can create (e.g., via wipe)
         return [permission() for permission in permission_classes]
 
     def perform_create(self, serializer):
-        # For GreenCreditTransaction, the user is often implicitly tied to the action
-        # For simplicity now, let's assume the request.user is the one making the transaction
-        serializer.save(user=self.request.user)
\ No newline at end of file
+        # The entry is for the staff member's own account unless ?user=<id> names another one
+        user = self.request.user
+        if self.request.query_params.get('user'):
+            try:
+                user = User.objects.get(pk=uuid.UUID(self.request.query_params['user']))
+            except (ValueError, User.DoesNotExist):
+                raise ValidationError({'user': 'Unknown user.'})
+        # The ledger service writes the row and moves User.green_credits in one transaction
+        serializer.instance = ledger.record_transaction(**{**serializer.validated_data, 'user': user})
+
+    # GET /api/green-credit-transactions/export/ - the ledger in range, streamed as CSV or NDJSON
+    @action(detail=False, methods=['get'])
+    def export(self, request):
+        return export_response(request, 'credits', self.get_queryset())
+
+
+# 10. Analytics ViewSet - dashboards read from the precomputed rollups only
+class AnalyticsViewSet(InstrumentedViewMixin, ReplicaReadMixin, viewsets.ViewSet):
+    # Users see their own numbers; staff see platform-wide totals or any user's with ?user=
+    permission_classes = [IsAuthenticated]
+    replica_actions = ('wipes', 'credits') # Rollups trail the writes anyway
+    query_budgets = {'wipes': 4, 'credits': 4}
+    BREAKDOWNS = analytics.WIPE_DIMENSIONS
+
+    def get_params(self, request):
+        params = request.query_params
+        grain = params.get('grain', 'day')
+        if grain not in ('day', 'month'):
+            raise ValidationError({'grain': "Must be 'day' or 'month'."})
+        bounds = {}
+        for name in ('since', 'until'):
+            value = params.get(name)
+            bounds[name] = parse_date(value) if value else None
+            if value and bounds[name] is None:
+                raise ValidationError({name: 'Must be a date (YYYY-MM-DD).'})
+        if not request.user.is_staff:
+            user = request.user.pk
+        else:
+            user = params.get('user') or None
+        return {'grain': grain, 'user': user, **bounds}
+
+    # GET /api/analytics/wipes/?grain=day|month&since=&until=&by=wiping_method|device_type|operating_system|status
+    @action(detail=False, methods=['get'])
+    def wipes(self, request):
+        params = self.get_params(request)
+        by = request.query_params.get('by', 'wiping_method')
+        if by not in self.BREAKDOWNS:
+            raise ValidationError({'by': f"Must be one of: {', '.join(self.BREAKDOWNS)}."})
+        return Response({**params, 'by': by, 'results': analytics.wipe_summary(by=by, **params)})
+
+    # GET /api/analytics/credits/?grain=day|month&since=&until= - awarded vs redeemed
+    @action(detail=False, methods=['get'])
+    def credits(self, request):
+        params = self.get_params(request)
+        return Response({**params, 'results': analytics.credit_summary(**params)})
+
+
+# 11. Me Summary - the home screen in one request (core/summary.py)
+class MeSummaryView(InstrumentedViewMixin, APIView):
+    permission_classes = [IsAuthenticated]
+    action = 'summary' # Label for the request metrics; APIViews have no router action
+    query_budgets = {'summary': 6} # Auth + the four summary queries on a miss
+
+    # GET /api/me/summary/?limit=5 - latest `limit` certificates and transactions (max 20)
+    def get(self, request):
+        try:
+            limit = int(request.query_params.get('limit', summary.DEFAULT_LIMIT))
+        except ValueError:
+            raise ValidationError({'limit': 'Must be a whole number.'})
+        if not 1 <= limit <= summary.MAX_LIMIT:
+            raise ValidationError({'limit': f'Must be between 1 and {summary.MAX_LIMIT}.'})
+        return Response(summary.get_summary(request.user.pk, limit))